@@ -5,6 +5,7 @@ Add touch support and JavaScript optimizations:
 2. Add passive event listeners
 3. Improve performance with requestAnimationFrame
 4. Add error handling
+5. Queue window image decodes by distance from the visible window content
 """
 
 import re
@@ -82,6 +83,87 @@ TOUCH_SUPPORT_JS = '''
             }
         });
 
+        // ===== IMAGE DECODE QUEUE =====
+        // Window images keep their source in data-decode-src/-srcset until they
+        // come within DECODE_MARGIN px of the visible part of their scrolling
+        // .window-content, then get it back nearest first, at most MAX_DECODES
+        // at a time, and are decoded with img.decode() so opening a window does
+        // not decode all of its images in one frame
+        const MAX_DECODES = 2;
+        const DECODE_MARGIN = 300;
+        const decodeQueue = [];
+        const heldImages = new WeakSet();
+        let decodesRunning = 0;
+
+        function moveAttribute(el, from, to) {
+            if (!el.hasAttribute(from)) return;
+            el.setAttribute(to, el.getAttribute(from));
+            el.removeAttribute(from);
+        }
+
+        function imageSources(img) {
+            const picture = img.parentElement;
+            const sources = picture && picture.tagName === 'PICTURE' ? [...picture.querySelectorAll('source')] : [];
+            return [...sources, img];
+        }
+
+        function pumpDecodes() {
+            while (decodesRunning < MAX_DECODES && decodeQueue.length) {
+                const { img } = decodeQueue.shift();
+                imageSources(img).forEach(el => {
+                    moveAttribute(el, 'data-decode-srcset', 'srcset');
+                    moveAttribute(el, 'data-decode-src', 'src');
+                });
+                decodesRunning++;
+                img.decode().catch(() => {}).then(() => {
+                    decodesRunning--;
+                    pumpDecodes();
+                });
+            }
+        }
+
+        function queueDecodes(entries, observer) {
+            entries.forEach(entry => {
+                if (!entry.isIntersecting) return;
+                observer.unobserve(entry.target);
+                const rect = entry.boundingClientRect;
+                const root = entry.rootBounds;
+                const distance = Math.max(0, rect.top - root.bottom, root.top - rect.bottom);
+                decodeQueue.push({ img: entry.target, distance });
+            });
+            decodeQueue.sort((a, b) => a.distance - b.distance);
+            pumpDecodes();
+        }
+
+        function holdImages(content, observer) {
+            content.querySelectorAll('img[src], img[srcset]').forEach(img => {
+                // Pooled copies read their source from this one
+                if (heldImages.has(img) || img.hasAttribute('data-pool')) return;
+                heldImages.add(img);
+                img.decoding = 'async';
+                imageSources(img).forEach(el => {
+                    moveAttribute(el, 'srcset', 'data-decode-srcset');
+                    moveAttribute(el, 'src', 'data-decode-src');
+                });
+                observer.observe(img);
+            });
+        }
+
+        if ('IntersectionObserver' in window) {
+            document.querySelectorAll('.window-content').forEach(content => {
+                // Rooted at the panel that scrolls, so the margin extends it and not
+                // the viewport, which the panel would clip images against anyway
+                const observer = new IntersectionObserver(queueDecodes, {
+                    root: content,
+                    rootMargin: `${DECODE_MARGIN}px`
+                });
+                holdImages(content, observer);
+                // Content put in place later (deferred windows)
+                new MutationObserver(() => holdImages(content, observer))
+                    .observe(content, { childList: true, subtree: true });
+            });
+        }
+
         // ===== SMOOTH SCROLL FOR WINDOW CONTENT =====
         document.querySelectorAll('.window-content').forEach(content => {
             content.style.scrollBehavior = 'smooth';
@@ -184,11 +266,8 @@ def update_mouse_handlers(html):
     html = html.replace(old_mousemove, new_mousemove)
     return html
 
-def main():
-    print(f"Reading {INPUT_FILE}...")
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        html = f.read()
-
+def add_touch_support(html):
+    """Add touch dragging, runtime optimizations and the mobile version tag"""
     print("Adding touch event handlers to window headers...")
     html = add_touch_handlers(html)
 
@@ -204,6 +283,15 @@ def main():
     html = html.replace('AETHER PXR v3.2 OPTIMIZED',
                         'AETHER PXR v3.3 MOBILE')
 
+    return html
+
+def main():
+    print(f"Reading {INPUT_FILE}...")
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    html = add_touch_support(html)
+
     print(f"Writing {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         f.write(html)
@@ -0,0 +1,6 @@
+"""
+AETHER site build pipeline.
+
+Loads a source page once, runs the registered transforms over a shared
+in-memory document and writes the result a single time.
+"""
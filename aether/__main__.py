@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Command line entry point:
+
+    python -m aether build [--input FILE] [--output FILE] [--steps a,b,c]
+                           [--external-assets] [--embed-dpr N] [--no-cache] [--precompress]
+
+    python -m aether build --pages "aether-matrix-*.html" [--out-dir DIR] [--jobs N]
+    python -m aether build --site [aether-site.json] [--jobs N]
+
+    python -m aether variants [--root DIR] [--jobs N]
+
+    python -m aether compress PATH... [--jobs N]
+
+    python -m aether svg [FILE...] [--root DIR] [--embed] [--jobs N]
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from aether import batch, compress, pipeline, svg, variants
+from aether.assets import ASSET_ROOT, AssetRegistry
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="aether", description="AETHER site build")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build a page in a single pass")
+    build.add_argument("--input", default=pipeline.INPUT_FILE, help="source HTML page")
+    build.add_argument("--output", default=pipeline.OUTPUT_FILE, help="output HTML page")
+    build.add_argument("--steps", default=",".join(pipeline.DEFAULT_STEPS),
+                       help="comma separated transforms to run, in order")
+    build.add_argument("--external-assets", action="store_true",
+                       help="write images as assets/<name>.<hash>.<ext> next to the "
+                            "output instead of inlining base64")
+    build.add_argument("--embed-dpr", type=float,
+                       help="device pixel ratio inlined v16 images are sized for (default 2)")
+    build.add_argument("--no-cache", action="store_true",
+                       help="rebuild every step instead of reusing unchanged ones")
+    build.add_argument("--precompress", action="store_true",
+                       help="write .gz (and .br) siblings of the built pages and their assets")
+
+    pages = build.add_argument_group("multi-page builds")
+    pages.add_argument("--pages", metavar="GLOB", help="build every page matching GLOB in parallel")
+    pages.add_argument("--site", nargs="?", const=batch.SITE_CONFIG, metavar="FILE",
+                       help=f"build the pages listed in a site config (default {batch.SITE_CONFIG})")
+    pages.add_argument("--out-dir", default=batch.OUT_DIR, help="output directory for --pages")
+    pages.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+    pages.add_argument("--verbose", action="store_true", help="print each page's build log")
+
+    derive = commands.add_parser("variants", help="derive missing image widths and AVIF with Pillow")
+    derive.add_argument("--root", default=ASSET_ROOT, help="asset tree to complete")
+    derive.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+
+    squeeze = commands.add_parser("compress", help="write .gz (and .br) siblings of built files")
+    squeeze.add_argument("paths", nargs="+", metavar="PATH", help="files or directories to compress")
+    squeeze.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+
+    vectors = commands.add_parser("svg", help="optimize SVGs and move their rasters into the asset tree")
+    vectors.add_argument("files", nargs="*", metavar="FILE",
+                         help=f"SVGs to optimize (default: {svg.SOURCES})")
+    vectors.add_argument("--root", default=ASSET_ROOT, help="asset tree to write to")
+    vectors.add_argument("--embed", action="store_true",
+                         help="keep the rasters inline as WebP, for SVGs shown through <img>")
+    vectors.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "variants":
+        variants.generate(AssetRegistry(root=args.root).names, args.root, args.jobs)
+        return 0
+
+    if args.command == "svg":
+        svg.optimize_all(args.files or sorted(glob.glob(svg.SOURCES)), args.root, args.embed, args.jobs)
+        return 0
+
+    if args.command == "compress":
+        compress.precompress(args.paths, args.jobs)
+        return 0
+
+    if args.command == "build":
+        steps = [s.strip() for s in args.steps.split(",") if s.strip()]
+        options = {'external_assets': args.external_assets}
+        if args.embed_dpr is not None:
+            options['embed_dpr'] = args.embed_dpr
+        incremental = not args.no_cache
+
+        if args.pages or args.site:
+            if args.site:
+                page_list = batch.load_site(args.site)
+            else:
+                page_list = batch.pages_from_glob(args.pages, args.out_dir, steps, options)
+            try:
+                batch.build_all(page_list, args.jobs, incremental, args.verbose)
+            except (KeyError, batch.PageBuildError) as error:
+                print(f"Error: build stopped, {error}", file=sys.stderr)
+                return 1
+            outputs = [page['output'] for page in page_list]
+        else:
+            pipeline.build(args.input, args.output, steps, options, incremental=incremental)
+            outputs = [args.output]
+
+        if args.precompress:
+            # The pages and the assets/ directories published next to them
+            assets = {os.path.join(os.path.dirname(output), "assets") for output in outputs}
+            compress.precompress(outputs + sorted(assets), args.jobs)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
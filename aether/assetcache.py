@@ -0,0 +1,128 @@
+"""
+Persistent, content-addressed cache of base64 data URLs.
+
+Encoded payloads are stored once per SHA-256 of the file contents. A
+per-path stat record (size + mtime) lets unchanged files skip both the
+hash and the encode, so a repeated build does no base64 work at all.
+Every record is its own file written atomically, which keeps the cache
+safe to share between concurrent build processes.
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+CACHE_DIR = ".aether-cache"
+
+MIME_TYPES = {
+    '.webp': 'image/webp',
+    '.avif': 'image/avif',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+}
+
+# Leading bytes -> MIME type, for payloads that come without a file name
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+)
+
+def mime_type(path):
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+def sniff_mime_type(data):
+    """MIME type of image bytes from their signature, or None"""
+    for signature, mime in SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    if data.lstrip()[:5] in (b'<svg ', b'<?xml'):
+        return 'image/svg+xml'
+    return None
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+class DataUrlCache:
+    """On-disk cache: file path -> data:<mime>;base64,... string"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.stat_dir = os.path.join(cache_dir, "stat")
+        self.blob_dir = os.path.join(cache_dir, "data-urls")
+        os.makedirs(self.stat_dir, exist_ok=True)
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def stat_path(self, path):
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.stat_dir, f"{key}.json")
+
+    def blob_path(self, sha256, mime):
+        return os.path.join(self.blob_dir, f"{sha256}.{mime.replace('/', '-')}.txt")
+
+    def content_hash(self, path):
+        """SHA-256 of path, reusing the stored hash while size and mtime match"""
+        st = os.stat(path)
+        record_path = self.stat_path(path)
+        try:
+            with open(record_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record['size'] == st.st_size and record['mtime_ns'] == st.st_mtime_ns:
+                return record['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        sha256 = file_sha256(path)
+        write_atomic(record_path, json.dumps({
+            'path': path,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': sha256,
+        }))
+        return sha256
+
+    def data_url(self, path, mime=None):
+        """Return the data URL for path, encoding it only on a cache miss"""
+        if not os.path.exists(path):
+            return None
+        mime = mime or mime_type(path)
+        blob = self.blob_path(self.content_hash(path), mime)
+
+        if os.path.exists(blob):
+            self.hits += 1
+            with open(blob, 'r', encoding='utf-8') as f:
+                return f.read()
+
+        self.misses += 1
+        with open(path, 'rb') as f:
+            url = f"data:{mime};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+        write_atomic(blob, url)
+        return url
+
+_default = None
+
+def data_urls():
+    """Process-wide cache instance used by the generators"""
+    global _default
+    if _default is None:
+        _default = DataUrlCache()
+    return _default
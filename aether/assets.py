@@ -0,0 +1,316 @@
+"""
+Lazy asset registry.
+
+Names are indexed up front, but image bytes and data URLs are only read
+when a transform asks for a specific name and variant, and memoized from
+then on. Peak memory follows the assets a page uses, not the size of
+aether-website-assets/.
+
+In external mode (publish_dir set) an image is instead written once as
+<publish_dir>/<name>.<contenthash>.<ext> and referenced by URL, so pages
+stay small and every page variant shares the same immutable files.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import shutil
+
+from aether.assetcache import data_urls, mime_type
+
+# Hex digits of the content hash kept in published file names
+HASH_LENGTH = 12
+
+# Base64 payloads shorter than this stay inline when pages are externalized
+INLINE_LIMIT = 1024
+
+DATA_URL_RE = re.compile(r'data:(image/[a-z0-9.+-]+);base64,([A-Za-z0-9+/=]+)')
+
+# MIME type -> extension for payloads pulled out of existing pages
+EXTENSIONS = {
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/gif': '.gif',
+    'image/svg+xml': '.svg',
+}
+
+ASSET_ROOT = "aether-website-assets"
+
+# variant -> (directory, filename template)
+VARIANTS = {
+    'full': ("webp", "{name}.webp"),
+    'medium': ("webp-medium", "{name}_800w.webp"),
+    'mobile': ("webp-mobile", "{name}_400w.webp"),
+    'avif': ("avif", "{name}.avif"),
+    'png': ("png-fallback", "{name}.png"),
+    'lqip': ("lqip", "{name}-blur.webp"),
+}
+
+# Nominal width of the resized variants; the others are master-sized
+VARIANT_WIDTHS = {'mobile': 400, 'medium': 800}
+
+# Variant to use when the requested file does not exist
+FALLBACKS = {
+    'medium': 'full',
+    'mobile': 'medium',
+    'avif': 'full',
+}
+
+def hashed_name(name, sha256, ext):
+    return f"{name}.{sha256[:HASH_LENGTH]}{ext}"
+
+def publish(path, name, publish_dir, sha256):
+    """Copy path to publish_dir under its content-hashed name, once"""
+    filename = hashed_name(name, sha256, os.path.splitext(path)[1])
+    target = os.path.join(publish_dir, filename)
+    if not os.path.exists(target):
+        os.makedirs(publish_dir, exist_ok=True)
+        # Parallel page builds may publish the same file; never expose a partial copy
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+    return filename
+
+def publish_bytes(data, name, ext, publish_dir):
+    """Write data to publish_dir under its content-hashed name, once"""
+    filename = hashed_name(name, hashlib.sha256(data).hexdigest(), ext)
+    target = os.path.join(publish_dir, filename)
+    if not os.path.exists(target):
+        os.makedirs(publish_dir, exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+    return filename
+
+def externalize_data_urls(html, publish_dir, base_url=None, name="embedded"):
+    """
+    Move every base64 image already inlined in html out to hashed files,
+    except payloads under INLINE_LIMIT (placeholders), cheaper inline
+    than as a request.
+
+    Identical payloads map to the same file. Returns (html, file paths).
+    """
+    if base_url is None:
+        base_url = os.path.basename(os.path.normpath(publish_dir)) + "/"
+    published = {}
+
+    def replace(match):
+        payload = match.group(2)
+        if len(payload) < INLINE_LIMIT:
+            return match.group()
+        if payload not in published:
+            ext = EXTENSIONS.get(match.group(1), '.bin')
+            published[payload] = publish_bytes(base64.b64decode(payload), name, ext, publish_dir)
+        return base_url + published[payload]
+
+    html = DATA_URL_RE.sub(replace, html)
+    return html, [os.path.join(publish_dir, f) for f in published.values()]
+
+class AssetRegistry:
+    """name + variant -> path / bytes / data URL, resolved on demand"""
+
+    def __init__(self, root=ASSET_ROOT, cache=None, publish_dir=None, base_url=None):
+        self.root = root
+        self.cache = cache
+        # External mode: hashed files in publish_dir, referenced as base_url + file.
+        # The page is assumed to sit next to publish_dir unless base_url says otherwise
+        self.publish_dir = publish_dir
+        if publish_dir and base_url is None:
+            base_url = os.path.basename(os.path.normpath(publish_dir)) + "/"
+        self.base_url = base_url
+        # Dependency tracking for incremental builds: every file probed
+        # (path -> existed) and every file written to publish_dir since the
+        # last reset_tracking(), i.e. by the current build step
+        self.used = {}
+        self.published = set()
+        self._index = None
+        self._manifests = None
+        # key -> (value, files it probed, files it published)
+        self._memo = {}
+
+    def reset_tracking(self):
+        """Start recording the files the next build step depends on"""
+        self.used = {}
+        self.published = set()
+
+    def _memoized(self, key, compute):
+        """
+        compute() once per key; every call, cached or not, records the
+        files the value was derived from, so each step that uses it
+        depends on them.
+        """
+        if key not in self._memo:
+            outer = self.used, self.published
+            self.used, self.published = {}, set()
+            try:
+                self._memo[key] = (compute(), self.used, self.published)
+            finally:
+                self.used, self.published = outer
+        value, used, published = self._memo[key]
+        self.used.update(used)
+        self.published.update(published)
+        return value
+
+    @property
+    def index(self):
+        """ManifestIndex of root: which files exist, dimensions, srcsets"""
+        if self._index is None:
+            from aether.manifest import manifest_index
+            self._index = manifest_index(self.root)
+            self._manifests = {path: os.path.exists(path) for path in self._index.manifests()}
+        # Dimensions, colours and LQIPs come from the manifests: editing one must
+        # invalidate every step that asked the index
+        self.used.update(self._manifests)
+        return self._index
+
+    @property
+    def names(self):
+        return self.index.names
+
+    def __contains__(self, name):
+        if name in self.index:
+            return True
+        # Adding this asset later must invalidate incremental builds
+        directory, template = VARIANTS['full']
+        self.used[os.path.join(self.root, directory, template.format(name=name))] = False
+        return False
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name):
+        """assets[name]['medium'] style access used by the generators"""
+        if name not in self:
+            raise KeyError(name)
+        return AssetView(self, name)
+
+    def variant(self, variant):
+        """Mapping of name -> src for a single variant"""
+        return VariantView(self, variant)
+
+    def path(self, name, variant='full'):
+        """Existing file for name/variant, following FALLBACKS, or None"""
+        while variant:
+            directory, template = VARIANTS[variant]
+            rel = f"{directory}/{template.format(name=name)}"
+            path = os.path.join(self.root, directory, template.format(name=name))
+            exists = self.index.exists(rel)
+            self.used[path] = exists
+            if exists:
+                return path
+            variant = FALLBACKS.get(variant)
+        return None
+
+    def bytes(self, name, variant='full'):
+        def read():
+            path = self.path(name, variant)
+            if path is None:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        return self._memoized(('bytes', name, variant), read)
+
+    def data_url(self, name, variant='full'):
+        def encode():
+            path = self.path(name, variant)
+            if path is None:
+                return None
+            cache = self.cache or data_urls()
+            return cache.data_url(path, mime_type(path))
+        return self._memoized(('data', name, variant), encode)
+
+    def file_url(self, name, variant='full'):
+        """Publish name/variant as a content-hashed file and return its URL"""
+        def publish_variant():
+            path = self.path(name, variant)
+            if path is None:
+                return None
+            cache = self.cache or data_urls()
+            filename = publish(path, name, self.publish_dir, cache.content_hash(path))
+            self.published.add(os.path.join(self.publish_dir, filename))
+            return self.base_url + filename
+        return self._memoized(('file', name, variant), publish_variant)
+
+    def publish_file(self, path):
+        """Publish any file under the asset root and return its hashed URL"""
+        def publish_path():
+            cache = self.cache or data_urls()
+            name = os.path.splitext(os.path.basename(path))[0]
+            filename = publish(path, name, self.publish_dir, cache.content_hash(path))
+            self.used[path] = True
+            self.published.add(os.path.join(self.publish_dir, filename))
+            return self.base_url + filename
+        return self._memoized(('path', path), publish_path)
+
+    def src(self, name, variant='full'):
+        """Value for an <img src>: a file URL in external mode, else a data URL"""
+        if self.publish_dir:
+            return self.file_url(name, variant)
+        return self.data_url(name, variant)
+
+    def sized_src(self, name, width):
+        """
+        src of the smallest image of name at least width px wide: a resized
+        variant, else the master resized to width (needs Pillow), else full.
+        """
+        for variant in ('mobile', 'medium'):
+            if VARIANT_WIDTHS[variant] >= width:
+                return self.src(name, variant)
+        return self._memoized(('sized', name, width), lambda: self._resized_src(name, width))
+
+    def _resized_src(self, name, width):
+        master = self.path(name)
+        if master is None:
+            return None
+        from aether.variants import sized_variant
+        path = sized_variant(master, width)
+        if path is None:
+            return self.src(name)
+
+        self.used[path] = True
+        cache = self.cache or data_urls()
+        if self.publish_dir:
+            filename = publish(path, f"{name}_{width}w", self.publish_dir, cache.content_hash(path))
+            self.published.add(os.path.join(self.publish_dir, filename))
+            return self.base_url + filename
+        return cache.data_url(path, mime_type(path))
+
+    @property
+    def loaded(self):
+        """Number of name/variant pairs resolved so far"""
+        return sum(1 for value, _, _ in self._memo.values() if value is not None)
+
+class AssetView:
+    """One asset; indexing by variant resolves its src"""
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __getitem__(self, variant):
+        return self.registry.src(self.name, variant)
+
+class VariantView:
+    """One variant across all assets; indexing by name resolves its src"""
+
+    def __init__(self, registry, variant):
+        self.registry = registry
+        self.variant = variant
+
+    def __contains__(self, name):
+        return name in self.registry
+
+    def __len__(self):
+        return len(self.registry)
+
+    def __getitem__(self, name):
+        if name not in self.registry:
+            raise KeyError(name)
+        return self.registry.src(name, self.variant)
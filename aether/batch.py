@@ -0,0 +1,122 @@
+"""
+Parallel multi-page builds.
+
+Pages come from a glob or a site config and are built on a process pool.
+All workers share the on-disk caches in .aether-cache/ (data URLs, step
+records), which are written atomically and safe to use concurrently.
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from aether import pipeline
+
+SITE_CONFIG = "aether-site.json"
+OUT_DIR = "build"
+
+class PageBuildError(Exception):
+    """A page failed; carries the page and the worker's log and traceback"""
+
+    def __init__(self, page, log, details):
+        super().__init__(f"{page['input']}: {details.strip().splitlines()[-1]}")
+        self.page = page
+        self.log = log
+        self.details = details
+
+    def __reduce__(self):
+        # Rebuilt from its fields when sent back from a worker process
+        return (PageBuildError, (self.page, self.log, self.details))
+
+def load_site(path=SITE_CONFIG):
+    """
+    Pages from a site config:
+
+        {"out_dir": "build", "steps": [...], "options": {...},
+         "pages": ["a.html", {"input": "b.html", "output": "b.html", "steps": [...]}]}
+
+    Page entries inherit steps and options from the top level; outputs are
+    relative to out_dir.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        site = json.load(f)
+    out_dir = site.get('out_dir', OUT_DIR)
+    pages = []
+    for entry in site['pages']:
+        if isinstance(entry, str):
+            entry = {'input': entry}
+        pages.append({
+            'input': entry['input'],
+            'output': os.path.join(out_dir, entry.get('output', os.path.basename(entry['input']))),
+            'steps': entry.get('steps', site.get('steps', pipeline.DEFAULT_STEPS)),
+            'options': {**site.get('options', {}), **entry.get('options', {})},
+        })
+    return pages
+
+def pages_from_glob(pattern, out_dir=OUT_DIR, steps=None, options=None):
+    return [{
+        'input': path,
+        'output': os.path.join(out_dir, os.path.basename(path)),
+        'steps': pipeline.DEFAULT_STEPS if steps is None else steps,
+        'options': dict(options or {}),
+    } for path in sorted(glob.glob(pattern))]
+
+def build_page(page, incremental=True):
+    """Worker: build one page, returning (seconds, captured log)"""
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            pipeline.build(page['input'], page['output'], page['steps'],
+                           dict(page['options']), incremental=incremental)
+    except Exception:
+        raise PageBuildError(page, log.getvalue(), traceback.format_exc())
+    return time.perf_counter() - start, log.getvalue()
+
+def build_all(pages, jobs=None, incremental=True, verbose=False):
+    """Build pages in parallel; stop at the first failure and raise it"""
+    if not pages:
+        print("No pages to build")
+        return {}
+
+    # Unknown transform names fail here, before any worker starts
+    for page in pages:
+        pipeline.transforms_for(page['steps'])
+
+    workers = jobs or os.cpu_count()
+    print(f"Building {len(pages)} pages on {workers} worker{'s' if workers != 1 else ''}...")
+    start = time.perf_counter()
+    timings = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(build_page, page, incremental): page for page in pages}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+            for future in done:
+                page = futures[future]
+                error = future.exception()
+                if error is not None:
+                    for other in pending:
+                        other.cancel()
+                    if isinstance(error, BrokenProcessPool):
+                        # The worker died (killed, out of memory, ...) before it could report
+                        error = PageBuildError(page, "", f"BrokenProcessPool: {error}")
+                    print(f"\nFAILED {page['input']}")
+                    if isinstance(error, PageBuildError):
+                        print(error.log + error.details)
+                    raise error
+                seconds, log = future.result()
+                timings[page['output']] = seconds
+                if verbose:
+                    print(log)
+                status = "up to date" if "is up to date" in log else f"{seconds:.2f}s"
+                print(f"  {page['output']}: {status}")
+
+    print(f"\nBuilt {len(timings)} pages in {time.perf_counter() - start:.2f}s")
+    return timings
@@ -0,0 +1,133 @@
+"""
+Precompressed siblings for built pages and assets.
+
+Every HTML, CSS, JS, JSON and SVG file of a build gets a <file>.gz next
+to it, and a <file>.br when the brotli module is installed, so the server
+sends those as they are (gzip_static / brotli_static in
+server-config/nginx.conf, the rewrite rules in server-config/.htaccess)
+instead of compressing the same bytes on every request.
+
+gzip output comes from zopfli when it is installed and from zlib at level
+9 otherwise; brotli runs at quality 11. Compressed bytes are stored under
+.aether-cache/compressed by content hash, so a page rebuilt with the same
+bytes, or a file shared by several builds, is only compressed once.
+Files are compressed on a process pool.
+"""
+
+import gzip
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aether.assetcache import CACHE_DIR, file_sha256
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zopfli.gzip as zopfli_gzip
+except ImportError:
+    zopfli_gzip = None
+
+COMPRESSIBLE = ('.html', '.css', '.js', '.json', '.svg')
+
+def gzip_bytes(data):
+    if zopfli_gzip is not None:
+        return zopfli_gzip.compress(data)
+    # mtime=0 keeps the output the same for the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def brotli_bytes(data):
+    return brotli.compress(data, quality=11)
+
+def encoders():
+    """[(sibling extension, compress function)] available here"""
+    result = [('.gz', gzip_bytes)]
+    if brotli is not None:
+        result.append(('.br', brotli_bytes))
+    return result
+
+def compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE
+
+def find_files(paths):
+    """Compressible files among paths, walking directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                files.extend(os.path.join(directory, name) for name in sorted(names)
+                             if compressible(name))
+        elif os.path.isfile(path) and compressible(path):
+            files.append(path)
+    return files
+
+def up_to_date(path, sibling):
+    try:
+        return os.stat(sibling).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+def compress_file(path, cache_dir=CACHE_DIR):
+    """
+    Worker: write path's siblings that are missing or older than path.
+    Returns (size, {extension: sibling size}) for the siblings written.
+    """
+    stale = [(ext, encode) for ext, encode in encoders() if not up_to_date(path, path + ext)]
+    if not stale:
+        return os.path.getsize(path), {}
+
+    directory = os.path.join(cache_dir, "compressed")
+    os.makedirs(directory, exist_ok=True)
+    sha = file_sha256(path)
+    size = os.path.getsize(path)
+    written = {}
+    for ext, encode in stale:
+        cached = os.path.join(directory, sha + ext)
+        if not os.path.exists(cached):
+            with open(path, 'rb') as f:
+                data = encode(f.read())
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, cached)
+        if os.path.getsize(cached) >= size:
+            # Not worth sending; the server falls back to the file itself
+            if os.path.exists(path + ext):
+                os.remove(path + ext)
+            continue
+        tmp = f"{path}{ext}.{os.getpid()}.tmp"
+        shutil.copyfile(cached, tmp)
+        os.replace(tmp, path + ext)
+        written[ext] = os.path.getsize(path + ext)
+    return size, written
+
+def precompress(paths, jobs=None, cache_dir=CACHE_DIR):
+    """Write .gz / .br siblings for the compressible files in paths"""
+    start = time.perf_counter()
+    files = find_files(paths)
+    if brotli is None:
+        print("Note: brotli is not installed, writing .gz siblings only")
+
+    totals = {}
+    before = count = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(compress_file, path, cache_dir) for path in files]
+        for future in futures:
+            size, written = future.result()
+            if written:
+                before += size
+                count += 1
+            for ext, compressed in written.items():
+                totals[ext] = totals.get(ext, 0) + compressed
+
+    if not totals:
+        print(f"Precompressed siblings of {len(files)} files are up to date")
+        return totals
+    sizes = ", ".join(f"{ext} {size / 1024 / 1024:.2f} MB" for ext, size in sorted(totals.items()))
+    print(f"Precompressed {count} of {len(files)} files in {time.perf_counter() - start:.2f}s "
+          f"({before / 1024 / 1024:.2f} MB -> {sizes})")
+    return totals
@@ -0,0 +1,244 @@
+"""
+Critical CSS.
+
+Only the rules that can style what is on screen before any window is
+opened stay in the page's blocking <style>: the loading screen, the access
+overlay, the desktop buttons and the taskbar (REGIONS), plus global rules
+(:root, html, body, *). The rest is loaded once that markup is on screen:
+
+- single-file pages: a <style> just before </body>, parsed after
+  everything above the fold;
+- --external-assets: a hashed .css file next to the page, preloaded and
+  applied when it arrives (a <noscript> link without JS).
+
+A rule counts as critical when every class, id and element name in one of
+its selectors occurs in those regions, or when it hides elements
+(display: none) so closed windows stay out of the first layout. A critical rule that would jump
+ahead of a deferred rule setting the same properties is inlined and also
+kept in the deferred sheet, so once everything is loaded the cascade is
+the original one.
+"""
+
+import re
+
+from aether import css
+from aether.stream import is_end_tag, tag_name
+
+REGIONS = ('loading-screen', 'access-overlay', 'desktop', 'taskbar')
+# Classes the page scripts toggle on those regions while they are on screen
+STATE_CLASSES = ('hidden', 'show', 'active')
+GLOBAL_TAGS = ('html', 'body')
+
+# Media queries that never apply to a first paint on screen
+DEFERRED_MEDIA = ('print', 'prefers-contrast', 'orientation: landscape')
+
+CLASS_RE = re.compile(r'\sclass=(["\'])(.*?)\1', re.S)
+ID_RE = re.compile(r'\sid=(["\'])(.*?)\1', re.S)
+KEYFRAMES_RE = re.compile(r'@(?:-\w+-)?keyframes\s+([-\w]+)')
+
+class AboveTheFold:
+    """Class names, ids and element names used inside the REGIONS elements"""
+
+    def __init__(self):
+        self.classes = set(STATE_CLASSES)
+        self.ids = set()
+        self.tags = set(GLOBAL_TAGS)
+        # ('.', class) / ('#', id) found anywhere outside the regions
+        self.outside = set()
+        # (element name, nesting depth) of the region being read
+        self.region = None
+        self.regions = 0
+
+    def tag(self, text):
+        name = tag_name(text)
+        if self.region:
+            if name == self.region[0]:
+                depth = self.region[1] + (-1 if is_end_tag(text) else 1)
+                self.region = (name, depth) if depth else None
+        elif not is_end_tag(text):
+            match = CLASS_RE.search(text)
+            if match and not set(match.group(2).split()).isdisjoint(REGIONS):
+                self.region = (name, 1)
+                self.regions += 1
+        if is_end_tag(text):
+            return
+        if self.region or name in GLOBAL_TAGS:
+            self.add(name, text)
+        else:
+            match = CLASS_RE.search(text)
+            if match:
+                self.outside.update(('.', cls) for cls in match.group(2).split())
+            match = ID_RE.search(text)
+            if match:
+                self.outside.add(('#', match.group(2)))
+
+    def add(self, name, text):
+        self.tags.add(name)
+        match = CLASS_RE.search(text)
+        if match:
+            self.classes.update(match.group(2).split())
+        match = ID_RE.search(text)
+        if match:
+            self.ids.add(match.group(2))
+
+    def has(self, sign, name, tag):
+        if sign == '.':
+            return name in self.classes
+        if sign == '#':
+            return name in self.ids
+        return tag.lower() in self.tags
+
+    def matches(self, selector):
+        """Whether selector can match an element of the regions"""
+        for part in css.split_top(selector, ','):
+            if all(self.has(*name) for name in css.selector_names(part)):
+                return True
+        return False
+
+    def confined(self, selector):
+        """
+        Whether selector only matches elements inside the regions: each of
+        its selectors needs a class or id used nowhere else, and has no
+        sibling combinator to step outside.
+        """
+        for part in css.split_top(selector, ','):
+            bare = css.SELECTOR_NOISE_RE.sub('', part)
+            if '+' in bare or '~' in bare:
+                return False
+            names = {(sign, name) for sign, name, _ in css.selector_names(part) if sign}
+            if not any(name not in STATE_CLASSES and (sign, name) not in self.outside
+                       for sign, name in names):
+                return False
+        return True
+
+def deferred_media(conditions):
+    return any(media in condition for condition in conditions for media in DEFERRED_MEDIA)
+
+def hides(rule):
+    """Whether rule takes elements out of the page (closed windows, ...)"""
+    return any(prop == 'display' and value == 'none' for prop, value, _ in rule.declarations)
+
+def animations(rules):
+    """Names used in the animation properties of rules"""
+    names = set()
+    for rule in rules:
+        for prop, value, _ in rule.declarations:
+            if prop in ('animation', 'animation-name'):
+                names.update(re.findall(r'[-\w]+', value))
+    return names
+
+def split(stylesheet, fold):
+    """(critical, deferred) stylesheets for the page regions in fold"""
+    items = css.parse(stylesheet)
+    critical = [item for item in items if isinstance(item, css.Rule) and not deferred_media(item.conditions)
+                and (fold.matches(item.selector) or hides(item))]
+    used = animations(critical)
+    chosen = set(map(id, critical))
+    matching = {id(item) for item in items if isinstance(item, css.Rule) and fold.matches(item.selector)}
+
+    inline, deferred = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, css.Block):
+            if item.barrier and item.text.startswith('@'):
+                # @import / @charset only count before the first rule
+                if not any(isinstance(before, css.Rule) for before in items[:index]):
+                    inline.append(item)
+                continue
+            if item.text.startswith('@font-face'):
+                inline.append(item)
+                continue
+            keyframes = KEYFRAMES_RE.match(item.text)
+            if keyframes and keyframes.group(1) in used:
+                # Animations look up keyframes by name, wherever they are
+                inline.append(item)
+            deferred.append(item)
+        elif id(item) in chosen:
+            inline.append(item)
+            # Deferred rules cannot match the elements of a confined rule,
+            # except those deferred only for their media query
+            passed = [d for d in deferred if not isinstance(d, css.Rule) or id(d) in matching] \
+                if fold.confined(item.selector) else deferred
+            if not css.can_move(passed, 0, len(passed), item):
+                deferred.append(item)
+        else:
+            deferred.append(item)
+    return (css.format_groups(css.group(inline)), css.format_groups(css.group(deferred)),
+            len(critical))
+
+class PageScan:
+    """
+    One pass over a page: the above-the-fold names and the page's blocking
+    stylesheet, i.e. the plain <style> elements in <head> that are not
+    followed by any other stylesheet.
+    """
+
+    def __init__(self, events):
+        self.fold = AboveTheFold()
+        self.run = None
+        self.texts = []
+        self.body_end = False
+        self.movable = True
+
+        scanner = css.StyleScanner()
+        in_head = True
+        for kind, text in events:
+            run = scanner.step(kind, text)
+            if kind != 'tag':
+                if kind == 'style' and run is not None:
+                    if in_head and self.run in (None, run):
+                        self.run = run
+                        self.texts.append(text)
+                    elif run == self.run:
+                        # Part of the stylesheet sits in <body>
+                        self.movable = False
+                continue
+            name = tag_name(text)
+            if name == 'head' and is_end_tag(text) or name == 'body' and not is_end_tag(text):
+                in_head = False
+            elif name == 'body':
+                self.body_end = True
+            self.fold.tag(text)
+        if self.run is not None and scanner.run != self.run:
+            # A later stylesheet would come before the deferred rules
+            self.movable = False
+
+class CriticalStyles:
+    """Keeps the critical rules inline and moves the rest out of the way"""
+
+    def __init__(self, run, critical, deferred, href=None):
+        self.run = run
+        self.critical = critical
+        self.deferred = deferred
+        self.href = href
+
+    def deferred_markup(self):
+        if self.href is None:
+            return f"<style>{self.deferred}</style>\n"
+        return (f'<link rel="preload" href="{self.href}" as="style" '
+                f'onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+                f'    <noscript><link rel="stylesheet" href="{self.href}"></noscript>\n')
+
+    def rewrite(self, events):
+        scanner = css.StyleScanner()
+        seen = first = False
+        for kind, text in events:
+            run = scanner.step(kind, text)
+            if run != self.run:
+                if self.href is None and kind == 'tag' and is_end_tag(text) and tag_name(text) == 'body':
+                    yield 'text', self.deferred_markup()
+                yield kind, text
+                continue
+            if kind == 'tag' and not is_end_tag(text):
+                first, seen = not seen, True
+            if not first:
+                continue
+            if kind == 'tag' and is_end_tag(text):
+                yield 'style', self.critical
+                yield kind, text
+                if self.href is not None:
+                    yield 'text', '\n    ' + self.deferred_markup().rstrip('\n')
+            elif kind == 'tag':
+                yield kind, text
+
+    def subscribe(self, rewriter):
+        rewriter.filter(self.rewrite)
@@ -0,0 +1,492 @@
+"""
+Parsed model of a page's stylesheets.
+
+parse() reads CSS into a flat list of items in source order: a Rule per
+style rule, carrying the @media / @supports blocks it sits in, and a Block
+for everything kept verbatim (@font-face, @keyframes, @import, ...).
+
+consolidate() then merges the rules:
+
+1. per selector and media query, a declaration overridden by a later one
+   for the same property is dropped (!important taken into account);
+2. rules with the same selector and media query are merged into one;
+3. rules are gathered back into a single block per media query.
+
+Moving a rule changes its order against the rules it moves past, so a
+rule only moves past rules that set none of the same properties (or
+their shorthands), whatever their selector. Repeated values of one
+property inside a single rule are browser fallbacks and are kept.
+
+The 'css' build step consolidates all plain <style> elements of a page
+into the first one, unless the result would be larger (minified CSS).
+"""
+
+import re
+
+from aether.stream import is_end_tag, tag_name
+
+INDENT = '    '
+# Indentation of a top-level rule inside <style>
+BASE_INDENT = INDENT * 2
+
+COMMENT_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\\.|[()\[\]{};:,]', re.S)
+IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.I)
+AT_NAME_RE = re.compile(r'@([-\w]+)')
+# Stripped from selectors before reading their names: :not(...) / :nth-child(...)
+# arguments, attribute selectors, pseudo-classes and pseudo-elements
+SELECTOR_NOISE_RE = re.compile(r'\([^()]*\)|\[[^\]]*\]|::?[-\w]+')
+SELECTOR_NAME_RE = re.compile(r'([.#])(-?[_a-zA-Z][-\w]*)|(?:^|(?<=[\s>+~]))([a-zA-Z][-\w]*)')
+PSEUDO_ELEMENT_RE = re.compile(r'::([-\w]+)|:(before|after|first-line|first-letter)\b', re.I)
+
+# Conditional group rules: their contents are parsed as rules
+CONDITIONAL = ('media', 'supports', 'container')
+# Statements that must keep their place in the sheet
+ORDERED = ('charset', 'import', 'namespace', 'layer')
+
+# Properties grouped with their shorthand beyond the shared first word
+# (margin-top -> margin): a move is only checked against whole families
+FAMILY_ALIASES = {
+    'line': 'font',
+    'top': 'inset', 'right': 'inset', 'bottom': 'inset', 'left': 'inset',
+    'gap': 'grid', 'row': 'grid', 'column': 'grid',
+    'place': 'align', 'justify': 'align',
+}
+# Sets every property
+ALL = '*'
+
+class Rule:
+    """Style rule: selector, its conditions and [prop, value, important] list"""
+
+    def __init__(self, conditions, selector, declarations):
+        self.conditions = conditions
+        self.selector = selector
+        self.declarations = declarations
+        self.subjects = [subject(part) for part in split_top(selector, ',')]
+
+    @property
+    def key(self):
+        return self.conditions, self.selector
+
+    def families(self):
+        return {family(prop) for prop, _, _ in self.declarations}
+
+    def disjoint(self, other):
+        """Whether no element can match both selectors"""
+        return all(a != b and (a[1] != b[1] or (a[0] and b[0]))
+                   for a in self.subjects for b in other.subjects)
+
+class Block:
+    """CSS kept as written; a barrier stops rules moving past it"""
+
+    def __init__(self, conditions, text, barrier=False):
+        self.conditions = conditions
+        self.text = text
+        self.barrier = barrier
+
+def family(prop):
+    """Shorthand family of a property, for conflict checks"""
+    if prop.startswith('--'):
+        return prop
+    prop = re.sub(r'^-(webkit|moz|ms|o)-', '', prop)
+    if prop == 'all':
+        return ALL
+    root = prop.split('-')[0]
+    return FAMILY_ALIASES.get(root, root)
+
+def subject(selector):
+    """(element name or None, pseudo-element or None) a selector matches"""
+    depth = 0
+    start = 0
+    for index, char in enumerate(selector):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif depth == 0 and char in ' >+~':
+            start = index + 1
+    compound = re.sub(r'\([^()]*\)|\[[^\]]*\]', '', selector[start:])
+    name = re.match(r'[A-Za-z][-\w]*', compound)
+    pseudo = PSEUDO_ELEMENT_RE.search(compound)
+    return (name.group().lower() if name else None,
+            pseudo.group(1) or pseudo.group(2) if pseudo else None)
+
+def selector_names(selector):
+    """
+    Names a complex selector requires, as (sign, name, element):
+    ('.', class, ''), ('#', id, '') or ('', '', element name)
+    """
+    return SELECTOR_NAME_RE.findall(SELECTOR_NOISE_RE.sub('', selector.strip()))
+
+def conflicts(families, others):
+    if ALL in families or ALL in others:
+        return bool(families and others)
+    return not families.isdisjoint(others)
+
+def strip_comments(css):
+    return COMMENT_RE.sub(lambda m: m.group(1) or '', css)
+
+def find_stop(css, pos, stops):
+    """Offset of the first of stops outside strings and brackets, or len(css)"""
+    depth = 0
+    for match in TOKEN_RE.finditer(css, pos):
+        token = match.group()
+        if token in ('(', '['):
+            depth += 1
+        elif token in (')', ']'):
+            depth = max(depth - 1, 0)
+        elif depth == 0 and token in stops:
+            return match.start()
+    return len(css)
+
+def block_end(css, start):
+    """Offset just past the '}' closing the block opened at css[start]"""
+    depth = 0
+    for match in TOKEN_RE.finditer(css, start):
+        token = match.group()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return len(css)
+
+def split_top(text, separator):
+    """text split on separator outside strings and brackets"""
+    parts = []
+    pos = 0
+    while pos <= len(text):
+        stop = find_stop(text, pos, separator)
+        parts.append(text[pos:stop])
+        pos = stop + 1
+    return parts
+
+def normalize(text):
+    return ' '.join(text.split())
+
+def normalize_selector(prelude):
+    return ', '.join(normalize(part) for part in split_top(prelude, ','))
+
+def parse_declarations(body):
+    """[[prop, value, important]], or None if body is not a plain declaration list"""
+    declarations = []
+    for part in split_top(body, ';'):
+        if not part.strip():
+            continue
+        colon = find_stop(part, 0, ':')
+        if colon == len(part) or '{' in part:
+            return None
+        prop = part[:colon].strip()
+        if not prop.startswith('--'):
+            prop = prop.lower()
+        value = part[colon + 1:].strip()
+        important = bool(IMPORTANT_RE.search(value))
+        if important:
+            value = IMPORTANT_RE.sub('', value)
+        declarations.append([prop, value, important])
+    return declarations
+
+def parse_items(css, conditions):
+    pos = 0
+    while pos < len(css):
+        stop = find_stop(css, pos, '{;}')
+        prelude = css[pos:stop].strip()
+        if stop == len(css):
+            if prelude:
+                yield Block(conditions, prelude, barrier=True)
+            return
+
+        if css[stop] != '{':
+            # Statement (@import ...) or a stray ';' / '}'
+            if prelude or css[stop] == '}':
+                at = AT_NAME_RE.match(prelude)
+                yield Block(conditions, prelude + css[stop],
+                            barrier=not at or at.group(1).lower() in ORDERED)
+            pos = stop + 1
+            continue
+
+        end = block_end(css, stop)
+        body = css[stop + 1:end - 1]
+        at = AT_NAME_RE.match(prelude)
+        if at and at.group(1).lower() in CONDITIONAL:
+            yield from parse_items(body, conditions + (normalize(prelude),))
+        elif at:
+            yield Block(conditions, css[pos:end].strip(),
+                        barrier=at.group(1).lower() in ORDERED)
+        else:
+            declarations = parse_declarations(body)
+            if declarations is None:
+                # Nested rules or a broken block
+                yield Block(conditions, css[pos:end].strip(), barrier=True)
+            else:
+                yield Rule(conditions, normalize_selector(prelude), declarations)
+        pos = end
+
+def parse(css):
+    """Items (Rule / Block) of a stylesheet, in source order"""
+    return list(parse_items(strip_comments(css), ()))
+
+def drop_repeats(rule):
+    """Drop declarations repeated later in the same rule with the same value"""
+    seen = set()
+    kept = []
+    for declaration in reversed(rule.declarations):
+        if tuple(declaration) not in seen:
+            seen.add(tuple(declaration))
+            kept.append(declaration)
+    kept.reverse()
+    removed = len(rule.declarations) - len(kept)
+    rule.declarations = kept
+    return removed
+
+def drop_overridden(rules):
+    """
+    Drop declarations of rules sharing a selector and media query that a
+    later (or !important) declaration of the same property overrides.
+    """
+    # prop -> (importance, index of the winning rule)
+    winners = {}
+    for index, rule in enumerate(rules):
+        for prop, _, important in rule.declarations:
+            if important or not winners.get(prop, (False,))[0]:
+                winners[prop] = (important, index)
+
+    removed = 0
+    for index, rule in enumerate(rules):
+        kept = [d for d in rule.declarations if winners[d[0]] == (d[2], index)]
+        removed += len(rule.declarations) - len(kept)
+        rule.declarations = kept
+    return removed
+
+def can_move(items, start, stop, rule):
+    """Whether rule can move across items[start:stop]"""
+    families = rule.families()
+    for item in items[start:stop]:
+        if item is None:
+            continue
+        if isinstance(item, Block):
+            if item.barrier:
+                return False
+        elif conflicts(families, item.families()) and not rule.disjoint(item):
+            return False
+    return True
+
+def merge_rules(items):
+    """Merge each rule into the next with the same selector and media query"""
+    merged = 0
+    positions = {}
+    for index, item in enumerate(items):
+        if isinstance(item, Rule):
+            positions.setdefault(item.key, []).append(index)
+
+    for indexes in positions.values():
+        current = indexes[0]
+        for later in indexes[1:]:
+            rule, next_rule = items[current], items[later]
+            if can_move(items, current + 1, later, rule):
+                # Forward into the later rule
+                next_rule.declarations = rule.declarations + next_rule.declarations
+                items[current] = None
+                current = later
+            elif can_move(items, current + 1, later, next_rule):
+                # Back into the earlier one
+                rule.declarations = rule.declarations + next_rule.declarations
+                items[later] = None
+            else:
+                current = later
+                continue
+            merged += 1
+    return [item for item in items if item is not None], merged
+
+def group(items):
+    """
+    [(conditions, [items])]: runs of items under the same media query,
+    with each rule moved back into the last earlier run of its media
+    query when nothing in between conflicts with it.
+    """
+    groups = []
+    for item in items:
+        if groups and groups[-1][0] == item.conditions:
+            groups[-1][1].append(item)
+            continue
+        target = None
+        if isinstance(item, Rule) and item.conditions:
+            for index in range(len(groups) - 1, -1, -1):
+                between = [i for _, run in groups[index + 1:] for i in run]
+                if groups[index][0] == item.conditions:
+                    if can_move(between, 0, len(between), item):
+                        target = index
+                    break
+        if target is None:
+            groups.append((item.conditions, [item]))
+        else:
+            groups[target][1].append(item)
+    return groups
+
+def format_rule(rule, indent):
+    selector = (',\n' + indent).join(rule.selector.split(', '))
+    lines = [f"{indent}{selector} {{"]
+    for prop, value, important in rule.declarations:
+        lines.append(f"{indent}{INDENT}{prop}: {value}{' !important' if important else ''};")
+    lines.append(f"{indent}}}")
+    return '\n'.join(lines)
+
+def format_item(item, indent):
+    if isinstance(item, Rule):
+        return format_rule(item, indent)
+    return indent + item.text
+
+def format_groups(groups):
+    parts = []
+    for conditions, run in groups:
+        indent = BASE_INDENT + INDENT * len(conditions)
+        body = '\n\n'.join(format_item(item, indent) for item in run
+                           if not isinstance(item, Rule) or item.declarations)
+        if not body:
+            continue
+        for depth in range(len(conditions) - 1, -1, -1):
+            outer = BASE_INDENT + INDENT * depth
+            body = f"{outer}{conditions[depth]} {{\n{body}\n{outer}}}"
+        parts.append(body)
+    return '\n' + '\n\n'.join(parts) + '\n    '
+
+def media_blocks(items):
+    """Number of conditional blocks the items are written in"""
+    return sum(1 for index, item in enumerate(items)
+               if item.conditions and (index == 0 or items[index - 1].conditions != item.conditions))
+
+class Stats:
+    """What a consolidation removed"""
+
+    def __init__(self):
+        self.repeats = 0
+        self.overridden = 0
+        self.merged = 0
+        self.media_before = 0
+        self.media_after = 0
+
+    def add(self, other):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+def consolidate(css, stats=None):
+    """One stylesheet equivalent to css with duplicate rules merged"""
+    stats = stats if stats is not None else Stats()
+    items = parse(css)
+    stats.media_before += media_blocks(items)
+
+    rules = {}
+    for item in items:
+        if isinstance(item, Rule):
+            stats.repeats += drop_repeats(item)
+            rules.setdefault(item.key, []).append(item)
+    for same in rules.values():
+        if len(same) > 1:
+            stats.overridden += drop_overridden(same)
+
+    # Grouping can bring same-selector rules together, so repeat until stable
+    while True:
+        items, merged = merge_rules(items)
+        stats.merged += merged
+        groups = group(items)
+        if not merged:
+            break
+        items = [item for _, run in groups for item in run]
+    stats.media_after += sum(1 for conditions, _ in groups if conditions)
+    return format_groups(groups)
+
+# Elements whose <style> children do not apply to the page as usual
+EXCLUDED_PARENTS = ('noscript', 'template', 'svg')
+
+class StyleScanner:
+    """
+    Follows a page's events and numbers the runs of <style> elements that
+    can be consolidated: plain <style> (or type="text/css") elements not
+    separated by another stylesheet (a <link rel=stylesheet> or a <style>
+    with other attributes).
+    """
+
+    STYLE_RE = re.compile(r'<style(\s+type=(["\']?)text/css\2)?\s*>$', re.I)
+
+    def __init__(self):
+        self.excluded = 0
+        self.run = 0
+        self.current = None
+
+    def step(self, kind, text):
+        """Run number of the <style> element this event belongs to, or None"""
+        if kind in ('style', 'text', 'comment') and self.current is not None:
+            return self.current if kind == 'style' else None
+        if kind != 'tag':
+            return None
+
+        name = tag_name(text)
+        if name in EXCLUDED_PARENTS and not text.endswith('/>'):
+            self.excluded += -1 if is_end_tag(text) else 1
+            self.excluded = max(self.excluded, 0)
+        elif name == 'style':
+            if is_end_tag(text):
+                run, self.current = self.current, None
+                return run
+            if not self.excluded and self.STYLE_RE.match(text):
+                self.current = self.run
+                return self.current
+            self.run += 1
+        elif name == 'link' and re.search(r'rel=["\']?stylesheet', text, re.I):
+            self.run += 1
+        return None
+
+def collect(events):
+    """{run: [stylesheet text]} of a page's consolidatable <style> elements"""
+    scanner = StyleScanner()
+    sheets = {}
+    for kind, text in events:
+        run = scanner.step(kind, text)
+        if run is not None and kind == 'style':
+            sheets.setdefault(run, []).append(text)
+    return sheets
+
+class PageStyles:
+    """Replaces each run of <style> elements with one consolidated element"""
+
+    def __init__(self, sheets):
+        self.stats = Stats()
+        self.merged = {}
+        self.elements = self.before = self.after = 0
+        for run, texts in sheets.items():
+            original = ''.join(texts)
+            stats = Stats()
+            merged = consolidate(original, stats)
+            if len(merged) >= len(original):
+                # Minified CSS the rewrite would only spread out
+                continue
+            self.merged[run] = merged
+            self.stats.add(stats)
+            self.elements += len(texts)
+            self.before += len(original)
+            self.after += len(merged)
+
+    def rewrite(self, events):
+        scanner = StyleScanner()
+        written = set()
+        first = False
+        for kind, text in events:
+            run = scanner.step(kind, text)
+            if run not in self.merged:
+                yield kind, text
+                continue
+            if kind == 'tag' and not is_end_tag(text):
+                first = run not in written
+                written.add(run)
+            if not first:
+                # Part of a later element of the run: its CSS is in the first one
+                continue
+            if kind == 'tag' and is_end_tag(text):
+                yield 'style', self.merged[run]
+                yield kind, text
+            elif kind == 'tag':
+                yield kind, text
+
+    def subscribe(self, rewriter):
+        rewriter.filter(self.rewrite)
@@ -0,0 +1,161 @@
+"""
+Deferred window and tab content.
+
+Only one desktop window (or tab) of a page is open at a time, but the
+browser parses, lays out and decodes the images of all of them on load.
+This step moves the content of each hidden panel - a .window's
+.window-content, or a whole .tab-content - into an inert <template
+data-deferred>. The panel element, its header and its id stay where they
+are, so openWindow() / openTab() and the drag and taskbar code find them
+as before.
+
+A short script before </body> watches each deferred panel's class and
+style attributes and swaps the template for its content the first time
+the panel is shown, before it is painted, whichever function showed it.
+Pooled images (see pool.py) inside the content are filled in then.
+
+A panel is left alone when it is shown on load, when its content holds
+<script> or <style> elements, the first copy of a pooled image, or an id
+or class the page's scripts refer to: those have to be in the document
+when the page's own scripts run and query it.
+"""
+
+import re
+
+from aether.stream import is_end_tag, tag_name
+
+CLASS_RE = re.compile(r'\sclass=(["\'])(.*?)\1', re.S)
+ID_RE = re.compile(r'\sid=(["\'])(.*?)\1')
+DISPLAY_RE = re.compile(r'\sstyle=(["\'])[^"\']*display\s*:\s*(?!none)', re.I)
+POOL_RE = re.compile(r'\sdata-pool=')
+
+# Panel class -> class of the element whose content is deferred (None: the panel's own)
+PANELS = {'window': 'window-content', 'tab-content': None}
+
+HYDRATE_JS = '''<script>
+    // Deferred panels: a hidden window's or tab's content is parsed when first shown
+    document.querySelectorAll('template[data-deferred]').forEach(template => {
+        const panel = document.getElementById(template.dataset.deferred);
+        const observer = new MutationObserver(hydrate);
+        function hydrate() {
+            if (getComputedStyle(panel).display === 'none') return;
+            observer.disconnect();
+            const content = template.content;
+            content.querySelectorAll('img[data-pool-src]').forEach(img => {
+                const source = document.querySelector(`img[data-pool="${img.dataset.poolSrc}"]`);
+                if (source) img.src = source.src;
+            });
+            template.replaceWith(content);
+        }
+        observer.observe(panel, { attributes: true, attributeFilter: ['class', 'style'] });
+        hydrate();
+    });
+</script>
+'''
+
+def classes(tag):
+    match = CLASS_RE.search(tag)
+    return match.group(2).split() if match else []
+
+def element_id(tag):
+    match = ID_RE.search(tag)
+    return match.group(2) if match else None
+
+def walk(events):
+    """
+    (kind, text, panel id, place) for each event; place is 'open' / 'close'
+    for the start and end tag of a panel's deferrable element, 'inside'
+    between them and None elsewhere.
+    """
+    panel = None
+    for kind, text in events:
+        if kind != 'tag' or (panel is None and is_end_tag(text)):
+            inside = panel is not None and panel['content'] and panel['content'][1] is not None
+            yield kind, text, panel and panel['id'], 'inside' if inside else None
+            continue
+        name, step = tag_name(text), -1 if is_end_tag(text) else 1
+        place = None
+        if panel is None:
+            found = [cls for cls in classes(text) if cls in PANELS]
+            if not found or not element_id(text):
+                yield kind, text, None, None
+                continue
+            panel = {'id': element_id(text), 'tag': name, 'depth': 0,
+                     'inner': PANELS[found[0]], 'content': None}
+        if panel['content'] is None and step > 0 and (panel['inner'] is None
+                                                      or panel['inner'] in classes(text)):
+            # [element name, depth] of the element whose content is deferred
+            panel['content'] = [name, 0]
+            place = 'open'
+        content = panel['content']
+        if content and content[1] is not None:
+            if content[0] == name:
+                content[1] += step
+            if content[1] == 0:
+                content[1] = None
+                place = 'close'
+            elif place is None:
+                place = 'inside'
+        if name == panel['tag']:
+            panel['depth'] += step
+        current = panel['id']
+        if panel['depth'] == 0:
+            panel = None
+        yield kind, text, current, place
+
+def scan(events, names):
+    """
+    Scan a page's events once; names is the page's prune.PageNames.
+
+    Returns ({panel id: reason it stays, or None if its content can be
+    deferred}, whether the page has a </body> for the hydration script).
+    """
+    panels = {}
+    body_end = False
+    for kind, text, panel, place in walk(events):
+        if kind == 'tag' and is_end_tag(text) and tag_name(text) == 'body':
+            body_end = True
+        if panel is None:
+            continue
+        if panel not in panels:
+            panels[panel] = None
+            if 'active' in classes(text) or DISPLAY_RE.search(text):
+                panels[panel] = "shown on load"
+        if panels[panel] is not None or place != 'inside':
+            continue
+        if kind in ('script', 'style'):
+            panels[panel] = f"holds a <{kind}>"
+        elif kind == 'tag' and POOL_RE.search(text):
+            panels[panel] = "holds a pooled image"
+        elif kind == 'tag' and element_id(text) and names.scripted(element_id(text)):
+            panels[panel] = f"scripts use #{element_id(text)}"
+        elif kind == 'tag':
+            scripted = [cls for cls in classes(text) if names.scripted(cls)]
+            if scripted:
+                panels[panel] = f"scripts use .{scripted[0]}"
+    return panels, body_end
+
+class Deferrer:
+    """Wraps the content of hidden panels in <template data-deferred>"""
+
+    def __init__(self, panels):
+        self.panels = {panel for panel, reason in panels.items() if reason is None}
+        self.deferred = 0
+        self.bytes = 0
+
+    def rewrite(self, events):
+        for kind, text, panel, place in walk(events):
+            if panel in self.panels:
+                if place == 'open':
+                    text += f'<template data-deferred="{panel}">'
+                    self.deferred += 1
+                elif place == 'close':
+                    text = '</template>' + text
+                elif place == 'inside':
+                    self.bytes += len(text.encode('utf-8'))
+            if self.deferred and kind == 'tag' and is_end_tag(text) and tag_name(text) == 'body':
+                text = HYDRATE_JS + text
+            yield kind, text
+
+    def subscribe(self, rewriter):
+        rewriter.filter(self.rewrite)
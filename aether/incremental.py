@@ -0,0 +1,127 @@
+"""
+Incremental rebuilds.
+
+Each step of a build is keyed by the hash of the HTML it receives plus
+the step's fingerprint (name, version, build options and the source of
+the modules that implement it). A step record stores the hash of the
+HTML it produced together with the asset files it read and the files it
+published, so the dependency graph of a page is
+
+    input HTML -> step 1 (+ assets) -> step 2 (+ assets) -> ... -> output
+
+Each record lists only the files its own step read or wrote. A rebuild
+walks that chain: steps whose key, assets and published files are
+unchanged are skipped and their cached output is reused, also after a
+step that had to run but produced the same HTML as before, and a page
+whose whole chain is unchanged is not rebuilt at all.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+from aether.assetcache import CACHE_DIR, data_urls, write_atomic
+from aether.stream import write_chunks
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def file_sha256(path):
+    """Content hash via the shared stat-fast-path cache"""
+    return data_urls().content_hash(path)
+
+def fingerprint(func, options):
+    """Hash of a transform's identity, implementation and build options"""
+    digest = hashlib.sha256()
+    digest.update(f"{func.transform_name}:{func.transform_version}".encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    for path in sorted(func.transform_sources):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class BuildCache:
+    """Step records and content-addressed intermediate pages on disk"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.step_dir = os.path.join(cache_dir, "steps")
+        self.html_dir = os.path.join(cache_dir, "html")
+        os.makedirs(self.step_dir, exist_ok=True)
+        os.makedirs(self.html_dir, exist_ok=True)
+
+    def step_key(self, html_sha, step_fingerprint):
+        return hashlib.sha256(f"{html_sha}:{step_fingerprint}".encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """Step record for key if every dependency is still unchanged"""
+        try:
+            with open(os.path.join(self.step_dir, f"{key}.json"), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        for path, sha in record['assets'].items():
+            exists = os.path.exists(path)
+            if sha is None:
+                # A variant that was missing (and fell back) must still be missing
+                if exists:
+                    return None
+            elif not exists or file_sha256(path) != sha:
+                return None
+        if not all(os.path.exists(path) for path in record['published']):
+            return None
+        if not os.path.exists(self.html_path(record['output'])):
+            return None
+        return record
+
+    def store(self, key, step, output_sha, used, published):
+        """Record one executed step; used maps asset path -> existed"""
+        record = {
+            'step': step,
+            'output': output_sha,
+            'assets': {path: (file_sha256(path) if exists else None)
+                       for path, exists in sorted(used.items())},
+            'published': sorted(published),
+        }
+        write_atomic(os.path.join(self.step_dir, f"{key}.json"), json.dumps(record, indent=1))
+
+    def html_path(self, sha):
+        return os.path.join(self.html_dir, f"{sha}.html.gz")
+
+    def save_html(self, html):
+        sha = sha256_text(html)
+        path = self.html_path(sha)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=1) as f:
+                f.write(html)
+            os.replace(tmp, path)
+        return sha
+
+    def save_chunks(self, pieces):
+        """Store a streamed page; returns (path, sha)"""
+        staging = os.path.join(self.html_dir, f"stream.{os.getpid()}.html.gz")
+        sha = write_chunks(pieces, staging)
+        path = self.html_path(sha)
+        os.replace(staging, path)
+        return path, sha
+
+    def load_html(self, sha):
+        with gzip.open(self.html_path(sha), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def resume_point(self, input_file, funcs, options):
+        """
+        Walk the cached chain for input_file.
+
+        Returns (index, html_sha): the first step that must run (len(funcs)
+        if none) and the hash of the HTML that step receives.
+        """
+        html_sha = file_sha256(input_file)
+        for index, func in enumerate(funcs):
+            record = self.lookup(self.step_key(html_sha, fingerprint(func, options)))
+            if record is None:
+                return index, html_sha
+            html_sha = record['output']
+        return len(funcs), html_sha
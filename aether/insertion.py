@@ -0,0 +1,100 @@
+"""
+Batched HTML insertion engine.
+
+Every anchor is resolved against the original text first, then all
+insertions are spliced in one pass ordered by offset. Nothing is
+searched in a document that earlier insertions have already grown, so
+anchors cannot shift and a page with k insertions is rebuilt once
+instead of k times. Literal anchors are located together by one
+Aho-Corasick pass; regex anchors fall back to re.finditer.
+"""
+
+import re
+
+from aether.matcher import AnchorMatcher
+
+# Closing tags tried, in priority order, after an anchor match
+CLOSE_TAGS = ('</p>', '</div>', '</li>', '</h2>', '</h3>', '</span>')
+
+class InsertionPlan:
+    """Queue of "insert this HTML after the element containing that text" edits"""
+
+    def __init__(self, close_tags=CLOSE_TAGS, window=600):
+        self.close_tags = close_tags
+        # A closing tag further than this past the anchor is not "its" element
+        self.window = window
+        self.entries = []
+        # Anchors that could not be placed during the last resolve()
+        self.missing = []
+
+    def add(self, search, html, nth=1):
+        """
+        Insert html after the nth case-insensitive occurrence of search.
+
+        html may be a callable; it is only called if the anchor is found,
+        and an insertion whose callable returns None is dropped.
+        """
+        self.entries.append((None, search, html, nth))
+
+    def add_pattern(self, pattern, html, nth=1):
+        """Insert html after the nth case-insensitive match of a regex"""
+        self.entries.append((pattern, pattern, html, nth))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pattern_end(self, text, pattern, nth):
+        """End offset of the nth regex match in text, or None"""
+        for i, match in enumerate(re.finditer(pattern, text, re.IGNORECASE), 1):
+            if i == nth:
+                return match.end()
+        return None
+
+    def insertion_point(self, text, pos):
+        """Offset just after the closing tag that ends the anchor's element"""
+        for tag in self.close_tags:
+            idx = text.find(tag, pos)
+            if idx != -1 and idx < pos + self.window:
+                return idx + len(tag)
+        return None
+
+    def resolve(self, text):
+        """Return [(offset, html)] for every placeable entry, sorted by offset"""
+        self.missing = []
+        resolved = []
+
+        wanted = {}
+        for pattern, label, _, nth in self.entries:
+            if pattern is None:
+                wanted.setdefault(label, []).append(nth)
+        literal_ends = AnchorMatcher(wanted).find(text, wanted) if wanted else {}
+
+        for order, (pattern, label, html, nth) in enumerate(self.entries):
+            if pattern is None:
+                pos = literal_ends.get((label, nth))
+            else:
+                pos = self.pattern_end(text, pattern, nth)
+            offset = self.insertion_point(text, pos) if pos is not None else None
+            if offset is None:
+                self.missing.append(label)
+                continue
+            resolved.append((offset, order, html))
+
+        # Equal offsets keep the order they were queued in
+        resolved.sort()
+        return [(offset, html) for offset, _, html in resolved]
+
+    def apply(self, text):
+        """Splice every resolved insertion into text in a single pass"""
+        parts = []
+        prev = 0
+        for offset, html in self.resolve(text):
+            if callable(html):
+                html = html()
+                if html is None:
+                    continue
+            parts.append(text[prev:offset])
+            parts.append('\n' + html + '\n')
+            prev = offset
+        parts.append(text[prev:])
+        return ''.join(parts)
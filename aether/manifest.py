@@ -0,0 +1,193 @@
+"""
+Indexed view of the asset manifests.
+
+manifest/ holds overlapping JSON files (image-dimensions, placeholders,
+dominant-colors, enhanced-manifest, master-manifest, srcset-config, ...).
+ManifestIndex merges them with one listing of the variant directories
+into a single model:
+
+    asset id -> variants on disk, width/height, LQIP, dominant colour,
+                category, title and srcset config
+
+and keeps it in .aether-cache/manifest-index.json as one compact file.
+The cached model is reused while the manifests and directories it was
+built from keep their size and mtime, so build steps ask the index which
+files exist and how big an asset is instead of the filesystem.
+"""
+
+import json
+import os
+
+from aether.assetcache import CACHE_DIR, write_atomic
+from aether.assets import ASSET_ROOT, VARIANTS
+
+MANIFEST_DIR = "manifest"
+INDEX_FILE = "manifest-index.json"
+
+# Bump when the shape of the cached model changes
+FORMAT = 2
+
+# Manifest files merged into the model, lowest precedence first
+MANIFESTS = ("master-manifest.json", "enhanced-manifest.json", "placeholders.json",
+             "dominant-colors.json", "image-dimensions.json", "srcset-config.json")
+
+# Directories listed besides the VARIANTS ones; thumbnails/<w> are found by listing
+EXTRA_DIRS = ("svg", "thumbnails")
+
+def manifest_path(root, name):
+    return os.path.join(root, MANIFEST_DIR, name)
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def asset_dirs(root):
+    """Directories (relative to root) whose listings make up the index"""
+    dirs = [directory for directory, _ in VARIANTS.values()]
+    dirs.extend(EXTRA_DIRS)
+    thumbnails = os.path.join(root, "thumbnails")
+    if os.path.isdir(thumbnails):
+        dirs.extend(f"thumbnails/{entry.name}" for entry in sorted(os.scandir(thumbnails), key=lambda e: e.name)
+                    if entry.is_dir())
+    return dirs
+
+def signature(root):
+    """Size and mtime of every manifest file and listed directory"""
+    stats = {}
+    manifests = os.path.join(root, MANIFEST_DIR)
+    paths = [os.path.join(manifests, name) for name in sorted(os.listdir(manifests))
+             if name.endswith('.json')] if os.path.isdir(manifests) else []
+    paths.extend(os.path.join(root, directory) for directory in asset_dirs(root))
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stats[os.path.relpath(path, root)] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            stats[os.path.relpath(path, root)] = None
+    return {'format': FORMAT, 'root': os.path.abspath(root), 'stats': stats}
+
+def list_files(root):
+    """Every file in the listed directories, relative to root"""
+    files = []
+    for directory in asset_dirs(root):
+        try:
+            entries = os.scandir(os.path.join(root, directory))
+        except OSError:
+            continue
+        with entries:
+            files.extend(f"{directory}/{entry.name}" for entry in entries if entry.is_file())
+    return sorted(files)
+
+def build_model(root):
+    """{id: record} merged from the manifests and the files on disk"""
+    files = list_files(root)
+    present = set(files)
+    assets = {}
+
+    def record(name):
+        return assets.setdefault(name, {})
+
+    # Masters first: an asset is whatever has a full-size file
+    directory, template = VARIANTS['full']
+    suffix = template.replace("{name}", "")
+    for rel in files:
+        if rel.startswith(directory + "/") and rel.endswith(suffix):
+            record(rel[len(directory) + 1:-len(suffix)])
+
+    # Lowest precedence first; later files overwrite
+    master = read_json(manifest_path(root, "master-manifest.json")).get('assets', {})
+    for category, entries in master.items():
+        if isinstance(entries, dict):
+            # portfolio: {project: [id, ...]}
+            entries = [{'id': name} for names in entries.values() for name in names]
+        for entry in entries:
+            item = record(entry['id'])
+            item['category'] = category
+            if entry.get('name'):
+                item['title'] = entry['name']
+    for name, entry in read_json(manifest_path(root, "enhanced-manifest.json")).get('assets', {}).items():
+        item = record(name)
+        for key in ('category', 'width', 'height', 'priority'):
+            if key in entry:
+                item[key] = entry[key]
+        if 'dominantColor' in entry:
+            item['color'] = entry['dominantColor']
+    for name, entry in read_json(manifest_path(root, "placeholders.json")).items():
+        if entry.get('lqip') in present:
+            record(name)['lqip'] = entry['lqip']
+    for name, color in read_json(manifest_path(root, "dominant-colors.json")).get('colors', {}).items():
+        record(name)['color'] = color
+    # Kept in step with the masters by the variants stage
+    for name, entry in read_json(manifest_path(root, "image-dimensions.json")).items():
+        record(name).update({'width': entry['width'], 'height': entry['height']})
+    for name, entry in read_json(manifest_path(root, "srcset-config.json")).get('assets', {}).items():
+        record(name)['srcset'] = entry
+
+    for name, item in assets.items():
+        variants = {}
+        for variant, (directory, template) in VARIANTS.items():
+            rel = f"{directory}/{template.format(name=name)}"
+            if rel in present:
+                variants[variant] = rel
+        item['variants'] = variants
+    return {'assets': assets, 'files': files}
+
+class ManifestIndex:
+    """In-memory asset model, loaded from the cache file when still valid"""
+
+    def __init__(self, root=ASSET_ROOT, cache_dir=CACHE_DIR):
+        self.root = root
+        self.path = os.path.join(cache_dir, INDEX_FILE)
+        self.signature = signature(root)
+        cached = read_json(self.path)
+        if cached.get('signature') == self.signature:
+            model = cached
+        else:
+            model = build_model(root)
+            os.makedirs(cache_dir, exist_ok=True)
+            write_atomic(self.path, json.dumps({'signature': self.signature, **model},
+                                               separators=(',', ':'), sort_keys=True))
+        self.assets = model['assets']
+        self.files = frozenset(model['files'])
+        self.names = sorted(name for name, item in self.assets.items() if 'full' in item['variants'])
+
+    def fresh(self):
+        """Whether nothing the index was built from has changed since"""
+        return signature(self.root) == self.signature
+
+    def __contains__(self, name):
+        return name in self.assets and 'full' in self.assets[name]['variants']
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def exists(self, rel):
+        """Whether rel (a path under the root, '/'-separated) is on disk"""
+        return rel.replace(os.sep, '/') in self.files
+
+    def manifests(self):
+        """Paths of the manifest files the model is merged from"""
+        return [manifest_path(self.root, name) for name in MANIFESTS]
+
+    def dimensions(self, name):
+        """(width, height) or None"""
+        item = self.assets.get(name, {})
+        if 'width' not in item or 'height' not in item:
+            return None
+        return item['width'], item['height']
+
+    def srcset_config(self):
+        """srcset-config.json's "assets" mapping"""
+        return {name: item['srcset'] for name, item in self.assets.items() if 'srcset' in item}
+
+_indexes = {}
+
+def manifest_index(root=ASSET_ROOT):
+    """Process-wide index for root, rebuilt when its inputs change"""
+    index = _indexes.get(root)
+    if index is None or not index.fresh():
+        index = _indexes[root] = ManifestIndex(root)
+    return index
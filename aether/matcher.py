@@ -0,0 +1,88 @@
+"""
+Aho-Corasick matcher for literal, case-insensitive anchor tables.
+
+All anchors are compiled into one automaton, so finding the nth
+occurrence of every anchor costs a single linear pass over the page no
+matter how many anchors the table holds.
+"""
+
+from collections import deque
+
+def fold(text):
+    """Lower-case text without changing its length, so offsets stay valid"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. U+0130) expand when lower-cased; keep those as is
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+class AnchorMatcher:
+    """Compiled automaton over a fixed set of anchor strings"""
+
+    def __init__(self, anchors):
+        self.anchors = list(dict.fromkeys(anchors))
+        # Trie: goto[state][char] -> state; out[state] -> anchor indexes
+        goto = [{}]
+        out = [[]]
+        for index, anchor in enumerate(self.anchors):
+            state = 0
+            for ch in fold(anchor):
+                if ch not in goto[state]:
+                    goto.append({})
+                    out.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            out[state].append(index)
+
+        # Breadth-first failure links, folded into a full transition table
+        # so the scan loop is a single dict lookup per character
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                delta[state][ch] = nxt
+                queue.append(nxt)
+                if state:
+                    fail[nxt] = delta[fail[state]].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self.delta = delta
+        self.out = out
+
+    def find(self, text, wanted):
+        """
+        Locate anchor occurrences in one pass.
+
+        wanted maps anchor -> list of occurrence numbers (1-based). Returns
+        {(anchor, nth): end_offset} for every occurrence that exists.
+        Occurrences of one anchor never overlap, matching re.finditer.
+        """
+        lengths = [len(a) for a in self.anchors]
+        targets = [set(wanted.get(a, ())) for a in self.anchors]
+        counts = [0] * len(self.anchors)
+        last_end = [0] * len(self.anchors)
+        remaining = sum(len(t) for t in targets)
+        found = {}
+
+        delta = self.delta
+        out = self.out
+        state = 0
+        for pos, ch in enumerate(fold(text)):
+            state = delta[state].get(ch, 0)
+            if not out[state]:
+                continue
+            end = pos + 1
+            for index in out[state]:
+                if end - lengths[index] < last_end[index]:
+                    continue
+                last_end[index] = end
+                counts[index] += 1
+                if counts[index] in targets[index]:
+                    found[(self.anchors[index], counts[index])] = end
+                    remaining -= 1
+            if not remaining:
+                break
+        return found
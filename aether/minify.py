@@ -0,0 +1,326 @@
+"""
+Whitespace and comment minification for HTML, CSS and JS.
+
+Every change is one that cannot alter what the page does:
+
+- HTML: runs of whitespace become one space (or one newline), comments
+  go except conditional ones, and tags lose the line breaks between
+  their attributes. <pre>, <textarea> and elements styled white-space:
+  pre / pre-wrap / break-spaces keep their text as written.
+- CSS: comments go, whitespace around { } ; , and after a property's
+  colon goes, and so does the last ; of a block.
+- JS: comments go (/*! ... */ notices stay), and so do indentation,
+  trailing spaces and blank lines, with runs of spaces inside a line
+  collapsed. Line breaks are kept, so automatic semicolon insertion
+  sees the same code. Strings, template literals and regular
+  expressions are copied untouched. <script> elements of a non-JS type
+  are left alone.
+
+The page is split into sections at comment headers (<!-- PASSWORD
+PROTECTION OVERLAY -->, /* ===== V16 OPTIMIZED IMAGE STYLES ===== */,
+...), and the bytes before and after minification are counted per
+section and language, so the report shows where the weight is.
+"""
+
+import re
+
+from aether import css
+from aether.stream import is_end_tag, tag_name
+
+# Elements whose text is shown as written
+PREFORMATTED = ('pre', 'textarea')
+PRE_WHITE_SPACE_RE = re.compile(r'^(pre|pre-wrap|break-spaces)$')
+VOID_ELEMENTS = ('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                 'source', 'track', 'wbr')
+INLINE_PRE_RE = re.compile(r'white-space\s*:\s*(pre|pre-wrap|break-spaces)\b', re.I)
+
+JS_TYPES = ('', 'text/javascript', 'application/javascript', 'module')
+TYPE_RE = re.compile(r'\stype=(["\']?)([^"\'\s>]*)\1', re.I)
+CLASS_RE = re.compile(r'\sclass=(["\'])(.*?)\1', re.S)
+
+HTML_SECTION_RE = re.compile(r'<!--\s*(.{3,80}?)\s*-->$', re.S)
+BANNER_RE = re.compile(r'^[ \t]*(?:/\*\s*=+\s*(.+?)\s*=+\s*\*/|//\s*=+\s*(.+?)\s*=+[ \t]*$)', re.M)
+
+WHITESPACE_RE = re.compile(r'\s+')
+TAG_SPACE_RE = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+TAG_CLOSE_RE = re.compile(r'\s+(/?>)$')
+
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.S)
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,])\s*')
+CSS_COLON_RE = re.compile(r'([{;])(-*[A-Za-z][-\w]*):\s+')
+
+# After these a '/' starts a regular expression rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'yield', 'delete')
+
+def minify_whitespace(text):
+    """One space, or one newline if the run had one"""
+    return WHITESPACE_RE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+
+def minify_tag(tag):
+    """Attributes on one line, separated by single spaces"""
+    return TAG_CLOSE_RE.sub(r'\1', TAG_SPACE_RE.sub(lambda m: m.group(1) or ' ', tag))
+
+def minify_css(text):
+    # Comments and whitespace runs, outside strings
+    text = CSS_TOKEN_RE.sub(lambda m: m.group(1) or ('' if m.group().startswith('/*') else ' '), text)
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', text)
+    for index in range(0, len(parts), 2):
+        part = CSS_PUNCTUATION_RE.sub(r'\1', parts[index])
+        part = CSS_COLON_RE.sub(r'\1\2:', part)
+        parts[index] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+def skip_string(js, pos, quote):
+    """Offset just past the string or template literal opened at js[pos]"""
+    pos += 1
+    while pos < len(js):
+        char = js[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == quote:
+            return pos + 1
+        if quote == '`' and js.startswith('${', pos):
+            pos = skip_braces(js, pos + 1)
+            continue
+        if char == '\n' and quote != '`':
+            return pos
+        pos += 1
+    return pos
+
+def skip_braces(js, pos):
+    """Offset just past the '}' closing the '{' at js[pos] (template ${...})"""
+    depth = 0
+    while pos < len(js):
+        char = js[pos]
+        if char in '\'"`':
+            pos = skip_string(js, pos, char)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return pos
+
+def skip_regex(js, pos):
+    """Offset just past the regular expression literal opened at js[pos]"""
+    pos += 1
+    in_class = False
+    while pos < len(js) and js[pos] != '\n':
+        char = js[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            pos += 1
+            while pos < len(js) and (js[pos].isalnum() or js[pos] == '_'):
+                pos += 1
+            return pos
+        pos += 1
+    return pos
+
+def regex_allowed(code):
+    """Whether a '/' after the code written so far starts a regular expression"""
+    stripped = code.rstrip()
+    if not stripped:
+        return True
+    if stripped[-1] in REGEX_PRECEDERS:
+        return True
+    word = re.search(r'[\w$]+$', stripped)
+    return bool(word) and word.group() in REGEX_KEYWORDS
+
+def add_space(out, space):
+    """Append whitespace, merging it with whitespace just written"""
+    if out and out[-1] in (' ', '\n'):
+        if space == '\n':
+            out[-1] = space
+    elif out:
+        out.append(space)
+
+def minify_js(js):
+    out = []
+    pos = 0
+    code = ''
+    while pos < len(js):
+        char = js[pos]
+        if char in '\'"`':
+            end = skip_string(js, pos, char)
+        elif js.startswith('//', pos):
+            end = js.find('\n', pos)
+            end = len(js) if end == -1 else end
+            pos = end
+            continue
+        elif js.startswith('/*', pos):
+            end = js.find('*/', pos + 2)
+            end = len(js) if end == -1 else end + 2
+            if js.startswith('/*!', pos):
+                out.append(js[pos:end])
+            else:
+                # A comment still separates the tokens around it
+                add_space(out, '\n' if '\n' in js[pos:end] else ' ')
+            pos = end
+            continue
+        elif char == '/' and regex_allowed(code):
+            end = skip_regex(js, pos)
+        elif char.isspace():
+            end = pos
+            while end < len(js) and js[end].isspace():
+                end += 1
+            add_space(out, '\n' if '\n' in js[pos:end] else ' ')
+            pos = end
+            continue
+        else:
+            end = pos + 1
+            while end < len(js) and js[end] not in '\'"`/' and not js[end].isspace():
+                end += 1
+        out.append(js[pos:end])
+        code = js[pos:end]
+        pos = end
+    return ''.join(out).rstrip()
+
+def preformatted_selectors(stylesheet):
+    """(classes, element names) of rules that keep whitespace as written"""
+    classes, tags = set(), set()
+    for item in css.parse(stylesheet):
+        if not isinstance(item, css.Rule):
+            continue
+        if not any(prop == 'white-space' and PRE_WHITE_SPACE_RE.match(value)
+                   for prop, value, _ in item.declarations):
+            continue
+        for part in css.split_top(item.selector, ','):
+            names = css.selector_names(part)
+            classes.update(name for sign, name, _ in names if sign == '.')
+            tags.update(tag.lower() for sign, _, tag in names if not sign)
+    return classes, tags
+
+def scan(events):
+    """Classes and element names styled as preformatted anywhere on the page"""
+    classes, tags = set(), set(PREFORMATTED)
+    for kind, text in events:
+        if kind == 'style':
+            found = preformatted_selectors(text)
+            classes.update(found[0])
+            tags.update(found[1])
+    return classes, tags
+
+class Sections:
+    """Bytes before and after minification, per section and language"""
+
+    def __init__(self):
+        self.name = '(top)'
+        self.order = [self.name]
+        # section -> language -> [before, after]
+        self.sizes = {self.name: {}}
+
+    def start(self, name):
+        name = ' '.join(name.split())
+        if name not in self.sizes:
+            self.sizes[name] = {}
+            self.order.append(name)
+        self.name = name
+
+    def count(self, language, before, after):
+        sizes = self.sizes[self.name].setdefault(language, [0, 0])
+        sizes[0] += len(before.encode('utf-8'))
+        sizes[1] += len(after.encode('utf-8'))
+
+    def totals(self):
+        totals = {}
+        for languages in self.sizes.values():
+            for language, (before, after) in languages.items():
+                total = totals.setdefault(language, [0, 0])
+                total[0] += before
+                total[1] += after
+        return totals
+
+    def report(self, limit=12):
+        lines = []
+        for language, (before, after) in sorted(self.totals().items()):
+            lines.append(f"  {language:5} {before / 1024:9.1f} KB -> {after / 1024:9.1f} KB")
+        heaviest = sorted(self.order, key=lambda name: -sum(b for b, _ in self.sizes[name].values()))
+        lines.append("  heaviest sections:")
+        for name in heaviest[:limit]:
+            sizes = self.sizes[name]
+            parts = ", ".join(f"{language} {before / 1024:.1f} -> {after / 1024:.1f} KB"
+                              for language, (before, after) in sorted(sizes.items()))
+            lines.append(f"    {name[:48]:48} {parts}")
+        return "\n".join(lines)
+
+class Minifier:
+    """Minifies a page's events, counting bytes per section"""
+
+    def __init__(self, preformatted):
+        self.pre_classes, self.pre_tags = preformatted
+        self.sections = Sections()
+        # (element name, depth) of the preformatted element being read
+        self.pre = None
+        self.script_js = True
+
+    def preformatted(self, tag):
+        if tag_name(tag) in self.pre_tags or INLINE_PRE_RE.search(tag):
+            return True
+        match = CLASS_RE.search(tag)
+        return bool(match) and not self.pre_classes.isdisjoint(match.group(2).split())
+
+    def tag(self, text):
+        name = tag_name(text)
+        if self.pre:
+            if name == self.pre[0]:
+                depth = self.pre[1] + (-1 if is_end_tag(text) else 1)
+                self.pre = (name, depth) if depth else None
+        elif (not is_end_tag(text) and name not in VOID_ELEMENTS and not text.endswith('/>')
+              and self.preformatted(text)):
+            self.pre = (name, 1)
+        if name == 'script' and not is_end_tag(text):
+            match = TYPE_RE.search(text)
+            self.script_js = (match.group(2).lower() if match else '') in JS_TYPES
+        return minify_tag(text)
+
+    def sectioned(self, text, minify, language):
+        """Minify text piece by piece between its banner comments"""
+        out = []
+        pos = 0
+        for match in BANNER_RE.finditer(text):
+            piece = text[pos:match.start()]
+            out.append(minify(piece))
+            self.sections.count(language, piece + match.group(), out[-1])
+            self.sections.start(match.group(1) or match.group(2))
+            pos = match.end()
+        piece = text[pos:]
+        out.append(minify(piece))
+        self.sections.count(language, piece, out[-1])
+        joiner = '' if language == 'css' else '\n'
+        return joiner.join(part for part in out if part)
+
+    def rewrite(self, events):
+        for kind, text in events:
+            if kind == 'text':
+                result = text if self.pre else minify_whitespace(text)
+            elif kind == 'tag':
+                result = self.tag(text)
+            elif kind == 'comment':
+                result = text if text.startswith('<!--[if') or text.startswith('<![endif') else ''
+                match = HTML_SECTION_RE.match(text)
+                if match and not result:
+                    self.sections.start(match.group(1))
+            elif kind == 'style':
+                yield kind, self.sectioned(text, minify_css, 'css')
+                continue
+            elif kind == 'script' and self.script_js:
+                yield kind, self.sectioned(text, minify_js, 'js')
+                continue
+            else:
+                result = text
+            self.sections.count('html', text, result)
+            yield kind, result
+
+    def subscribe(self, rewriter):
+        rewriter.filter(self.rewrite)
@@ -0,0 +1,155 @@
+"""
+Responsive <picture> generation from the existing variant tree.
+
+Every <img> that points at a known asset is rewritten into
+
+    <picture>
+        <source type="image/avif" srcset=... sizes=...>
+        <source type="image/webp" srcset=... sizes=...>
+        <img src=png-fallback srcset=... sizes=... (original attributes)>
+    </picture>
+
+with srcsets taken from manifest/srcset-config.json, through the registry's
+manifest index. Files listed in the config but missing on disk are left
+out of the srcset.
+"""
+
+import json
+import os
+import re
+
+from aether import slots
+from aether.assets import ASSET_ROOT
+
+SRCSET_CONFIG = os.path.join(ASSET_ROOT, "manifest", "srcset-config.json")
+
+IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+PICTURE_RE = re.compile(r'<picture\b.*?</picture>', re.IGNORECASE | re.DOTALL)
+SRC_RE = re.compile(r'\ssrc="([^"]*)"')
+SLOT_RE = re.compile(r'\sdata-slot="([a-z]+)"')
+
+# Asset name from an img src: hashed external files (sized ones carry _<width>w)
+# or the variant tree
+SRC_NAME_RES = [
+    re.compile(r'(?:^|/)(?P<name>[^/"]+?)(?:_\d+w)?\.[0-9a-f]{12}\.(?:webp|avif|png)$'),
+    re.compile(r'(?:^|/)(?:webp|webp-medium|webp-mobile|avif|png-fallback)/'
+               r'(?P<name>[^/"]+?)(?:_\d+w)?\.(?:webp|avif|png)$'),
+]
+
+def load_srcset_config(path=SRCSET_CONFIG):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def asset_name(src, registry):
+    """Known asset name referenced by src, or None"""
+    for pattern in SRC_NAME_RES:
+        match = pattern.search(src)
+        if match and match.group('name') in registry:
+            return match.group('name')
+    return None
+
+class PictureBuilder:
+    """Builds <picture> markup for assets using srcset-config.json"""
+
+    def __init__(self, registry, config=None):
+        self.registry = registry
+        if config is None:
+            self.assets = registry.index.srcset_config()
+        else:
+            self.assets = config.get('assets', {})
+
+    def exists(self, path):
+        return self.registry.index.exists(os.path.relpath(path, self.registry.root))
+
+    def candidates(self, name, fmt):
+        """[(path, width)] from the config for one format, existing files only"""
+        entries = []
+        if fmt == 'webp':
+            # The config predates webp-mobile/webp-medium; offer them too
+            for variant, width in (('mobile', 400), ('medium', 800)):
+                path = self.registry.path(name, variant)
+                if path and os.path.basename(path) != f"{name}.webp":
+                    entries.append((path, width))
+        srcset = self.assets.get(name, {}).get('srcset', {}).get(fmt, "")
+        for part in srcset.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            rel, width = part.rsplit(' ', 1)
+            path = os.path.join(self.registry.root, rel)
+            width = int(width.rstrip('w'))
+            if self.exists(path) and width not in {w for _, w in entries}:
+                entries.append((path, width))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def avif_candidates(self, name):
+        """AVIF ships at full size only; it takes the widest WebP width"""
+        path = self.registry.path(name, 'avif')
+        webp = self.candidates(name, 'webp')
+        if not path or not path.endswith('.avif') or not webp:
+            return []
+        return [(path, max(width for _, width in webp))]
+
+    def srcset(self, entries):
+        return ', '.join(f"{self.registry.publish_file(path)} {width}w" for path, width in entries)
+
+    def picture(self, name, img_tag, sizes=None):
+        """<picture> for name, reusing img_tag's attributes on the fallback <img>"""
+        config = self.assets.get(name, {})
+        if sizes is None:
+            # v16 slot images know their rendered width
+            slot = SLOT_RE.search(img_tag)
+            if slot and slot.group(1) in slots.SLOT_MAX_WIDTHS:
+                sizes = slots.sizes(slot.group(1))
+        sizes = sizes or config.get('sizes', "100vw")
+        webp = self.candidates(name, 'webp')
+        if not webp:
+            return None
+        avif = self.avif_candidates(name)
+        png = self.candidates(name, 'png')
+
+        fallback = config.get('fallback')
+        fallback_path = os.path.join(self.registry.root, fallback) if fallback else None
+        if not fallback_path or not self.exists(fallback_path):
+            fallback_path = webp[-1][0]
+
+        img = SRC_RE.sub(lambda m: f' src="{self.registry.publish_file(fallback_path)}"', img_tag, count=1)
+        extra = f' sizes="{sizes}"'
+        if png:
+            extra = f' srcset="{self.srcset(png)}"' + extra
+        img = img[:-1].rstrip('/').rstrip() + extra + '>'
+
+        sources = []
+        if avif:
+            sources.append(f'<source type="image/avif" srcset="{self.srcset(avif)}" sizes="{sizes}">')
+        sources.append(f'<source type="image/webp" srcset="{self.srcset(webp)}" sizes="{sizes}">')
+        return '<picture>' + ''.join(sources) + img + '</picture>'
+
+def rewrite_pictures(html, builder):
+    """
+    Wrap every <img> that references a known asset in a <picture>.
+
+    Returns (html, count). Images already inside a <picture> are left alone.
+    """
+    count = 0
+    spans = [m.span() for m in PICTURE_RE.finditer(html)]
+
+    def inside_picture(pos):
+        return any(start <= pos < end for start, end in spans)
+
+    def replace(match):
+        nonlocal count
+        tag = match.group(0)
+        src = SRC_RE.search(tag)
+        if not src or inside_picture(match.start()):
+            return tag
+        name = asset_name(src.group(1), builder.registry)
+        if name is None:
+            return tag
+        picture = builder.picture(name, tag)
+        if picture is None:
+            return tag
+        count += 1
+        return picture
+
+    return IMG_RE.sub(replace, html), count
@@ -0,0 +1,216 @@
+"""
+Single-pass build pipeline:
+1. Load the source page once into a shared Document
+2. Run each registered transform over the document in order
+3. Write the result once
+
+Builds are incremental by default: steps whose input, implementation and
+assets are unchanged reuse their cached output (see aether.incremental).
+
+Streaming transforms subscribe to an aether.stream.Rewriter instead of
+editing doc.html; they read the page from disk and write their output
+as they go, so a build made of them never holds a whole page in memory.
+"""
+
+import os
+import sys
+import time
+
+from aether import stream
+
+INPUT_FILE = "aether-matrix-v14-pxr-comprehensive.html"
+OUTPUT_FILE = "aether-internal-protected.html"
+
+# Transform registry: name -> function(doc)
+TRANSFORMS = {}
+
+# The v14 -> v16 (+ <picture>) -> protected -> optimized -> touch chain,
+# with image boxes reserved and previewed, the stylesheets merged and
+# pruned, only above-the-fold CSS blocking first paint and repeated
+# inline images pooled
+DEFAULT_STEPS = ["v16", "picture", "protect", "optimize", "touch", "rain", "placeholders", "css", "prune",
+                 "critical", "dedupe"]
+
+class Document:
+    """Page shared by every transform of a build"""
+
+    def __init__(self, html, source=None, output=None, options=None):
+        self.html = html
+        # After a streaming step html is None and the page is only on disk
+        self.path = None
+        self.source = source
+        self.output = output
+        # Build-wide switches (external_assets, ...) read by transforms
+        self.options = options or {}
+        # AssetRegistry shared by the transforms, see registry()
+        self.assets = None
+        # Per-step notes ("inserted 25 images", ...) for the build summary
+        self.stats = {}
+
+def transform(name, version=1, sources=(), streaming=False):
+    """
+    Register a function as a named build transform.
+
+    sources lists the modules (or data file paths) it relies on besides
+    its own module; together with version they let incremental builds
+    notice when its output would change.
+
+    A streaming transform is called as func(doc, rewriter) and registers
+    its handlers on the rewriter instead of editing doc.html.
+    """
+    def register(func):
+        func.transform_name = name
+        func.transform_version = version
+        func.transform_streaming = streaming
+        func.transform_sources = {sys.modules[func.__module__].__file__}
+        func.transform_sources.update(getattr(s, '__file__', s) for s in sources)
+        if streaming:
+            func.transform_sources.add(stream.__file__)
+        TRANSFORMS[name] = func
+        return func
+    return register
+
+def load(path, **kwargs):
+    with open(path, 'r', encoding='utf-8') as f:
+        return Document(f.read(), source=path, **kwargs)
+
+def save(doc, path):
+    if doc.html is None:
+        if doc.path != path:
+            stream.write_chunks(stream.read_chunks(doc.path), path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(doc.html)
+
+def page_chunks(doc):
+    if doc.html is None:
+        return stream.read_chunks(doc.path)
+    return stream.string_chunks(doc.html)
+
+def transforms_for(steps):
+    """Registered functions for the named steps"""
+    # Importing the transform module fills the registry
+    from aether import transforms
+
+    unknown = [name for name in steps if name not in TRANSFORMS]
+    if unknown:
+        raise KeyError(f"Unknown transform(s): {', '.join(unknown)}")
+    return [TRANSFORMS[name] for name in steps]
+
+def run_step(doc, name, write=None):
+    """
+    Run one transform over doc.
+
+    write(pieces) -> (path, sha) stores the output of a streaming step on
+    disk; its sha is returned. Without it the output is kept in doc.html.
+    """
+    print(f"\n=== {name} ===")
+    start = time.perf_counter()
+    func = TRANSFORMS[name]
+    sha = None
+
+    if func.transform_streaming:
+        rewriter = stream.Rewriter()
+        func(doc, rewriter)
+        pieces = rewriter.rewrite(page_chunks(doc))
+        if write is None:
+            doc.html = ''.join(pieces)
+        else:
+            doc.path, sha = write(pieces)
+            doc.html = None
+    else:
+        if doc.html is None:
+            doc.html = stream.read_text(doc.path)
+        func(doc)
+
+    doc.stats.setdefault(name, {})['seconds'] = time.perf_counter() - start
+    return sha
+
+def run(doc, steps):
+    """Apply the named transforms to doc in order"""
+    transforms_for(steps)
+    for name in steps:
+        run_step(doc, name)
+    return doc
+
+def assets_dir(doc):
+    """Directory for content-hashed image files, next to the output page"""
+    return os.path.join(os.path.dirname(doc.output or ''), "assets")
+
+def registry(doc):
+    """The build's AssetRegistry, created on first use"""
+    if doc.assets is None:
+        from aether.assets import AssetRegistry
+        publish_dir = assets_dir(doc) if doc.options.get('external_assets') else None
+        doc.assets = AssetRegistry(publish_dir=publish_dir)
+    return doc.assets
+
+def build(input_file=INPUT_FILE, output_file=OUTPUT_FILE, steps=None, options=None,
+          incremental=True):
+    """Load input_file once, run steps and write output_file once"""
+    from aether.incremental import BuildCache, fingerprint, file_sha256
+
+    steps = DEFAULT_STEPS if steps is None else steps
+    options = options or {}
+    if options.get('external_assets') and "externalize" not in steps:
+        steps = steps + ["externalize"]
+    funcs = transforms_for(steps)
+
+    doc = Document(None, source=input_file, output=output_file, options=options)
+    cache = BuildCache() if incremental else None
+    start, html_sha = 0, None
+
+    if cache:
+        start, html_sha = cache.resume_point(input_file, funcs, options)
+        if start == len(steps) and os.path.exists(output_file) \
+                and file_sha256(output_file) == html_sha:
+            print(f"{output_file} is up to date")
+            return doc
+
+    # The page is only read into memory when a non-streaming step needs it
+    if start:
+        print(f"Reusing cached output of: {', '.join(steps[:start])}")
+        doc.path = cache.html_path(html_sha)
+    else:
+        print(f"Reading {input_file}...")
+        doc.path = input_file
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    if cache:
+        write = cache.save_chunks
+    else:
+        # Streaming steps write straight to the output page
+        def write(pieces):
+            return output_file, stream.write_chunks(pieces, output_file)
+
+    for index, (name, func) in enumerate(zip(steps[start:], funcs[start:]), start):
+        if cache:
+            key = cache.step_key(html_sha, fingerprint(func, options))
+            # A step after one that ran may still get the input it had last time
+            record = cache.lookup(key) if index > start else None
+            if record:
+                print(f"\n=== {name} ===\nReusing cached output")
+                html_sha = record['output']
+                doc.path, doc.html = cache.html_path(html_sha), None
+                doc.stats[name] = {'seconds': 0.0}
+                continue
+        if doc.assets:
+            # Each step record lists only the files that step read or wrote
+            doc.assets.reset_tracking()
+        sha = run_step(doc, name, write)
+        if cache:
+            html_sha = sha or cache.save_html(doc.html)
+            assets = doc.assets
+            cache.store(key, name, html_sha,
+                        assets.used if assets else {},
+                        assets.published if assets else ())
+
+    print(f"\nWriting {output_file}...")
+    save(doc, output_file)
+
+    size_mb = os.path.getsize(output_file) / 1024 / 1024
+    print(f"\nDone! File: {output_file}")
+    print(f"Size: {size_mb:.2f} MB")
+    for name in steps[start:]:
+        print(f"  {name}: {doc.stats[name]['seconds']:.2f}s")
+    return doc
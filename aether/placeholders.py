@@ -0,0 +1,90 @@
+"""
+Placeholders for generated images.
+
+The v16 generators tag every image they insert with data-asset="<id>".
+For those, this step adds what the manifest index knows before the image
+itself has arrived:
+
+- width and height, so the browser reserves the image's box and the text
+  around it does not move when it loads;
+- a background of the asset's dominant colour under its 20 px LQIP
+  (lqip/<id>-blur.webp, about 100 bytes) inlined as a data URL, so the
+  box shows a blurred preview instead of staying empty while the image
+  downloads and decodes.
+
+An onload handler clears the background again, so images with
+transparent areas do not keep the preview behind them.
+"""
+
+import re
+
+from aether.stream import tag_name
+
+ASSET_RE = re.compile(r'\sdata-asset="([^"]+)"')
+STYLE_RE = re.compile(r'\sstyle="([^"]*)"')
+ONLOAD_RE = re.compile(r'\sonload="([^"]*)"')
+SIZE_RE = re.compile(r'\s(?:width|height)=')
+
+CLEAR_BACKGROUND = "this.style.background='none'"
+
+def background(color, lqip):
+    """CSS background: the LQIP stretched over the dominant colour"""
+    layers = [f"url({lqip}) center / cover no-repeat" if lqip else None, color]
+    return "background: " + " ".join(layer for layer in layers if layer)
+
+class Placeholders:
+    """Adds dimensions and a preview background to data-asset images"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.images = 0
+        self.sized = 0
+        self.previews = 0
+        self.bytes = 0
+
+    def img(self, tag):
+        if tag_name(tag) != 'img':
+            return None
+        match = ASSET_RE.search(tag)
+        if not match:
+            return None
+        name = match.group(1)
+        item = self.registry.index.get(name)
+        if item is None:
+            return None
+
+        self.images += 1
+        end = len(tag) - (2 if tag.endswith('/>') else 1)
+        head, tail = tag[:end].rstrip(), tag[end:]
+        before = len(tag)
+
+        dimensions = self.registry.index.dimensions(name)
+        if dimensions and not SIZE_RE.search(head):
+            head += f' width="{dimensions[0]}" height="{dimensions[1]}"'
+            self.sized += 1
+
+        lqip = self.registry.data_url(name, 'lqip')
+        color = item.get('color')
+        if lqip or color:
+            self.previews += 1
+            style = background(color, lqip)
+            existing = STYLE_RE.search(head)
+            if existing:
+                rules = existing.group(1).rstrip().rstrip(';')
+                head = (f'{head[:existing.start()]} style="{rules}; {style}"'
+                        f'{head[existing.end():]}')
+            else:
+                head += f' style="{style}"'
+            onload = ONLOAD_RE.search(head)
+            if onload:
+                head = (f'{head[:onload.start()]} onload="{CLEAR_BACKGROUND};{onload.group(1)}"'
+                        f'{head[onload.end():]}')
+            else:
+                head += f' onload="{CLEAR_BACKGROUND}"'
+
+        tag = head + tail
+        self.bytes += len(tag) - before
+        return tag
+
+    def subscribe(self, rewriter):
+        rewriter.on('tag', self.img)
@@ -0,0 +1,90 @@
+"""
+Shared image pool for single-file pages.
+
+The same asset often ends up inlined more than once (the logo on the
+loading screen, the desktop and the start button). The first <img> of a
+repeated payload keeps its data URL and is tagged data-pool="pN"; every
+later one drops its src for data-pool-src="pN" and a short script before
+</body> copies the pooled src over while the page is still parsing, so
+each payload ships once.
+"""
+
+import hashlib
+import re
+from collections import Counter
+
+from aether.stream import is_end_tag, tag_name
+
+SRC_RE = re.compile(r'\ssrc=(["\'])(data:image/[a-z0-9.+-]+;base64,[A-Za-z0-9+/=]+)\1')
+
+HYDRATE_JS = '''<script>
+    // Shared image pool: repeated images point at the first copy
+    document.querySelectorAll('img[data-pool-src]').forEach(img => {
+        const source = document.querySelector(`img[data-pool="${img.dataset.poolSrc}"]`);
+        if (source) img.src = source.src;
+    });
+</script>
+'''
+
+def payload_key(data_url):
+    return hashlib.sha1(data_url.encode('ascii')).hexdigest()
+
+def inline_src(tag):
+    """Match of an <img> tag's data URL src, or None"""
+    if tag_name(tag) != 'img':
+        return None
+    return SRC_RE.search(tag)
+
+def count_payloads(events):
+    """
+    Scan a page's events once.
+
+    Returns (occurrences of each inline <img> payload by hash, whether the
+    page has a </body> for the hydration script).
+    """
+    counts = Counter()
+    body_end = False
+    for kind, text in events:
+        if kind != 'tag':
+            continue
+        match = inline_src(text)
+        if match:
+            counts[payload_key(match.group(2))] += 1
+        elif is_end_tag(text) and tag_name(text) == 'body':
+            body_end = True
+    return counts, body_end
+
+class ImagePool:
+    """Rewrites repeated inline images to share the first copy's bytes"""
+
+    def __init__(self, counts):
+        self.repeated = {key for key, count in counts.items() if count > 1}
+        # payload hash -> pool id of its first <img>
+        self.ids = {}
+        self.shared = 0
+        self.saved = 0
+
+    def img(self, tag):
+        match = inline_src(tag)
+        if not match:
+            return None
+        key = payload_key(match.group(2))
+        if key not in self.repeated:
+            return None
+
+        if key not in self.ids:
+            self.ids[key] = f"p{len(self.ids) + 1}"
+            return f'{tag[:match.start()]} data-pool="{self.ids[key]}"{tag[match.start():]}'
+
+        self.shared += 1
+        self.saved += len(match.group(2))
+        return f'{tag[:match.start()]} data-pool-src="{self.ids[key]}"{tag[match.end():]}'
+
+    def body_end(self, tag):
+        if self.shared and is_end_tag(tag) and tag_name(tag) == 'body':
+            return HYDRATE_JS + tag
+        return None
+
+    def subscribe(self, rewriter):
+        rewriter.on('tag', self.img)
+        rewriter.on('tag', self.body_end)
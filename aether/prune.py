@@ -0,0 +1,125 @@
+"""
+Unused CSS pruning.
+
+A page is read once for every element name, class and id in its markup,
+plus every word of its inline scripts and on* handlers, which covers the
+classes the scripts add at run time (classList.add('hidden'),
+'window-' + name, ...). A selector that needs a name found nowhere in
+that set can never match; it is dropped from its rule, and rules left
+without selectors are removed, as are @keyframes nothing refers to.
+
+Pruning is conservative: attribute selectors, pseudo-classes and names
+inside :not() are ignored, and a script word ending or starting in '-'
+keeps every class it could be the prefix or suffix of.
+"""
+
+import re
+
+from aether import css
+from aether.critical import CLASS_RE, ID_RE, KEYFRAMES_RE
+from aether.stream import is_end_tag, tag_name
+
+HANDLER_RE = re.compile(r'\son\w+=(["\'])(.*?)\1', re.S)
+WORD_RE = re.compile(r'[-\w]+')
+
+# Always in the DOM, whether written or not
+IMPLIED_TAGS = ('html', 'head', 'body')
+
+class PageNames:
+    """Element names, classes, ids and script words of a page"""
+
+    def __init__(self, events):
+        self.tags = set(IMPLIED_TAGS)
+        self.classes = set()
+        self.ids = set()
+        self.words = set()
+        for kind, text in events:
+            if kind == 'script':
+                self.words.update(WORD_RE.findall(text))
+            elif kind == 'tag' and not is_end_tag(text):
+                self.tags.add(tag_name(text))
+                match = CLASS_RE.search(text)
+                if match:
+                    self.classes.update(match.group(2).split())
+                match = ID_RE.search(text)
+                if match:
+                    self.ids.add(match.group(2))
+                for match in HANDLER_RE.finditer(text):
+                    self.words.update(WORD_RE.findall(match.group(2)))
+        self.prefixes = tuple(word for word in self.words if word.endswith('-') and len(word) > 1)
+        self.suffixes = tuple(word for word in self.words if word.startswith('-') and len(word) > 1)
+
+    def scripted(self, name):
+        return (name in self.words or name.startswith(self.prefixes)
+                or name.endswith(self.suffixes))
+
+    def has(self, sign, name, tag):
+        if sign == '.':
+            return name in self.classes or self.scripted(name)
+        if sign == '#':
+            return name in self.ids or self.scripted(name)
+        return tag.lower() in self.tags or tag.lower() in self.words
+
+    def matchable(self, selector):
+        return all(self.has(*name) for name in css.selector_names(selector))
+
+def live_selector(selector, names):
+    """selector without the parts that cannot match, or None"""
+    parts = css.split_top(selector, ',')
+    live = [part for part in parts if names.matchable(part)]
+    if not live:
+        return None
+    if len(live) < len(parts) and any(':-' in part for part in parts):
+        # A vendor pseudo-class unknown to a browser drops the whole rule
+        # there; taking it out of the list would revive the rest
+        return selector
+    return ', '.join(part.strip() for part in live)
+
+def prune(stylesheet, names):
+    """(stylesheet, rules removed) without the rules names can never match"""
+    items = css.parse(stylesheet)
+    kept = []
+    removed = 0
+    for item in items:
+        if isinstance(item, css.Rule):
+            selector = live_selector(item.selector, names)
+            if selector is None:
+                removed += 1
+                continue
+            if selector != item.selector:
+                item = css.Rule(item.conditions, selector, item.declarations)
+        kept.append(item)
+
+    used = set(names.words)
+    for item in kept:
+        if isinstance(item, css.Rule):
+            for prop, value, _ in item.declarations:
+                if prop.endswith('animation') or prop.endswith('animation-name'):
+                    used.update(WORD_RE.findall(value))
+    live = []
+    for item in kept:
+        keyframes = KEYFRAMES_RE.match(item.text) if isinstance(item, css.Block) else None
+        if keyframes and keyframes.group(1) not in used:
+            removed += 1
+            continue
+        live.append(item)
+    return css.format_groups(css.group(live)), removed
+
+class Pruner:
+    """Prunes every <style> element of a page"""
+
+    def __init__(self, names):
+        self.names = names
+        self.rules = 0
+        self.removed = 0
+
+    def style(self, text):
+        pruned, rules = prune(text, self.names)
+        if not rules or len(pruned) >= len(text):
+            return None
+        self.rules += rules
+        self.removed += len(text) - len(pruned)
+        return pruned
+
+    def subscribe(self, rewriter):
+        rewriter.on('style', self.style)
@@ -0,0 +1,334 @@
+"""
+Matrix rain renderer.
+
+Every page draws its #matrixCanvas rain with the same few lines: each 30
+or 50 ms a setInterval callback fades the canvas and fillText()s one
+random glyph per column, whether or not the tab is visible or anything
+of the canvas can be seen. This step replaces that block with a renderer
+that draws the same rain - the page's glyphs, font, colours, trail fade
+and speed are read from the old code - but:
+
+- renders each glyph once per colour into an atlas canvas and copies it
+  with drawImage() instead of shaping text every frame;
+- sizes the backing store for devicePixelRatio, capped at MAX_DPR;
+- runs on requestAnimationFrame at the page's interval, and doubles the
+  interval (up to 4x, then drops to 1x DPR) while drawing a frame costs
+  more than BUDGET_MS;
+- stops on visibilitychange to hidden, under prefers-reduced-motion,
+  while the canvas is not displayed and while a window covers the
+  screen.
+
+canvas and ctx stay top-level consts, so the touch runtime's resize and
+reduced-motion code keeps working. A page whose other code uses a name
+the old block declared (drops, fontSize, resizeCanvas, ...) is left
+alone.
+"""
+
+import json
+import re
+from collections import Counter
+
+from aether.prune import HANDLER_RE
+
+MAX_DPR = 1.5
+BUDGET_MS = 4
+
+START_RE = re.compile(r'const canvas\s*=\s*document\.getElementById\((["\'])matrixCanvas\1\);')
+END_RE = re.compile(r'setInterval\(\s*drawMatrix\s*,\s*(\d+)\s*\);')
+RESIZE_RE = re.compile(r'\s*window\.addEventListener\(\s*([\'"])resize\1\s*,\s*(?:\(\)\s*=>|function\s*\(\))\s*\{')
+# Names a trailing resize listener may use besides the block's own
+RESIZE_NAMES = {'window', 'innerWidth', 'innerHeight', 'canvas', 'width', 'height', 'Math', 'random', 'floor',
+                'length', 'let', 'const', 'for', 'i', 'Array', 'fill'}
+DECLARED_RE = re.compile(r'\b(?:const|let|var|function)\s+([A-Za-z_$][\w$]*)')
+# Not part of a hyphenated word, so CSS in template strings does not count
+NAME_RE = re.compile(r'(?<![-\w$])[A-Za-z_$][\w$]*(?![-\w$])')
+
+CHARS_RE = re.compile(r'\w*[cC]hars\s*=\s*([\'"])(.*?)\1')
+FONT_SIZE_RE = re.compile(r'fontSize\s*=\s*(\d+)')
+FONT_RE = re.compile(r'ctx\.font\s*=\s*fontSize\s*\+\s*([\'"])px\s*(.*?)\1')
+FADE_RE = re.compile(r'ctx\.fillStyle\s*=\s*([\'"])(.*?)\1;\s*ctx\.fillRect\(')
+FILL_RE = re.compile(r'ctx\.fillStyle\s*=\s*([\'"])(.*?)\1')
+COLORS_RE = re.compile(r'colors\s*=\s*\[([^\]]*)\]')
+STRING_RE = re.compile(r'([\'"])(.*?)\1')
+SPEED_RE = re.compile(r'drops\[i\]\s*\+=\s*([\d.]+)\s*\+\s*Math\.random\(\)\s*\*\s*([\d.]+)')
+RESET_RE = re.compile(r'Math\.random\(\)\s*>\s*(0?\.\d+)')
+RANDOM_START_RE = re.compile(r'drops\[i\]\s*=\s*Math\.random\(\)')
+
+RENDERER_JS = '''const canvas = document.getElementById('matrixCanvas');
+        const ctx = canvas.getContext('2d');
+
+        // Matrix rain: glyphs come from a pre-rendered atlas, the backing store is
+        // capped at MAX_DPR, the frame interval stretches while frames go over
+        // budget, and nothing is drawn while the rain cannot be seen
+        (() => {
+            const CHARS = Array.from(__CHARS__);
+            const COLORS = __COLORS__;
+            const FONT = __FONT__;
+            const FONT_SIZE = __FONT_SIZE__;
+            const FADE = __FADE__;
+            const SPEED = __SPEED__;
+            const RESET = __RESET__;
+            const RANDOM_START = __RANDOM_START__;
+            const FRAME_MS = __FRAME_MS__;
+            const MAX_FRAME_MS = FRAME_MS * 4;
+            const BUDGET_MS = __BUDGET_MS__;
+            const MAX_DPR = __MAX_DPR__;
+            // A window this close to the bottom (the taskbar) covers the screen
+            const COVER_SLACK = 48;
+
+            const reducedMotion = window.matchMedia('(prefers-reduced-motion: reduce)');
+            let dprCap = MAX_DPR;
+            let dpr = 1;
+            let atlas = null;
+            let cell = 0;
+            let drops = [];
+            let frameMs = FRAME_MS;
+            let cost = 0;
+            let last = 0;
+            let running = false;
+            let covered = false;
+            let checkPending = false;
+
+            function backingSize() {
+                return [Math.round(window.innerWidth * dpr), Math.round(window.innerHeight * dpr)];
+            }
+
+            function buildAtlas() {
+                const size = FONT_SIZE * dpr;
+                cell = Math.ceil(size * 1.5);
+                atlas = document.createElement('canvas');
+                atlas.width = cell * CHARS.length;
+                atlas.height = cell * COLORS.length;
+                const atlasCtx = atlas.getContext('2d');
+                atlasCtx.font = `${size}px ${FONT}`;
+                COLORS.forEach((color, row) => {
+                    atlasCtx.fillStyle = color;
+                    CHARS.forEach((char, column) => atlasCtx.fillText(char, column * cell, row * cell + size));
+                });
+            }
+
+            function resize() {
+                dpr = Math.min(window.devicePixelRatio || 1, dprCap);
+                [canvas.width, canvas.height] = backingSize();
+                const columns = Math.floor(window.innerWidth / FONT_SIZE);
+                const rows = window.innerHeight / FONT_SIZE;
+                drops = Array.from({ length: columns }, (_, i) =>
+                    drops[i] !== undefined ? drops[i] : RANDOM_START ? Math.random() * rows : 1);
+                buildAtlas();
+            }
+
+            function draw(step) {
+                const size = FONT_SIZE * dpr;
+                ctx.fillStyle = FADE;
+                ctx.fillRect(0, 0, canvas.width, canvas.height);
+                for (let i = 0; i < drops.length; i++) {
+                    const glyph = Math.floor(Math.random() * CHARS.length);
+                    const color = Math.floor(Math.random() * COLORS.length);
+                    const y = drops[i] * size;
+                    ctx.drawImage(atlas, glyph * cell, color * cell, cell, cell, i * size, y - size, cell, cell);
+                    if (y > canvas.height && Math.random() > RESET) {
+                        drops[i] = 0;
+                    }
+                    drops[i] += (SPEED[0] + Math.random() * (SPEED[1] - SPEED[0])) * step;
+                }
+            }
+
+            function frame(now) {
+                window.matrixAnimationId = requestAnimationFrame(frame);
+                if (now - last < frameMs) return;
+                // Longer frames move the rain further, so it keeps its speed
+                const step = last ? Math.min((now - last) / FRAME_MS, MAX_FRAME_MS / FRAME_MS) : 1;
+                last = now;
+                const [width, height] = backingSize();
+                if (canvas.width !== width || canvas.height !== height) resize();
+
+                const start = performance.now();
+                draw(step);
+                cost = cost * 0.9 + (performance.now() - start) * 0.1;
+                if (cost > BUDGET_MS) {
+                    if (frameMs < MAX_FRAME_MS) {
+                        frameMs = Math.min(frameMs * 2, MAX_FRAME_MS);
+                    } else if (dprCap > 1) {
+                        dprCap = 1;
+                        resize();
+                    }
+                    cost = BUDGET_MS / 2;
+                } else if (cost < BUDGET_MS / 4 && frameMs > FRAME_MS) {
+                    frameMs = Math.max(frameMs / 2, FRAME_MS);
+                    cost = BUDGET_MS / 2;
+                }
+            }
+
+            function update() {
+                const visible = !document.hidden && !reducedMotion.matches && !covered
+                    && canvas.getClientRects().length > 0;
+                if (visible && !running) {
+                    running = true;
+                    last = 0;
+                    window.matrixAnimationId = requestAnimationFrame(frame);
+                } else if (!visible && running) {
+                    running = false;
+                    cancelAnimationFrame(window.matrixAnimationId);
+                }
+            }
+
+            function checkCovered() {
+                checkPending = false;
+                covered = Array.from(document.querySelectorAll('.window')).some(win => {
+                    const rect = win.getBoundingClientRect();
+                    return rect.width > 0 && rect.left <= 0 && rect.top <= 0
+                        && rect.right >= window.innerWidth && rect.bottom >= window.innerHeight - COVER_SLACK;
+                });
+                update();
+            }
+
+            function scheduleCheck() {
+                if (checkPending) return;
+                checkPending = true;
+                requestAnimationFrame(checkCovered);
+            }
+
+            const windowObserver = new MutationObserver(scheduleCheck);
+            document.querySelectorAll('.window').forEach(win =>
+                windowObserver.observe(win, { attributes: true, attributeFilter: ['class', 'style'] }));
+            document.addEventListener('visibilitychange', update);
+            window.addEventListener('resize', scheduleCheck, { passive: true });
+            if (reducedMotion.addEventListener) reducedMotion.addEventListener('change', update);
+
+            resize();
+            checkCovered();
+        })();'''
+
+def js_string(text):
+    return json.dumps(text, ensure_ascii=False)
+
+def read_config(block, interval):
+    """The look of the legacy renderer in block, or None if it is not one"""
+    chars = CHARS_RE.search(block)
+    size = FONT_SIZE_RE.search(block)
+    fade = FADE_RE.search(block)
+    if not chars or not size or not fade:
+        return None
+    font = FONT_RE.search(block)
+    colors = COLORS_RE.search(block)
+    if colors:
+        colors = [match.group(2) for match in STRING_RE.finditer(colors.group(1))]
+    else:
+        colors = [match.group(2) for match in FILL_RE.finditer(block, fade.end())]
+    speed = SPEED_RE.search(block)
+    reset = RESET_RE.search(block)
+    return {
+        'chars': chars.group(2),
+        'colors': colors or ['#00ff41'],
+        'font': font.group(2) if font else 'monospace',
+        'font_size': int(size.group(1)),
+        'fade': fade.group(2),
+        'speed': [float(speed.group(1)), float(speed.group(1)) + float(speed.group(2))] if speed else [1, 1],
+        'reset': float(reset.group(1)) if reset else 0.975,
+        'random_start': bool(RANDOM_START_RE.search(block)),
+        'frame_ms': int(interval),
+    }
+
+def renderer(config):
+    """The new renderer's script for a config from read_config()"""
+    values = {
+        '__CHARS__': js_string(config['chars']),
+        '__COLORS__': json.dumps(config['colors']),
+        '__FONT__': js_string(config['font']),
+        '__FONT_SIZE__': str(config['font_size']),
+        '__FADE__': js_string(config['fade']),
+        '__SPEED__': json.dumps(config['speed']),
+        '__RESET__': str(config['reset']),
+        '__RANDOM_START__': 'true' if config['random_start'] else 'false',
+        '__FRAME_MS__': str(config['frame_ms']),
+        '__BUDGET_MS__': str(BUDGET_MS),
+        '__MAX_DPR__': str(MAX_DPR),
+    }
+    return re.sub('|'.join(values), lambda m: values[m.group()], RENDERER_JS)
+
+def matching_brace(text, pos):
+    """Offset just past the '}' closing the '{' at text[pos - 1]"""
+    depth = 1
+    while pos < len(text) and depth:
+        depth += {'{': 1, '}': -1}.get(text[pos], 0)
+        pos += 1
+    return pos
+
+def find_legacy(script):
+    """
+    (start, end, frame interval) of the legacy renderer block in script,
+    or None. A resize listener right after it that only resizes the
+    canvas and resets the rain's own state is part of the block.
+    """
+    start = START_RE.search(script)
+    if not start:
+        return None
+    end = END_RE.search(script, start.end())
+    if not end:
+        return None
+    stop = end.end()
+    resize = RESIZE_RE.match(script, stop)
+    if resize:
+        close = re.match(r'\s*\);', script[matching_brace(script, resize.end()):])
+        if close:
+            listener_end = matching_brace(script, resize.end()) + close.end()
+            allowed = RESIZE_NAMES | top_level_names(script[start.start():stop])
+            if set(NAME_RE.findall(script[resize.end():listener_end])) <= allowed | {'resize'}:
+                stop = listener_end
+    return start.start(), stop, end.group(1)
+
+def top_level_names(block):
+    """Names block declares outside any function, block or for statement"""
+    names = set()
+    for match in DECLARED_RE.finditer(block):
+        before = block[:match.start()]
+        if before.count('{') == before.count('}') and not re.search(r'for\s*\(\s*$', before):
+            names.add(match.group(1))
+    return names
+
+def count_names(events):
+    """How often each name occurs in the page's scripts and on* handlers"""
+    counts = Counter()
+    for kind, text in events:
+        if kind == 'script':
+            counts.update(NAME_RE.findall(text))
+        elif kind == 'tag':
+            for match in HANDLER_RE.finditer(text):
+                counts.update(NAME_RE.findall(match.group(2)))
+    return counts
+
+class RainRenderer:
+    """Swaps the legacy matrix rain block of a page's scripts for the new renderer"""
+
+    def __init__(self, names):
+        self.names = names
+        self.replaced = 0
+        self.skipped = None
+        self.before = 0
+        self.after = 0
+
+    def script(self, text):
+        found = find_legacy(text)
+        if not found:
+            return None
+        start, end, interval = found
+        block = text[start:end]
+        config = read_config(block, interval)
+        if config is None:
+            self.skipped = "unrecognised renderer"
+            return None
+        counts = Counter(NAME_RE.findall(block))
+        shared = sorted(name for name in top_level_names(block) - {'canvas', 'ctx'}
+                        if self.names[name] > counts[name])
+        if shared:
+            self.skipped = "other code uses " + ", ".join(shared)
+            return None
+
+        new = renderer(config)
+        self.replaced += 1
+        self.before += len(block)
+        self.after += len(new)
+        return text[:start] + new + text[end:]
+
+    def subscribe(self, rewriter):
+        rewriter.on('script', self.script)
@@ -0,0 +1,451 @@
+"""
+Precomputed sky-glass background.
+
+.sky-glass-layer and its ::before / ::after paint the "kinetic sky" with
+up to a dozen radial and linear gradients, blurred with filter: blur()
+and animated through @keyframes that change filter (hue-rotate,
+brightness, ...) as well as transform. Every frame repaints all of it
+over the whole viewport.
+
+This step renders each layer's gradients once, with Pillow, into a small
+WebP texture (TEXTURE_SCALE of a REFERENCE_VIEWPORT-sized box, with the
+blur baked in) that is stretched over the layer, so the browser paints
+one image instead of the gradients. The keyframes the layers run are cut
+down to their transform and opacity, so the layers can stay on the
+compositor (will-change) without a repaint per frame; an animation with
+neither is dropped. On touch screens (pointer: coarse) the layers do not
+animate at all. Only top-level rules and keyframes are rewritten: ones
+nested in @media or other at-rules are left as they are.
+
+A layer whose background is not made only of gradients this module can
+render keeps its background; its animation is still made composited.
+"""
+
+import base64
+import hashlib
+import io
+import math
+import os
+import re
+
+from aether import css
+from aether.assetcache import CACHE_DIR
+from aether.critical import KEYFRAMES_RE
+
+try:
+    from PIL import Image, ImageFilter
+except ImportError:
+    Image = None
+
+LAYER = '.sky-glass-layer'
+SELECTORS = (LAYER, LAYER + '::before', LAYER + '::after')
+
+REFERENCE_VIEWPORT = (1440, 900)
+TEXTURE_SCALE = 1 / 16
+QUALITY = 90
+
+# Bump when textures would render differently
+FORMAT = 1
+
+# Properties a composited animation may change
+COMPOSITED = ('transform', 'opacity')
+
+# An animation with no COMPOSITED property left: dropped from the layers
+STILL = object()
+
+COARSE_CSS = '''
+
+        /* Touch screens: a still sky */
+        @media (pointer: coarse) {
+            .sky-glass-layer,
+            .sky-glass-layer::before,
+            .sky-glass-layer::after {
+                animation: none;
+                will-change: auto;
+            }
+        }'''
+
+TOKEN_RE = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]', re.S)
+GRADIENT_RE = re.compile(r'^(radial|linear)-gradient\((.*)\)$', re.S | re.I)
+RADIAL_SHAPE_RE = re.compile(r'^(circle|ellipse)?\s*(farthest-corner)?\s*(?:at\s+(\S+)(?:\s+(\S+))?)?$', re.I)
+ANGLE_RE = re.compile(r'^(-?[\d.]+)deg$', re.I)
+PERCENT_RE = re.compile(r'^(-?[\d.]+)%$')
+RGBA_RE = re.compile(r'^rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+)\s*)?\)$', re.I)
+HEX_RE = re.compile(r'^#([0-9a-f]{3}|[0-9a-f]{6})$', re.I)
+STOP_RE = re.compile(r'^(.*?)(?:\s+(-?[\d.]+)%)?$', re.S)
+BLUR_RE = re.compile(r'^blur\(\s*([\d.]+)px\s*\)$', re.I)
+
+KEYWORDS = {'left': 0, 'top': 0, 'center': 50, 'right': 100, 'bottom': 100}
+SIDES = {'to top': 0, 'to right': 90, 'to bottom': 180, 'to left': 270}
+NAMED = {'transparent': (0, 0, 0, 0), 'white': (255, 255, 255, 1), 'black': (0, 0, 0, 1)}
+
+def parse_color(text):
+    """(r, g, b, alpha) of a CSS colour, or None"""
+    text = text.strip().lower()
+    if text in NAMED:
+        return NAMED[text]
+    match = RGBA_RE.match(text)
+    if match:
+        r, g, b, a = match.groups()
+        return float(r), float(g), float(b), float(a) if a is not None else 1.0
+    match = HEX_RE.match(text)
+    if match:
+        digits = match.group(1)
+        if len(digits) == 3:
+            digits = ''.join(c * 2 for c in digits)
+        return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4)) + (1.0,)
+    return None
+
+def parse_stops(parts):
+    """[(position 0-1, premultiplied (r, g, b, a))], or None"""
+    stops = []
+    for part in parts:
+        match = STOP_RE.match(part.strip())
+        color = parse_color(match.group(1))
+        if color is None:
+            return None
+        position = float(match.group(2)) / 100 if match.group(2) is not None else None
+        r, g, b, a = color
+        stops.append([position, (r * a, g * a, b * a, a)])
+    if len(stops) < 2:
+        return None
+    if stops[0][0] is None:
+        stops[0][0] = 0.0
+    if stops[-1][0] is None:
+        stops[-1][0] = 1.0
+    # Unpositioned stops are spread evenly between their neighbours
+    index = 1
+    while index < len(stops):
+        if stops[index][0] is None:
+            end = index
+            while stops[end][0] is None:
+                end += 1
+            start = stops[index - 1][0]
+            for offset, stop in enumerate(stops[index:end], 1):
+                stop[0] = start + (stops[end][0] - start) * offset / (end - index + 1)
+            index = end
+        # Positions never go backwards
+        stops[index][0] = max(stops[index][0], stops[index - 1][0])
+        index += 1
+    return [(position, color) for position, color in stops]
+
+def position(text):
+    """A background position component as a 0-1 fraction, or None"""
+    if text is None:
+        return 0.5
+    text = text.lower()
+    if text in KEYWORDS:
+        return KEYWORDS[text] / 100
+    match = PERCENT_RE.match(text)
+    return float(match.group(1)) / 100 if match else None
+
+def parse_gradient(text):
+    """
+    A gradient layer as a function (x, y, width, height) -> t plus its
+    stops, or None if it is not one this module renders.
+    """
+    match = GRADIENT_RE.match(text.strip())
+    if not match:
+        return None
+    kind, args = match.group(1).lower(), css.split_top(match.group(2), ',')
+    head = args[0].strip()
+
+    if kind == 'linear':
+        angle = 180.0
+        if ANGLE_RE.match(head):
+            angle = float(ANGLE_RE.match(head).group(1))
+            args = args[1:]
+        elif head.lower() in SIDES:
+            angle = SIDES[head.lower()]
+            args = args[1:]
+        radians = math.radians(angle)
+        dx, dy = math.sin(radians), -math.cos(radians)
+
+        def ramp(x, y, width, height):
+            length = abs(width * dx) + abs(height * dy)
+            return ((x - width / 2) * dx + (y - height / 2) * dy) / length + 0.5
+    else:
+        shape = RADIAL_SHAPE_RE.match(head) if parse_color(STOP_RE.match(head).group(1)) is None else None
+        circle = False
+        cx = cy = 0.5
+        if shape:
+            circle = (shape.group(1) or '').lower() == 'circle'
+            x, y = shape.group(3), shape.group(4)
+            if x is not None and y is None:
+                # One keyword: the other axis is centred
+                y = 'center'
+            if x and x.lower() in ('top', 'bottom'):
+                x, y = y, x
+            cx, cy = position(x), position(y)
+            if cx is None or cy is None:
+                return None
+            args = args[1:]
+        elif parse_color(STOP_RE.match(head).group(1)) is None:
+            return None
+
+        def ramp(x, y, width, height):
+            px, py = cx * width, cy * height
+            # farthest-corner
+            rx, ry = max(px, width - px), max(py, height - py)
+            if circle:
+                return math.hypot(x - px, y - py) / math.hypot(rx, ry)
+            return math.hypot((x - px) / (rx * math.sqrt(2)), (y - py) / (ry * math.sqrt(2)))
+
+    stops = parse_stops(args)
+    return (ramp, stops) if stops else None
+
+def parse_background(value):
+    """The gradient layers of a background value, top first, or None"""
+    layers = [parse_gradient(part) for part in css.split_top(value, ',')]
+    if not layers or any(layer is None for layer in layers):
+        return None
+    return layers
+
+def sample(stops, t):
+    if t <= stops[0][0]:
+        return stops[0][1]
+    for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+        if t <= p1:
+            f = (t - p0) / (p1 - p0) if p1 > p0 else 1.0
+            return tuple(a + (b - a) * f for a, b in zip(c0, c1))
+    return stops[-1][1]
+
+def render(layers, box, blur=0):
+    """RGBA image of the gradient layers over a box (CSS px), TEXTURE_SCALE in size"""
+    width, height = box
+    size = (max(1, round(width * TEXTURE_SCALE)), max(1, round(height * TEXTURE_SCALE)))
+    pixels = []
+    for row in range(size[1]):
+        y = (row + 0.5) / size[1] * height
+        for column in range(size[0]):
+            x = (column + 0.5) / size[0] * width
+            r = g = b = a = 0.0
+            # Bottom layer first; premultiplied source-over
+            for ramp, stops in reversed(layers):
+                sr, sg, sb, sa = sample(stops, ramp(x, y, width, height))
+                r, g, b, a = sr + r * (1 - sa), sg + g * (1 - sa), sb + b * (1 - sa), sa + a * (1 - sa)
+            if a > 0:
+                pixels.append((round(r / a), round(g / a), round(b / a), round(a * 255)))
+            else:
+                pixels.append((0, 0, 0, 0))
+    image = Image.new('RGBA', size)
+    image.putdata(pixels)
+    if blur * TEXTURE_SCALE >= 0.5:
+        image = image.filter(ImageFilter.GaussianBlur(blur * TEXTURE_SCALE))
+    return image
+
+def texture(value, box, blur=0, cache_dir=CACHE_DIR):
+    """WebP bytes of a gradient background, or None; cached by its inputs"""
+    layers = parse_background(value)
+    if layers is None:
+        return None
+    key = hashlib.sha256(repr((FORMAT, css.normalize(value), box, blur, TEXTURE_SCALE, QUALITY)).encode())
+    path = os.path.join(cache_dir, "sky", key.hexdigest() + ".webp")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    out = io.BytesIO()
+    render(layers, box, blur).save(out, 'WEBP', quality=QUALITY, method=6)
+    data = out.getvalue()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return data
+
+def layer_box(declarations):
+    """Size in CSS px of a layer at the reference viewport"""
+    props = {prop: value for prop, value, _ in declarations}
+    box = []
+    for prop, reference in zip(('width', 'height'), REFERENCE_VIEWPORT):
+        match = PERCENT_RE.match(props.get(prop, '100%').strip())
+        box.append(round(reference * float(match.group(1)) / 100) if match else reference)
+    return tuple(box)
+
+def top_level(text):
+    """(start, brace, end) of each top-level block of a stylesheet"""
+    depth = 0
+    start = 0
+    brace = None
+    for match in TOKEN_RE.finditer(text):
+        token = match.group()
+        if token.startswith(('/*', '"', "'")):
+            continue
+        if token == '{':
+            if depth == 0:
+                brace = match.start()
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                yield start, brace, match.end()
+                start = match.end()
+        elif token == ';' and depth == 0:
+            start = match.end()
+
+def composited_keyframes(text, name, indent):
+    """
+    (block, properties) for a @keyframes block: its text renamed to name
+    with only COMPOSITED properties left, or None if it animates nothing
+    else anyway, and the COMPOSITED properties it animates. With no such
+    properties the animation does nothing once cut down; block is then STILL.
+    """
+    brace = text.index('{')
+    body = text[brace + 1:text.rindex('}')]
+    lines = [f"{indent}{text[:brace].split()[0]} {name} {{"]
+    changed = False
+    properties = set()
+    for start, inner, end in top_level(body):
+        declarations = css.parse_declarations(css.strip_comments(body[inner + 1:end - 1])) or []
+        kept = [(prop, value) for prop, value, _ in declarations if prop in COMPOSITED]
+        changed = changed or len(kept) != len(declarations)
+        properties.update(prop for prop, _ in kept)
+        if kept:
+            selector = css.normalize(css.strip_comments(body[start:inner]))
+            lines.append(f"{indent}{css.INDENT}{selector} {{ "
+                         + ' '.join(f"{prop}: {value};" for prop, value in kept) + " }")
+    lines.append(f"{indent}}}")
+    if not properties:
+        return STILL, properties
+    return ('\n'.join(lines) if changed else None), properties
+
+def animation_value(prop, value, keyframes):
+    """
+    value of an animation / animation-name declaration with keyframes'
+    names replaced, and the STILL ones taken out; None if none is left.
+    """
+    parts = []
+    dropped = False
+    for part in css.split_top(value, ','):
+        words = part.split()
+        if any(keyframes.get(word) is STILL for word in words):
+            dropped = True
+            if prop == 'animation-name':
+                # Keeps the other animation-* lists lined up
+                parts.append('none')
+            continue
+        parts.append(' '.join(keyframes.get(word, word) for word in words))
+    if dropped and all(part == 'none' for part in parts):
+        return None
+    return ', '.join(parts)
+
+class SkyGlass:
+    """Rewrites the sky-glass rules of a page's stylesheets"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.textures = 0
+        self.bytes = 0
+        self.kept = []
+        self.animations = 0
+        self.stopped = 0
+
+    def rule(self, selector, declarations, keyframes, properties, indent):
+        """
+        New text for one sky-glass rule; keyframes maps animation names to
+        their composited name (or STILL), properties to what each animates.
+        """
+        props = {prop: value for prop, value, _ in declarations}
+        blur = 0
+        filters = props.get('filter', '').strip()
+        if BLUR_RE.match(filters):
+            blur = float(BLUR_RE.match(filters).group(1))
+
+        data = None
+        background = next((prop for prop in ('background', 'background-image') if prop in props), None)
+        if background:
+            data = texture(props[background], layer_box(declarations), blur, self.cache_dir)
+            if data is None:
+                self.kept.append(selector)
+
+        result = []
+        for prop, value, important in declarations:
+            if prop == background and data is not None:
+                url = f"data:image/webp;base64,{base64.b64encode(data).decode('ascii')}"
+                value = f"url({url}) 0 0 / 100% 100% no-repeat"
+                prop = 'background'
+                self.textures += 1
+                self.bytes += len(url)
+            elif prop == 'filter' and blur and data is not None:
+                # Baked into the texture
+                continue
+            elif prop in ('animation', 'animation-name'):
+                value = animation_value(prop, value, keyframes)
+                if value is None:
+                    continue
+            result.append([prop, value, important])
+        animated = {prop for name in self.animation_names(result) for prop in properties.get(name, ())}
+        for prop in COMPOSITED:
+            if prop in animated:
+                result.append(['will-change', prop, False])
+                break
+        return css.format_rule(css.Rule((), selector, result), indent)
+
+    @staticmethod
+    def animation_names(declarations):
+        return {word for prop, value, _ in declarations if prop in ('animation', 'animation-name')
+                for word in value.replace(',', ' ').split()}
+
+    def style(self, text):
+        """
+        Rewrites the top-level sky-glass rules and keyframes of a stylesheet;
+        ones nested in @media or other at-rules are left as they are.
+        """
+        blocks = list(top_level(text))
+        rules = []
+        frames = {}
+        for start, brace, end in blocks:
+            prelude = css.normalize(css.strip_comments(text[start:brace]))
+            if prelude in SELECTORS:
+                rules.append((start, brace, end, prelude))
+            match = KEYFRAMES_RE.match(prelude)
+            if match:
+                frames[match.group(1)] = (start, end)
+        if not rules:
+            return None
+
+        lead = re.match(r'(?:\s|/\*.*?\*/)*', text[rules[0][0]:rules[0][1]], re.S).group()
+        indent = re.search(r'[ \t]*$', lead).group()
+
+        # Animations of the layers, cut down to what the compositor animates
+        used = set()
+        for _, brace, end, _ in rules:
+            used |= self.animation_names(css.parse_declarations(text[brace + 1:end - 1]) or [])
+        renamed = {}
+        properties = {}
+        added = []
+        for name in sorted(used & set(frames)):
+            start, end = frames[name]
+            block, animated = composited_keyframes(text[start:end].strip(), f"{name}-composited", indent)
+            if block is STILL:
+                renamed[name] = STILL
+                self.stopped += 1
+                continue
+            if block is not None:
+                renamed[name] = name = f"{name}-composited"
+                added.append(block)
+                self.animations += 1
+            properties[name] = animated
+
+        parts = []
+        pos = 0
+        for start, brace, end, selector in rules:
+            lead = re.match(r'(?:\s|/\*.*?\*/)*', text[start:brace], re.S).group()
+            indent = re.search(r'[ \t]*$', lead).group()
+            declarations = css.parse_declarations(css.strip_comments(text[brace + 1:end - 1]))
+            if declarations is None:
+                continue
+            parts.append(text[pos:start + len(lead) - len(indent)])
+            parts.append(self.rule(selector, declarations, renamed, properties, indent))
+            pos = end
+        last = rules[-1][2]
+        parts.append(text[pos:last])
+        for block in added:
+            parts.append(f"\n\n{block}")
+        parts.append(COARSE_CSS)
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def subscribe(self, rewriter):
+        rewriter.on('style', self.style)
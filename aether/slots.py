@@ -0,0 +1,46 @@
+"""
+Rendered size of the v16 image slots.
+
+The largest CSS box each slot can take on the final internal page: the
+v16 max-widths (create_v16_clean.ENHANCED_CSS) enlarged 36% by
+create_internal_protected.ENHANCED_IMAGE_CSS, never wider than the
+window content, and the full content width below the mobile breakpoint.
+"""
+
+import math
+
+from create_internal_protected import SIZE_MULTIPLIER
+
+# v16 max-width (px) per slot; floats are also capped at 44% of the content
+SLOT_MAX_WIDTHS = {'hero': 800, 'large': 650, 'medium': 500, 'float': 380}
+FLOAT_FRACTION = 0.44
+
+# .window max-width 1000px (fix_and_optimize) less 2 x 40px padding and 2 x 2px border
+CONTENT_WIDTH = 916
+
+# Below the breakpoint every slot is full width: the window is 96vw with
+# 2 x 20px content padding
+MOBILE_BREAKPOINT = 768
+MOBILE_WIDTH = int(MOBILE_BREAKPOINT * 0.96) - 40
+
+def slot_for(size, pos):
+    """Slot of an insertion-table row: floats for left/right, else its size"""
+    return 'float' if pos in ('left', 'right') else size
+
+def desktop_box(slot):
+    width = int(SLOT_MAX_WIDTHS[slot] * SIZE_MULTIPLIER)
+    if slot == 'float':
+        width = min(width, int(CONTENT_WIDTH * FLOAT_FRACTION * SIZE_MULTIPLIER))
+    return min(width, CONTENT_WIDTH)
+
+def max_box(slot):
+    """Widest the slot renders at any viewport, in CSS px"""
+    return max(desktop_box(slot), MOBILE_WIDTH)
+
+def target_width(slot, dpr=1):
+    """Image pixels needed to fill the slot at a device pixel ratio"""
+    return math.ceil(max_box(slot) * dpr)
+
+def sizes(slot):
+    """sizes attribute matching the slot's rendered width"""
+    return f"(max-width: {MOBILE_BREAKPOINT}px) calc(96vw - 40px), {desktop_box(slot)}px"
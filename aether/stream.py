@@ -0,0 +1,245 @@
+"""
+Streaming HTML rewriting.
+
+tokenize() turns an iterable of text chunks into a stream of
+(kind, text) events:
+
+    'text'     character data up to the next '<'
+    'tag'      a start or end tag, including every attribute
+    'comment'  <!-- ... -->
+    'doctype'  <!DOCTYPE ...> and other <! declarations
+    'style'    the contents of a <style> element
+    'script'   the contents of a <script> element
+
+Joining the texts of all events gives back the input exactly, and the
+events do not depend on where the chunks happen to be split. Only the
+token being read is buffered, so a page is never held whole: the largest
+token (usually one inline base64 image) bounds the memory used.
+
+Transforms subscribe to a Rewriter, which passes every event through
+their handlers and writes the result out as it goes.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+
+CHUNK_SIZE = 1 << 16
+
+KINDS = ('text', 'tag', 'comment', 'doctype', 'style', 'script')
+
+# Elements whose contents are raw text up to the matching end tag
+RAW_TEXT = ('style', 'script')
+
+TAG_NAME_RE = re.compile(r'</?([A-Za-z][^\s/>]*)')
+TAG_END_RE = re.compile(r'[>"\']')
+RAW_END_RES = {name: re.compile(rf'</{name}[\s>/]', re.I) for name in RAW_TEXT}
+
+def tag_name(tag):
+    """Lower-case element name of a tag token ('' for anything else)"""
+    match = TAG_NAME_RE.match(tag)
+    return match.group(1).lower() if match else ''
+
+def is_end_tag(tag):
+    return tag.startswith('</')
+
+def scan_tag(buf, pos):
+    """End offset of the tag starting at buf[pos], or -1 if it is incomplete"""
+    while True:
+        match = TAG_END_RE.search(buf, pos)
+        if match is None:
+            return -1
+        if match.group() == '>':
+            return match.end()
+        # Quoted attribute value: skip to the closing quote
+        close = buf.find(match.group(), match.end())
+        if close == -1:
+            return -1
+        pos = close + 1
+
+def next_token(buf, pos, raw, final):
+    """
+    (kind, end) of the token at buf[pos], or None when more input is needed.
+
+    raw is the raw-text element ('style' / 'script') being read, if any.
+    """
+    if raw:
+        match = RAW_END_RES[raw].search(buf, pos)
+        if match:
+            return raw, match.start()
+        return (raw, len(buf)) if final else None
+
+    if buf[pos] != '<':
+        end = buf.find('<', pos)
+        if end != -1:
+            return 'text', end
+        return ('text', len(buf)) if final else None
+
+    if buf.startswith('<!--', pos):
+        end = buf.find('-->', pos + 4)
+        if end != -1:
+            return 'comment', end + 3
+    elif buf.startswith('<!', pos) or buf.startswith('<?', pos):
+        end = buf.find('>', pos)
+        if end != -1:
+            return 'doctype', end + 1
+    elif TAG_NAME_RE.match(buf, pos):
+        end = scan_tag(buf, pos)
+        if end != -1:
+            return 'tag', end
+    elif final or len(buf) - pos > 2 or buf[pos:] not in ('<', '</'):
+        # A '<' that does not start markup is plain text
+        end = buf.find('<', pos + 1)
+        if end != -1:
+            return 'text', end
+        return ('text', len(buf)) if final else None
+
+    if not final:
+        return None
+    # Unterminated markup at the end of the input
+    return 'text', len(buf)
+
+def tokenize(chunks):
+    """Generate (kind, text) events from an iterable of text chunks"""
+    buf = ''
+    raw = None
+    chunks = iter(chunks)
+    final = False
+
+    while True:
+        pos = 0
+        while pos < len(buf):
+            token = next_token(buf, pos, raw, final)
+            if token is None:
+                break
+            kind, end = token
+            if end == pos:
+                # Empty raw-text element: its end tag follows directly
+                raw = None
+                continue
+            text = buf[pos:end]
+            pos = end
+            yield kind, text
+            if kind == 'tag':
+                name = tag_name(text)
+                raw = name if name in RAW_TEXT and not is_end_tag(text) else None
+            elif kind in RAW_TEXT:
+                raw = None
+        buf = buf[pos:]
+
+        if final:
+            return
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        else:
+            buf += chunk
+
+def string_chunks(text, size=CHUNK_SIZE):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+def open_text(path, mode, compressed=None):
+    """Open a page for reading or writing; .gz files are compressed"""
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=1)
+    return open(path, mode, encoding='utf-8')
+
+def read_chunks(path, size=CHUNK_SIZE):
+    with open_text(path, 'r') as f:
+        for chunk in iter(lambda: f.read(size), ''):
+            yield chunk
+
+def read_text(path):
+    with open_text(path, 'r') as f:
+        return f.read()
+
+def write_chunks(chunks, path):
+    """
+    Write chunks to path as they arrive, replacing path atomically.
+
+    Returns the SHA-256 of the written text; path may be the file the
+    chunks are being read from.
+    """
+    digest = hashlib.sha256()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open_text(tmp, 'w', compressed=path.endswith('.gz')) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk.encode('utf-8'))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return digest.hexdigest()
+
+class Rewriter:
+    """
+    Event dispatcher a transform subscribes its handlers to.
+
+    on(kind, handler): handler(text) is called for each event of that
+    kind and returns the replacement text, or None to keep it.
+
+    filter(func): func(events) is a generator over the whole (kind, text)
+    stream, for rewrites that need to look ahead or hold a few events
+    back. Filters run after the handlers, in the order they were added.
+
+    after(func): func() is called once the whole page has been rewritten,
+    e.g. to report what the handlers did.
+    """
+
+    def __init__(self):
+        self.handlers = {kind: [] for kind in KINDS}
+        self.filters = []
+        self.finishers = []
+
+    def on(self, kind, handler):
+        if kind not in self.handlers:
+            raise KeyError(f"Unknown event kind: {kind}")
+        self.handlers[kind].append(handler)
+
+    def filter(self, func):
+        self.filters.append(func)
+
+    def after(self, func):
+        self.finishers.append(func)
+
+    def dispatch(self, events):
+        for kind, text in events:
+            for handler in self.handlers[kind]:
+                result = handler(text)
+                if result is not None:
+                    text = result
+            yield kind, text
+
+    def events(self, events):
+        events = self.dispatch(events)
+        for func in self.filters:
+            events = func(events)
+        return events
+
+    def rewrite(self, chunks):
+        """Rewritten output of chunks, as a stream of text pieces"""
+        for kind, text in self.events(tokenize(chunks)):
+            yield text
+        for func in self.finishers:
+            func()
+
+def rewriter(*subscribers):
+    """Rewriter with each subscriber(rewriter) function registered"""
+    result = Rewriter()
+    for subscribe in subscribers:
+        subscribe(result)
+    return result
+
+def rewrite_text(html, *subscribers):
+    """Rewrite a page held in memory"""
+    return ''.join(rewriter(*subscribers).rewrite(string_chunks(html)))
+
+def rewrite_file(src, dst, *subscribers):
+    """Rewrite src into dst chunk by chunk; returns the output's SHA-256"""
+    return write_chunks(rewriter(*subscribers).rewrite(read_chunks(src)), dst)
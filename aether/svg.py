@@ -0,0 +1,247 @@
+"""
+SVG optimization.
+
+The brand SVGs in the repository root (BRAND-FounderHeadshot.svg, ...)
+are editor exports around base64 PNGs: a colour image drawn through a
+luminance mask that is itself a grayscale PNG, clipped to a rectangle.
+Nearly all of their bytes are those payloads. optimize() rewrites one:
+
+- editor attributes and elements (zoomAndPan, version, <metadata>,
+  inkscape:/sodipodi: markup) and comments go;
+- coordinates are rounded to PRECISION decimals and transforms to
+  6 significant digits, and a path's trailing moveto, which draws
+  nothing, is dropped;
+- an image drawn through a grayscale mask of the same size and placement
+  becomes one RGBA image, and the mask and its filters go;
+- each embedded raster becomes a WebP master in <root>/webp/ and an AVIF
+  in <root>/avif/, so the asset registry and the variants stage see it,
+  and the optimized SVG written to <root>/svg/ references the WebP.
+
+Browsers do not load external images of an SVG shown through <img>; for
+that use embed=True, which keeps the payloads inline as WebP data URLs.
+
+Without Pillow only the markup is optimized and payloads stay as they are.
+"""
+
+import base64
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aether.assets import ASSET_ROOT, VARIANTS
+from aether.variants import ENCODERS
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+
+SVG_DIR = "svg"
+SOURCES = "BRAND*.svg"
+PRECISION = 3
+
+COMMENT_RE = re.compile(r'<!--.*?-->', re.S)
+METADATA_RE = re.compile(r'<metadata\b.*?</metadata>|<metadata\b[^>]*/>', re.S)
+EDITOR_ELEMENT_RE = re.compile(r'<(sodipodi|inkscape):(\w+)\b[^>]*?(?:/>|>.*?</\1:\2>)', re.S)
+EDITOR_ATTRIBUTE_RE = re.compile(
+    r'\s(?:zoomAndPan|version|xmlns:(?:sodipodi|inkscape)|(?:sodipodi|inkscape):[-\w]+)="[^"]*"')
+
+NUMBER_RE = re.compile(r'-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+COORDINATE_RE = re.compile(r'(\s(?:d|points|viewBox|x|y|x1|y1|x2|y2|cx|cy|r|rx|ry|width|height)=")([^"]*)"')
+TRANSFORM_RE = re.compile(r'(\stransform=")([^"]*)"')
+TRAILING_MOVETO_RE = re.compile(r'([zZ])\s*[mM][-\d.eE\s,]*$')
+
+FILTER_RE = re.compile(
+    r'<filter\b[^>]*\sid="([^"]+)"[^>]*>\s*<feColorMatrix\s+values="([^"]*)"[^>]*/>\s*</filter>')
+MASK_RE = re.compile(
+    r'<mask id="([^"]+)">\s*<g filter="url\(#([^)]+)\)">\s*<g filter="url\(#([^)]+)\)"'
+    r'((?:\s+transform="[^"]*")?)>\s*<image\b([^>]*)/>\s*</g>\s*</g>\s*</mask>')
+MASKED_RE = r'<g mask="url\(#{}\)">\s*<g{}>\s*<image\b([^>]*)/>\s*</g>\s*</g>'
+HREF_RE = re.compile(r'(\s(?:xlink:)?href=")data:image/[a-z0-9.+-]+;base64,([A-Za-z0-9+/=]+)"')
+BOX_RE = re.compile(r'\s(x|y|width|height)="([^"]*)"')
+IMAGE_HREF_RE = re.compile(r'(<image\b[^>]*?\s(?:xlink:)?href=")(data:image/[a-z0-9.+-]+;base64,[A-Za-z0-9+/=]+)"')
+
+# feColorMatrix values of the two mask filters editors export
+KEEP_ALPHA = "0 0 0 0 1 0 0 0 0 1 0 0 0 0 1 0 0 0 1 0"
+LUMINANCE_TO_ALPHA = "0 0 0 0 1 0 0 0 0 1 0 0 0 0 1 0.2126 0.7152 0.0722 0 0"
+
+def strip_editor(svg):
+    """svg without comments and editor-only elements and attributes"""
+    svg = COMMENT_RE.sub('', svg)
+    svg = METADATA_RE.sub('', svg)
+    svg = EDITOR_ELEMENT_RE.sub('', svg)
+    return EDITOR_ATTRIBUTE_RE.sub('', svg)
+
+def format_number(value):
+    text = f"{value:.{PRECISION}f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def round_numbers(svg):
+    """Coordinates to PRECISION decimals, transforms to 6 significant digits"""
+    def coordinates(match):
+        value = NUMBER_RE.sub(lambda m: format_number(float(m.group())), match.group(2))
+        if match.group(1).strip() == 'd="':
+            value = TRAILING_MOVETO_RE.sub(r'\1', ' '.join(value.split()))
+        return f'{match.group(1)}{value}"'
+
+    def transform(match):
+        value = NUMBER_RE.sub(lambda m: f"{float(m.group()):.6g}", match.group(2))
+        return f'{match.group(1)}{value}"'
+
+    return TRANSFORM_RE.sub(transform, COORDINATE_RE.sub(coordinates, svg))
+
+def decode_image(data):
+    with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+        image.load()
+    return image
+
+def luminance(image):
+    """Mask values of image: its luminance (filter coefficients) times its alpha"""
+    rgba = image.convert('RGBA')
+    values = rgba.convert('RGB').convert('L', (0.2126, 0.7152, 0.0722, 0))
+    if rgba.getextrema()[3][0] < 255:
+        values = ImageChops.multiply(values, rgba.getchannel('A'))
+    return values
+
+def bake_masks(svg):
+    """
+    Fold each image drawn through a luminance mask of the same size and
+    placement into one RGBA image; returns (svg, masks folded).
+    """
+    filters = {fid: ' '.join(values.split()) for fid, values in FILTER_RE.findall(svg)}
+    baked = 0
+    for match in list(MASK_RE.finditer(svg)):
+        mask_id, outer, inner, transform, mask_image = match.groups()
+        if filters.get(inner) != LUMINANCE_TO_ALPHA or filters.get(outer) != KEEP_ALPHA:
+            continue
+        masked = re.search(MASKED_RE.format(re.escape(mask_id), re.escape(transform)), svg)
+        if not masked:
+            continue
+        image = masked.group(1)
+        if dict(BOX_RE.findall(image)) != dict(BOX_RE.findall(mask_image)):
+            continue
+        color, alpha = HREF_RE.search(image), HREF_RE.search(mask_image)
+        if not color or not alpha:
+            continue
+        picture = decode_image(color.group(2))
+        values = luminance(decode_image(alpha.group(2)))
+        if picture.size != values.size:
+            continue
+        if picture.mode == 'RGBA':
+            values = ImageChops.multiply(values, picture.getchannel('A'))
+        picture = picture.convert('RGB')
+        picture.putalpha(values)
+        # Only read back by extract_rasters, so the fastest PNG will do
+        out = io.BytesIO()
+        picture.save(out, 'PNG', compress_level=1)
+        payload = base64.b64encode(out.getvalue()).decode('ascii')
+        image = (f'{image[:color.start()]}{color.group(1)}data:image/png;base64,{payload}"'
+                 f'{image[color.end():]}')
+
+        svg = (svg[:masked.start()] + f'<g{transform}><image{image}/></g>' + svg[masked.end():])
+        svg = svg.replace(match.group(), '', 1)
+        baked += 1
+
+    # Filters nothing refers to any more
+    for fid in filters:
+        if f'url(#{fid})' not in svg:
+            svg = re.sub(r'<filter\b[^>]*\sid="{}"[^>]*>.*?</filter>'.format(re.escape(fid)), '', svg,
+                         flags=re.S)
+    return svg.replace('<defs></defs>', ''), baked
+
+def encode(image, fmt):
+    out = io.BytesIO()
+    image.save(out, fmt, **ENCODERS[fmt])
+    return out.getvalue()
+
+def write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def extract_rasters(svg, name, root=ASSET_ROOT, embed=False):
+    """
+    Move the embedded rasters of svg to WebP masters and AVIF variants
+    under root (or re-embed them as WebP with embed=True).
+
+    Returns (svg, {path: bytes written}).
+    """
+    matches = list(IMAGE_HREF_RE.finditer(svg))
+    written = {}
+    parts, pos = [], 0
+    for index, match in enumerate(matches):
+        image = decode_image(match.group(2).split(',', 1)[1])
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        webp = encode(image, 'WEBP')
+        if embed:
+            href = f"data:image/webp;base64,{base64.b64encode(webp).decode('ascii')}"
+        else:
+            asset = name if len(matches) == 1 else f"{name}-{index + 1}"
+            paths = {}
+            for variant, data in (('full', webp), ('avif', encode(image, 'AVIF'))):
+                directory, template = VARIANTS[variant]
+                paths[variant] = os.path.join(root, directory, template.format(name=asset))
+                write_bytes(paths[variant], data)
+                written[paths[variant]] = len(data)
+            href = os.path.relpath(paths['full'], os.path.join(root, SVG_DIR)).replace(os.sep, '/')
+        parts.append(svg[pos:match.start(2)] + href)
+        pos = match.end(2)
+    parts.append(svg[pos:])
+    return ''.join(parts), written
+
+def optimize(path, root=ASSET_ROOT, embed=False):
+    """Worker: write the optimized SVG for path; returns (before, {path: bytes})"""
+    with open(path, 'r', encoding='utf-8') as f:
+        svg = f.read()
+    name = os.path.splitext(os.path.basename(path))[0]
+    optimized = round_numbers(strip_editor(svg))
+    written = {}
+    if Image is not None:
+        optimized, _ = bake_masks(optimized)
+        optimized, written = extract_rasters(optimized, name, root, embed)
+
+    target = target_path(path, root)
+    write_bytes(target, optimized.encode('utf-8'))
+    written[target] = len(optimized.encode('utf-8'))
+    return len(svg.encode('utf-8')), written
+
+def target_path(path, root=ASSET_ROOT):
+    return os.path.join(root, SVG_DIR, os.path.basename(path))
+
+def up_to_date(path, root=ASSET_ROOT):
+    try:
+        return os.stat(target_path(path, root)).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+def optimize_all(paths, root=ASSET_ROOT, embed=False, jobs=None):
+    """Optimize every changed SVG in paths on a process pool and report the sizes"""
+    if Image is None:
+        print("Note: Pillow is not installed, embedded rasters are left in place")
+    start = time.perf_counter()
+    pending = [path for path in paths if not up_to_date(path, root)]
+    print(f"{len(paths)} SVGs, {len(pending)} changed")
+    total_before = total_after = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {path: pool.submit(optimize, path, root, embed) for path in pending}
+        for path, future in futures.items():
+            before, written = future.result()
+            after = sum(written.values())
+            webp = sum(size for p, size in written.items() if p.endswith('.webp'))
+            svg = sum(size for p, size in written.items() if p.endswith('.svg'))
+            total_before += before
+            total_after += svg + webp
+            print(f"  {os.path.basename(path)}: {before / 1024:.1f} KB -> svg {svg / 1024:.1f} KB"
+                  + (f" + webp {webp / 1024:.1f} KB" if webp else "")
+                  + (f" (avif {(after - svg - webp) / 1024:.1f} KB)" if after - svg - webp else ""))
+    if not pending:
+        return
+    print(f"Optimized {len(pending)} SVGs in {time.perf_counter() - start:.2f}s: "
+          f"{total_before / 1024 / 1024:.2f} MB -> {total_after / 1024 / 1024:.2f} MB")
+    if Image is not None and not embed:
+        print("Run `python -m aether variants` to derive the widths of the new masters")
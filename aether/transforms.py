@@ -0,0 +1,210 @@
+"""
+Build transforms wrapping the original one-shot scripts.
+
+Each transform rewrites doc.html in place, or subscribes handlers to the
+page's event stream (optimize, rain, sky, placeholders, css, prune,
+critical, dedupe, defer, minify, externalize); the scripts keep working on
+their own for one-off runs.
+
+"""
+
+import os
+
+import add_touch_support
+import create_internal_protected
+import create_v16_clean
+import fix_and_optimize
+
+import aether.assets
+from aether import (assetcache, critical, css, defer, insertion, manifest, matcher, minify, pictures,
+                    placeholders, pool, prune, rain, sky, slots, stream, variants)
+from aether.assets import externalize_data_urls, publish_bytes
+from aether.pictures import PictureBuilder, rewrite_pictures
+from aether.pipeline import assets_dir, page_chunks, registry, transform
+
+@transform("v16", version=2, sources=(create_v16_clean, insertion, matcher, aether.assets, assetcache,
+                                     manifest, slots, variants, create_internal_protected))
+def v16_images(doc):
+    """v14 -> v16: 9 images per tab and the v16 image CSS"""
+    assets = registry(doc)
+    print(f"Indexed {len(assets)} assets")
+    doc.html = create_v16_clean.create_v16(doc.html, assets,
+                                           doc.options.get('embed_dpr', create_v16_clean.EMBED_DPR))
+    print(f"Loaded {assets.loaded} asset variants")
+    missing = sorted(path for path, exists in assets.used.items() if not exists)
+    if missing:
+        print(f"Warning: {len(missing)} variant files missing, larger fallbacks were inlined "
+              f"(run python -m aether variants): {', '.join(missing)}")
+
+@transform("protect", sources=(create_internal_protected,))
+def protect(doc):
+    """v16 -> internal protected edition"""
+    doc.html = create_internal_protected.protect(doc.html)
+
+@transform("optimize", sources=(fix_and_optimize,), streaming=True)
+def optimize(doc, rewriter):
+    """CSS fixes and mobile/desktop optimization CSS"""
+    fix_and_optimize.subscribe(rewriter)
+
+@transform("touch", sources=(add_touch_support,))
+def touch(doc):
+    """Touch dragging and runtime JS optimizations"""
+    doc.html = add_touch_support.add_touch_support(doc.html)
+
+@transform("rain", sources=(rain,), streaming=True)
+def matrix_rain(doc, rewriter):
+    """Replace the setInterval matrix rain with the atlas / rAF renderer"""
+    renderer = rain.RainRenderer(rain.count_names(stream.tokenize(page_chunks(doc))))
+    renderer.subscribe(rewriter)
+
+    def report():
+        if renderer.replaced:
+            print(f"Replaced the matrix rain renderer ({renderer.before / 1024:.1f} KB -> "
+                  f"{renderer.after / 1024:.1f} KB)")
+        else:
+            print(f"Skipped: {renderer.skipped or 'no matrix rain renderer'}")
+    rewriter.after(report)
+
+@transform("sky", sources=(sky, css), streaming=True)
+def sky_glass(doc, rewriter):
+    """Paint the sky-glass gradients from a prerendered texture and animate it on the compositor"""
+    if sky.Image is None:
+        print("Skipped: Pillow is not installed")
+        return
+    glass = sky.SkyGlass()
+    glass.subscribe(rewriter)
+
+    def report():
+        print(f"Rendered {glass.textures} sky textures ({glass.bytes / 1024:.1f} KB), "
+              f"made {glass.animations} animations composited, dropped {glass.stopped}")
+        if glass.kept:
+            print(f"  kept the background of {', '.join(glass.kept)}")
+    rewriter.after(report)
+
+@transform("placeholders", version=2, sources=(placeholders, manifest, aether.assets, assetcache),
+           streaming=True)
+def image_placeholders(doc, rewriter):
+    """Reserve each generated image's box and paint its LQIP and dominant colour first"""
+    filler = placeholders.Placeholders(registry(doc))
+    filler.subscribe(rewriter)
+    rewriter.after(lambda: print(
+        f"Sized {filler.sized} and previewed {filler.previews} of {filler.images} asset images "
+        f"(+{filler.bytes / 1024:.1f} KB)"))
+
+@transform("css", sources=(css,), streaming=True)
+def stylesheets(doc, rewriter):
+    """Consolidate the page's <style> elements into one parsed, merged stylesheet"""
+    styles = css.PageStyles(css.collect(stream.tokenize(page_chunks(doc))))
+    styles.subscribe(rewriter)
+    stats = styles.stats
+    rewriter.after(lambda: print(
+        f"Merged {styles.elements} <style> elements: {stats.merged} duplicate rules, "
+        f"{stats.overridden + stats.repeats} overridden declarations, "
+        f"{stats.media_before} -> {stats.media_after} media blocks "
+        f"({(styles.before - styles.after) / 1024:.1f} KB saved)"))
+
+@transform("prune", sources=(css, critical, prune), streaming=True)
+def prune_css(doc, rewriter):
+    """Drop CSS rules no element of the page, or class its scripts add, can match"""
+    pruner = prune.Pruner(prune.PageNames(stream.tokenize(page_chunks(doc))))
+    pruner.subscribe(rewriter)
+    rewriter.after(lambda: print(
+        f"Removed {pruner.rules} unused rules ({pruner.removed / 1024:.1f} KB)"))
+
+@transform("critical", sources=(css, critical), streaming=True)
+def critical_css(doc, rewriter):
+    """Inline only the above-the-fold CSS and load the rest after first paint"""
+    scan = critical.PageScan(stream.tokenize(page_chunks(doc)))
+    external = doc.options.get('external_assets')
+    if scan.run is None:
+        print("Skipped: no <style> in <head>")
+        return
+    if not scan.movable:
+        print("Skipped: another stylesheet follows the <head> <style>")
+        return
+    if not scan.fold.regions:
+        print(f"Skipped: none of {', '.join(critical.REGIONS)} on the page")
+        return
+    if not external and not scan.body_end:
+        print("Skipped: no </body> for the deferred stylesheet")
+        return
+
+    inline, deferred, rules = critical.split(''.join(scan.texts), scan.fold)
+    href = None
+    if external:
+        filename = publish_bytes(deferred.encode('utf-8'), "styles", ".css", assets_dir(doc))
+        registry(doc).published.add(os.path.join(assets_dir(doc), filename))
+        href = f"{os.path.basename(assets_dir(doc))}/{filename}"
+    critical.CriticalStyles(scan.run, inline, deferred, href).subscribe(rewriter)
+    print(f"Inlined {rules} above-the-fold rules ({len(inline) / 1024:.1f} KB), "
+          f"deferred {len(deferred) / 1024:.1f} KB" + (f" to {href}" if href else ""))
+
+@transform("picture", sources=(pictures, aether.assets, manifest, slots, pictures.SRCSET_CONFIG))
+def picture(doc):
+    """AVIF/WebP/PNG <picture> elements with srcsets for every asset image"""
+    if not doc.options.get('external_assets'):
+        print("Skipped: <picture> srcsets need --external-assets")
+        return
+    doc.html, count = rewrite_pictures(doc.html, PictureBuilder(registry(doc)))
+    print(f"Rewrote {count} images as <picture>")
+
+@transform("dedupe", sources=(pool,), streaming=True)
+def dedupe(doc, rewriter):
+    """Ship each repeated inline image payload once per page"""
+    if doc.options.get('external_assets'):
+        print("Skipped: --external-assets pages already share image files")
+        return
+    counts, body_end = pool.count_payloads(stream.tokenize(page_chunks(doc)))
+    if not body_end:
+        print("Skipped: no </body> for the image pool script")
+        return
+    image_pool = pool.ImagePool(counts)
+    image_pool.subscribe(rewriter)
+    rewriter.after(lambda: print(
+        f"Shared {image_pool.shared} repeated images ({image_pool.saved / 1024:.0f} KB saved)"))
+
+@transform("defer", sources=(defer, prune), streaming=True)
+def defer_panels(doc, rewriter):
+    """Ship hidden windows' and tabs' content inert, parsed when first opened"""
+    panels, body_end = defer.scan(stream.tokenize(page_chunks(doc)),
+                                  prune.PageNames(stream.tokenize(page_chunks(doc))))
+    if not body_end:
+        print("Skipped: no </body> for the hydration script")
+        return
+    for panel, reason in panels.items():
+        if reason:
+            print(f"  #{panel} stays: {reason}")
+    deferrer = defer.Deferrer(panels)
+    deferrer.subscribe(rewriter)
+    rewriter.after(lambda: print(
+        f"Deferred {deferrer.deferred} of {len(panels)} panels ({deferrer.bytes / 1024:.1f} KB)"))
+
+@transform("minify", sources=(css, minify), streaming=True)
+def minify_page(doc, rewriter):
+    """Strip comments and collapse whitespace in the HTML, CSS and JS"""
+    minifier = minify.Minifier(minify.scan(stream.tokenize(page_chunks(doc))))
+    minifier.subscribe(rewriter)
+    rewriter.after(lambda: print(minifier.sections.report()))
+
+@transform("externalize", sources=(aether.assets,), streaming=True)
+def externalize(doc, rewriter):
+    """Move base64 images still inlined in the page out to hashed files"""
+    files = set()
+    removed = [0]
+
+    def move(text):
+        if 'data:image/' not in text:
+            return None
+        before = len(text)
+        text, written = externalize_data_urls(text, assets_dir(doc))
+        files.update(written)
+        removed[0] += before - len(text)
+        return text
+
+    def report():
+        registry(doc).published.update(files)
+        print(f"Externalized {len(files)} inline images ({removed[0] / 1024:.0f} KB)")
+
+    for kind in stream.KINDS:
+        rewriter.on(kind, move)
+    rewriter.after(report)
@@ -0,0 +1,238 @@
+"""
+Responsive variant generation.
+
+Every asset has a master in webp/. This stage derives whatever the
+variant tree is missing from it with Pillow:
+
+    thumbnails/<w>/<name>-<w>w.webp / .png   64, 128, 256, 512
+    webp-mobile/<name>_400w.webp
+    webp-medium/<name>_800w.webp
+    avif/<name>.avif                          full size
+    lqip/<name>-blur.webp                     20 px wide placeholder
+
+and rewrites manifest/image-dimensions.json and the srcsets in
+manifest/srcset-config.json to match the files on disk. Assets are
+processed on a process pool. A record per asset under
+.aether-cache/variants keeps the master's hash, so unchanged masters are
+skipped and the files derived from a changed master are derived again.
+
+Pillow is optional: without it the stage only reports what is missing.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aether.assetcache import CACHE_DIR, data_urls, write_atomic
+from aether.assets import ASSET_ROOT, VARIANTS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_WIDTHS = (64, 128, 256, 512)
+LQIP_WIDTH = 20
+
+# Pillow save() arguments per output format
+ENCODERS = {
+    'WEBP': {'quality': 80, 'method': 6},
+    'AVIF': {'quality': 60},
+    'PNG': {'optimize': True},
+}
+
+DIMENSIONS_FILE = os.path.join("manifest", "image-dimensions.json")
+SRCSET_FILE = os.path.join("manifest", "srcset-config.json")
+
+def master_path(name, root=ASSET_ROOT):
+    directory, template = VARIANTS['full']
+    return os.path.join(root, directory, template.format(name=name))
+
+def targets(name, width):
+    """[(path relative to the asset root, width or None for full size, format)]"""
+    result = []
+    for w in THUMBNAIL_WIDTHS:
+        if w < width:
+            result.append((f"thumbnails/{w}/{name}-{w}w.webp", w, 'WEBP'))
+            result.append((f"thumbnails/{w}/{name}-{w}w.png", w, 'PNG'))
+    for variant, w in (('mobile', 400), ('medium', 800)):
+        if w < width:
+            directory, template = VARIANTS[variant]
+            result.append((f"{directory}/{template.format(name=name)}", w, 'WEBP'))
+    directory, template = VARIANTS['avif']
+    result.append((f"{directory}/{template.format(name=name)}", None, 'AVIF'))
+    directory, template = VARIANTS['lqip']
+    result.append((f"{directory}/{template.format(name=name)}", LQIP_WIDTH, 'WEBP'))
+    return result
+
+def derive(master, root, outputs):
+    """Worker: write each (relative path, width, format) from master"""
+    with Image.open(master) as image:
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    for rel, width, fmt in outputs:
+        if width is None:
+            resized = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        resized.save(tmp, fmt, **ENCODERS[fmt])
+        os.replace(tmp, path)
+    return [rel for rel, _, _ in outputs]
+
+def sized_variant(master, width, cache_dir=CACHE_DIR):
+    """
+    master resized to exactly width px, derived once per master hash into
+    .aether-cache/sized. None without Pillow or if master is not wider.
+    """
+    if Image is None:
+        return None
+    name = os.path.splitext(os.path.basename(master))[0]
+    sha = data_urls().content_hash(master)
+    directory = os.path.join(cache_dir, "sized")
+    filename = f"{name}.{sha[:12]}_{width}w.webp"
+    if not os.path.exists(os.path.join(directory, filename)):
+        with Image.open(master) as image:
+            if image.width <= width:
+                return None
+        derive(master, directory, [(filename, width, 'WEBP')])
+    return os.path.join(directory, filename)
+
+def aspect_ratio(width, height):
+    # Truncated to 3 places, as in the original manifest
+    return f"{int(width / height * 1000) / 1000:.3f}"
+
+def write_dimensions(path, dimensions):
+    """image-dimensions.json, one asset per line"""
+    lines = [
+        f'  "{name}": {{"width": {w}, "height": {h}, "aspectRatio": {aspect_ratio(w, h)}}}'
+        for name, (w, h) in sorted(dimensions.items())
+    ]
+    write_atomic(path, "{\n" + ",\n".join(lines) + "\n}\n")
+
+def srcset(root, entries):
+    return ", ".join(f"{rel} {w}w" for rel, w in entries if os.path.exists(os.path.join(root, rel)))
+
+def update_srcsets(config, root, name, width):
+    """Point an asset's srcsets at the files that exist, with true widths"""
+    entry = config.setdefault('assets', {}).setdefault(name, {})
+    webp = [(f"thumbnails/{w}/{name}-{w}w.webp", w) for w in THUMBNAIL_WIDTHS if w < width]
+    for variant, w in (('mobile', 400), ('medium', 800)):
+        if w < width:
+            directory, template = VARIANTS[variant]
+            webp.append((f"{directory}/{template.format(name=name)}", w))
+    directory, template = VARIANTS['full']
+    webp.append((f"{directory}/{template.format(name=name)}", width))
+    webp.sort(key=lambda entry: entry[1])
+
+    png = [(f"thumbnails/{w}/{name}-{w}w.png", w) for w in THUMBNAIL_WIDTHS if w < width]
+    directory, template = VARIANTS['png']
+    png.append((f"{directory}/{template.format(name=name)}", width))
+
+    entry['srcset'] = {'webp': srcset(root, webp), 'png': srcset(root, png)}
+    entry.setdefault('sizes', "(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw")
+    entry.setdefault('fallback', f"{directory}/{template.format(name=name)}")
+
+class VariantRecords:
+    """Per-master record of its hash and the files derived from it"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.directory = os.path.join(cache_dir, "variants")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, master):
+        key = hashlib.sha1(os.path.abspath(master).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, master):
+        try:
+            with open(self.path(master), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'master': None, 'derived': []}
+
+    def put(self, master, master_sha, derived):
+        record = {'master': master_sha, 'derived': sorted(derived)}
+        write_atomic(self.path(master), json.dumps(record, indent=1))
+
+def plan(names, root, records):
+    """{name: (master sha, [targets to derive])}, sizes {name: (w, h)}"""
+    work, sizes = {}, {}
+    for name in names:
+        master = master_path(name, root)
+        with Image.open(master) as image:
+            sizes[name] = image.size
+        sha = data_urls().content_hash(master)
+        record = records.get(master)
+        stale = set(record['derived']) if record['master'] != sha else set()
+        todo = [t for t in targets(name, sizes[name][0])
+                if t[0] in stale or not os.path.exists(os.path.join(root, t[0]))]
+        work[name] = (sha, todo)
+    return work, sizes
+
+def missing_variants(names, root=ASSET_ROOT):
+    """[relative path] of every target file that does not exist"""
+    missing = []
+    for name in names:
+        # Without Pillow the master's width is unknown; every width applies
+        for rel, _, _ in targets(name, float('inf')):
+            if not os.path.exists(os.path.join(root, rel)):
+                missing.append(rel)
+    return missing
+
+def generate(names, root=ASSET_ROOT, jobs=None, cache_dir=CACHE_DIR):
+    """Derive missing variants for names and refresh the manifests"""
+    if Image is None:
+        missing = missing_variants(names, root)
+        print(f"Skipped: Pillow is not installed ({len(missing)} variant files missing)")
+        return []
+
+    start = time.perf_counter()
+    records = VariantRecords(cache_dir)
+    work, sizes = plan(names, root, records)
+    pending = {name: todo for name, (_, todo) in work.items() if todo}
+    print(f"{len(names)} assets, {len(pending)} need variants "
+          f"({sum(len(todo) for todo in pending.values())} files)")
+
+    written = []
+    results = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {name: pool.submit(derive, master_path(name, root), root, todo)
+                       for name, todo in pending.items()}
+            for name, future in futures.items():
+                results[name] = future.result()
+                written.extend(results[name])
+                print(f"  {name}: {len(results[name])} files")
+
+    for name, (sha, _) in work.items():
+        master = master_path(name, root)
+        record = records.get(master)
+        if record['master'] == sha and name not in results:
+            continue
+        derived = set(record['derived']) if record['master'] == sha else set()
+        derived.update(results.get(name, ()))
+        records.put(master, sha, derived)
+
+    dimensions_path = os.path.join(root, DIMENSIONS_FILE)
+    with open(dimensions_path, 'r', encoding='utf-8') as f:
+        dimensions = {name: (d['width'], d['height']) for name, d in json.load(f).items()}
+    dimensions.update(sizes)
+    write_dimensions(dimensions_path, dimensions)
+
+    srcset_path = os.path.join(root, SRCSET_FILE)
+    with open(srcset_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    for name, (width, _) in sizes.items():
+        update_srcsets(config, root, name, width)
+    write_atomic(srcset_path, json.dumps(config, indent=2) + "\n")
+
+    print(f"Wrote {len(written)} variant files in {time.perf_counter() - start:.2f}s")
+    return written
@@ -533,13 +533,8 @@ ENHANCED_IMAGE_CSS = f'''
         }}
 '''
 
-def process_html():
-    """Process the v16 HTML file and create protected internal version"""
-
-    print(f"Reading {INPUT_FILE}...")
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        html = f.read()
-
+def protect(html):
+    """Add the access overlay, enlarged image CSS and internal titles"""
     # Find the position after <body> tag to insert password protection
     body_match = re.search(r'<body[^>]*>', html)
     if body_match:
@@ -566,6 +561,17 @@ def process_html():
         'INITIALIZING AETHER PXR v3.1 INTERNAL...'
     )
 
+    return html
+
+def process_html():
+    """Process the v16 HTML file and create protected internal version"""
+
+    print(f"Reading {INPUT_FILE}...")
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    html = protect(html)
+
     print(f"Writing {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         f.write(html)
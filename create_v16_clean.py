@@ -2,41 +2,35 @@
 """
 Create CLEAN v16 from v14 original with:
 1. 9 images per tab distributed throughout text
-2. Optimized medium-size images for inline use
+2. Each image sized to the box its slot renders at (see aether.slots)
 3. Full-size for galleries
 4. Enhanced mobile-responsive CSS
 5. Performance optimizations
 """
 
-import base64
 import os
 import re
+from functools import partial
+
+from aether.assets import AssetRegistry
+from aether.insertion import InsertionPlan
+from aether.slots import slot_for, target_width
 
-WEBP_DIR = "aether-website-assets/webp"
-WEBP_MEDIUM_DIR = "aether-website-assets/webp-medium"
 INPUT_FILE = "aether-matrix-v14-pxr-comprehensive.html"
 OUTPUT_FILE = "aether-matrix-v16-optimized.html"
 
-def load_base64(filepath):
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as f:
-            return f"data:image/webp;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-    return None
-
-def get_assets():
-    """Load all assets with full and medium variants"""
-    assets = {}
-    for f in os.listdir(WEBP_DIR):
-        if f.endswith('.webp'):
-            name = f.replace('.webp', '')
-            full_path = os.path.join(WEBP_DIR, f)
-            medium_path = os.path.join(WEBP_MEDIUM_DIR, f"{name}_800w.webp")
-
-            assets[name] = {
-                'full': load_base64(full_path),
-                'medium': load_base64(medium_path) if os.path.exists(medium_path) else load_base64(full_path)
-            }
-    return assets
+# Set to a directory (e.g. "assets") to write content-hashed image files
+# next to the page instead of inlining base64 data URLs
+ASSETS_DIR = None
+
+# Device pixel ratio embedded images are sized for. A single-file page can
+# only carry one size, so it is sized for 2x screens (1x ones scale it
+# down); external pages get srcsets from the picture step
+EMBED_DPR = 2
+
+def get_assets(publish_dir=ASSETS_DIR):
+    """Lazy registry: full and medium variants are loaded only when used"""
+    return AssetRegistry(publish_dir=publish_dir)
 
 # Enhanced CSS
 ENHANCED_CSS = '''
@@ -153,41 +147,40 @@ ENHANCED_CSS = '''
         }
 '''
 
-def make_inline_img(data_url, alt, caption, size="large"):
+def asset_attr(name):
+    """data-asset lets the placeholders step find the image's manifest entry"""
+    return f' data-asset="{name}"' if name else ""
+
+def make_inline_img(data_url, alt, caption, size="large", name=None):
     cap = f'<div class="v16-caption">{caption}</div>' if caption else ""
     return f'''
 <div class="v16-image v16-{size}">
-    <img src="{data_url}" alt="{alt}" loading="lazy">
+    <img src="{data_url}" alt="{alt}" loading="lazy" data-slot="{size}"{asset_attr(name)}>
     {cap}
 </div>
 '''
 
-def make_float_img(data_url, alt, caption, direction="right"):
+def make_float_img(data_url, alt, caption, direction="right", name=None):
     cap = f'<div class="v16-caption">{caption}</div>' if caption else ""
     return f'''
 <div class="v16-float v16-float-{direction}">
-    <img src="{data_url}" alt="{alt}" loading="lazy">
+    <img src="{data_url}" alt="{alt}" loading="lazy" data-slot="float"{asset_attr(name)}>
     {cap}
 </div>
 '''
 
-def insert_after(html, search, img_html, nth=1):
-    """Insert image after nth occurrence of search text"""
-    pattern = re.escape(search)
-    matches = list(re.finditer(pattern, html, re.IGNORECASE))
-
-    if len(matches) >= nth:
-        pos = matches[nth-1].end()
-        # Find next closing tag
-        for tag in ['</p>', '</div>', '</li>', '</h2>', '</h3>', '</span>']:
-            idx = html.find(tag, pos)
-            if idx != -1 and idx < pos + 600:
-                insert_at = idx + len(tag)
-                return html[:insert_at] + '\n' + img_html + '\n' + html[insert_at:]
-    return html
+def make_slot_img(assets, name, caption, size, pos, dpr=EMBED_DPR):
+    """Image block for one insertion-table row, or None if the asset is missing"""
+    # Smallest variant that covers the slot's widest rendered box at dpr
+    data = assets.sized_src(name, target_width(slot_for(size, pos), dpr))
+    if not data:
+        return None
+    if pos in ["left", "right"]:
+        return make_float_img(data, caption, caption, pos, name)
+    return make_inline_img(data, caption, caption, size, name)
 
 def replace_pictures(html, assets):
-    """Replace <picture> elements with embedded base64 img tags"""
+    """Replace <picture> elements with single embedded (or hashed-file) img tags"""
     def replacer(match):
         full = match.group(0)
         png_match = re.search(r'png-fallback/([^"]+)\.png', full)
@@ -196,12 +189,12 @@ def replace_pictures(html, assets):
             if name in assets and assets[name]['full']:
                 alt_match = re.search(r'alt="([^"]*)"', full)
                 alt = alt_match.group(1) if alt_match else name
-                return f'<img src="{assets[name]["full"]}" alt="{alt}" loading="lazy" style="width:100%; height:auto; min-height:240px; object-fit:cover; border-radius:10px;">'
+                return f'<img src="{assets[name]["full"]}" alt="{alt}" loading="lazy"{asset_attr(name)} style="width:100%; height:auto; min-height:240px; object-fit:cover; border-radius:10px;">'
         return full
 
     return re.sub(r'<picture>.*?</picture>', replacer, html, flags=re.DOTALL)
 
-def process(html, assets):
+def process(html, assets, dpr=EMBED_DPR):
     # Add CSS
     html = html.replace('</style>', ENHANCED_CSS + '\n    </style>', 1)
 
@@ -249,35 +242,35 @@ def process(html, assets):
 
     all_insertions = ethos + pathos + logos
 
+    # Resolve every anchor against the page as it is now and splice once;
+    # images are only loaded for anchors that were actually found
+    plan = InsertionPlan()
     for search, name, caption, size, pos in all_insertions:
         if name in assets:
-            # Use medium for floats, full for hero/center
-            use_full = (size == "hero") or (pos == "center")
-            data = assets[name]['full'] if use_full else assets[name]['medium']
-
-            if data:
-                if pos in ["left", "right"]:
-                    img = make_float_img(data, caption, caption, pos)
-                else:
-                    img = make_inline_img(data, caption, caption, size)
-                html = insert_after(html, search, img)
+            plan.add(search, partial(make_slot_img, assets, name, caption, size, pos, dpr))
 
+    html = plan.apply(html)
+    for search in plan.missing:
+        print(f"Warning: anchor not found: {search!r}")
     return html
 
+def create_v16(html, assets, dpr=EMBED_DPR):
+    """Apply the v16 image layout and bump the page title"""
+    html = process(html, assets, dpr)
+    return html.replace('v6.0 | December 2025', 'v6.2 | December 2025 | Optimized Edition')
+
 def main():
-    print("Loading assets...")
     assets = get_assets()
-    print(f"Loaded {len(assets)} assets")
+    print(f"Indexed {len(assets)} assets")
 
     print(f"Reading {INPUT_FILE}...")
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
         html = f.read()
 
     print("Processing...")
-    html = process(html, assets)
+    html = create_v16(html, assets)
 
-    # Update title
-    html = html.replace('v6.0 | December 2025', 'v6.2 | December 2025 | Optimized Edition')
+    print(f"Loaded {assets.loaded} asset variants")
 
     print(f"Writing {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
@@ -292,6 +285,9 @@ def main():
         c = f.read()
     print(f"\n=== Statistics ===")
     print(f"Total base64 images: {c.count('data:image/webp;base64')}")
+    if ASSETS_DIR:
+        external = c.count(f'src="{ASSETS_DIR}/')
+        print(f"External image references: {external}")
     print(f"Float images: {c.count('v16-float')}")
     print(f"Inline images: {c.count('v16-image v16-')}")
 
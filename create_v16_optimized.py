@@ -7,45 +7,26 @@ Create v16 optimized version with:
 4. More strategic image placements
 """
 
-import base64
 import os
-import re
+from functools import partial
+
+from aether.assets import AssetRegistry
+from aether.insertion import InsertionPlan
 
 # Paths
-WEBP_DIR = "aether-website-assets/webp"
-WEBP_MEDIUM_DIR = "aether-website-assets/webp-medium"
 INPUT_FILE = "aether-matrix-v15-pxr-embedded.html"
 OUTPUT_FILE = "aether-matrix-v16-optimized.html"
 
-def load_image_as_base64(filepath):
-    """Load an image file and return base64 data URL"""
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as f:
-            data = base64.b64encode(f.read()).decode('utf-8')
-        return f"data:image/webp;base64,{data}"
-    return None
-
-def get_optimized_asset(name, use_medium=True):
-    """Get asset, preferring medium size for inline images"""
-    if use_medium:
-        medium_path = os.path.join(WEBP_MEDIUM_DIR, f"{name}_800w.webp")
-        if os.path.exists(medium_path):
-            return load_image_as_base64(medium_path)
+# Set to a directory (e.g. "assets") to write content-hashed image files
+# next to the page instead of inlining base64 data URLs
+ASSETS_DIR = None
 
-    full_path = os.path.join(WEBP_DIR, f"{name}.webp")
-    return load_image_as_base64(full_path)
+# Closing tags that end an anchor's containing element
+CLOSE_TAGS = ('</p>', '</div>', '</li>', '</h2>', '</h3>')
 
 def get_all_assets():
-    """Get all assets"""
-    assets = {}
-    for f in os.listdir(WEBP_DIR):
-        if f.endswith('.webp'):
-            name = f.replace('.webp', '')
-            assets[name] = {
-                'full': load_image_as_base64(os.path.join(WEBP_DIR, f)),
-                'medium': get_optimized_asset(name, use_medium=True)
-            }
-    return assets
+    """Lazy registry: full and medium variants are loaded only when used"""
+    return AssetRegistry(publish_dir=ASSETS_DIR)
 
 def create_inline_image(data_url, alt, caption=None, style="large"):
     """Create an inline image HTML with enhanced styling"""
@@ -212,24 +193,16 @@ ENHANCED_CSS = '''
         }
 '''
 
-def insert_image_after_text(html, search_text, image_html, occurrence=1):
-    """Insert image HTML after finding specific text"""
-    pattern = re.escape(search_text)
-    matches = list(re.finditer(pattern, html, re.IGNORECASE))
-
-    if matches and len(matches) >= occurrence:
-        match = matches[occurrence - 1]
-        # Find end of containing element
-        end_pos = match.end()
-
-        # Look for closing tags
-        for end_tag in ['</p>', '</div>', '</li>', '</h2>', '</h3>']:
-            tag_pos = html.find(end_tag, end_pos)
-            if tag_pos != -1 and tag_pos < end_pos + 800:
-                insert_pos = tag_pos + len(end_tag)
-                return html[:insert_pos] + '\n' + image_html + '\n' + html[insert_pos:]
-
-    return html
+def make_row_image(assets, asset_name, caption, size, position):
+    """Image block for one insertion row, or None if the asset has no file"""
+    # Use medium size for floating images, full for hero/large center
+    use_full = (size == "hero" or (size == "large" and position == "center"))
+    data_url = assets[asset_name]['full'] if use_full else assets[asset_name]['medium']
+    if not data_url:
+        return None
+    if position in ["left", "right"]:
+        return create_float_image(data_url, caption, caption, position)
+    return create_inline_image(data_url, caption, caption, size)
 
 def process_html(html, assets):
     """Process HTML with optimized images"""
@@ -305,26 +278,21 @@ def process_html(html, assets):
 
     all_insertions = ethos_insertions + pathos_insertions + logos_insertions
 
+    # Resolve every anchor against the page as it is now and splice once;
+    # images are only loaded for anchors that were actually found
+    plan = InsertionPlan(close_tags=CLOSE_TAGS, window=800)
     for search_text, asset_name, caption, size, position in all_insertions:
         if asset_name in assets:
-            # Use medium size for floating images, full for hero/large center
-            use_full = (size == "hero" or (size == "large" and position == "center"))
-            data_url = assets[asset_name]['full'] if use_full else assets[asset_name]['medium']
-
-            if data_url:
-                if position in ["left", "right"]:
-                    img_html = create_float_image(data_url, caption, caption, position)
-                else:
-                    img_html = create_inline_image(data_url, caption, caption, size)
-
-                html = insert_image_after_text(html, search_text, img_html)
+            plan.add(search_text, partial(make_row_image, assets, asset_name, caption, size, position))
 
+    html = plan.apply(html)
+    for search_text in plan.missing:
+        print(f"Warning: anchor not found: {search_text!r}")
     return html
 
 def main():
-    print("Loading optimized assets...")
     assets = get_all_assets()
-    print(f"Loaded {len(assets)} assets with full and medium variants")
+    print(f"Indexed {len(assets)} assets with full and medium variants")
 
     print(f"Reading {INPUT_FILE}...")
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
@@ -4,9 +4,18 @@ Script to embed brand assets from brand_assets_base64.json into the HTML file.
 This replaces existing images with the proper brand assets.
 """
 
+import base64
 import json
+import os
 import re
 
+from aether.assetcache import mime_type, sniff_mime_type
+from aether.assets import EXTENSIONS, publish_bytes
+
+# Set to a directory (e.g. "assets") to write content-hashed image files
+# next to the page instead of inlining base64 data URLs
+ASSETS_DIR = None
+
 def load_brand_assets(json_path):
     """Load brand assets from JSON file."""
     with open(json_path, 'r') as f:
@@ -26,6 +35,18 @@ def create_data_url(base64_data, mime_type='image/png'):
     """Create a data URL from base64 data."""
     return f"data:{mime_type};base64,{base64_data}"
 
+def asset_src(asset_key, base64_data):
+    """Data URL, or the hashed file URL when ASSETS_DIR is set."""
+    data = base64.b64decode(base64_data)
+    # The bytes say what the asset is; the key's extension may be missing or wrong
+    mime = sniff_mime_type(data) or mime_type(asset_key)
+    if ASSETS_DIR:
+        name = os.path.splitext(asset_key)[0]
+        ext = EXTENSIONS.get(mime, os.path.splitext(asset_key)[1] or '.bin')
+        filename = publish_bytes(data, name, ext, ASSETS_DIR)
+        return f"{os.path.basename(os.path.normpath(ASSETS_DIR))}/{filename}"
+    return create_data_url(base64_data, mime)
+
 def embed_assets(html_content, assets):
     """
     Embed brand assets into HTML content.
@@ -142,7 +163,7 @@ def embed_assets(html_content, assets):
         # Also try pattern with src before alt
         pattern2 = rf'(<img[^>]*src=")([^"]+)("[^>]*alt="[^"]*{re.escape(alt_pattern)}[^"]*"[^>]*>)'
 
-        data_url = create_data_url(assets[asset_key])
+        data_url = asset_src(asset_key, assets[asset_key])
 
         # Try first pattern
         new_html, count1 = re.subn(pattern, rf'\1{data_url}\3', modified_html)
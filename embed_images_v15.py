@@ -6,32 +6,23 @@ Transform aether-matrix-v14 to v15 with:
 3. Larger image sizes
 """
 
-import base64
 import os
 import re
 
+from aether.assets import AssetRegistry
+from aether.insertion import InsertionPlan
+
 # Paths
-WEBP_DIR = "aether-website-assets/webp"
 INPUT_FILE = "aether-matrix-v14-pxr-comprehensive.html"
 OUTPUT_FILE = "aether-matrix-v15-pxr-embedded.html"
 
-def load_webp_as_base64(filename):
-    """Load a webp file and return base64 data URL"""
-    filepath = os.path.join(WEBP_DIR, filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as f:
-            data = base64.b64encode(f.read()).decode('utf-8')
-        return f"data:image/webp;base64,{data}"
-    return None
+# Set to a directory (e.g. "assets") to write content-hashed image files
+# next to the page instead of inlining base64 data URLs
+ASSETS_DIR = None
 
 def get_all_assets():
-    """Get all webp assets organized by category"""
-    assets = {}
-    for f in os.listdir(WEBP_DIR):
-        if f.endswith('.webp'):
-            name = f.replace('.webp', '')
-            assets[name] = load_webp_as_base64(f)
-    return assets
+    """Lazy name -> full-size image src mapping; files load on first use"""
+    return AssetRegistry(publish_dir=ASSETS_DIR).variant('full')
 
 def create_inline_image(data_url, alt, caption=None, style="large"):
     """Create an inline image HTML with enhanced styling"""
@@ -163,21 +154,9 @@ def process_html(html, assets):
         ("BRANDAsset-PhygitalIP-Port51Confectionarium", "Port 51", "Port 51 Confectionarium", "medium"),
     ]
 
-    # Helper to insert image after a specific text pattern
-    def insert_after_pattern(html, pattern, image_html, count=1):
-        matches = list(re.finditer(pattern, html, re.IGNORECASE))
-        if matches and len(matches) >= count:
-            match = matches[count - 1]
-            # Find the end of the paragraph or div
-            end_pos = match.end()
-            # Look for </p> or </div>
-            next_close = html.find('</p>', end_pos)
-            if next_close == -1 or next_close > end_pos + 500:
-                next_close = html.find('</div>', end_pos)
-            if next_close != -1 and next_close < end_pos + 500:
-                insert_pos = next_close + 4 if html[next_close:next_close+4] == '</p>' else next_close + 6
-                html = html[:insert_pos] + '\n' + image_html + '\n' + html[insert_pos:]
-        return html
+    # Anchors are resolved against the page as it is now and spliced once
+    # at the end; </p> wins over </div> when both close within 500 chars
+    plan = InsertionPlan(close_tags=('</p>', '</div>'), window=500)
 
     # ETHOS TAB insertions (after "ETHOS" section starts around line 4528)
     # Insert after key paragraphs
@@ -185,146 +164,148 @@ def process_html(html, assets):
     # After "The AETHER Identity" or first major section
     if "aether-brand-logo-main" in assets and assets["aether-brand-logo-main"]:
         pattern = r'<h1>Chapter 1: Leadership Team'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_inline_image(assets["aether-brand-logo-main"], "AETHER Brand Logo", "The AETHER Brand Identity", "hero"))
 
     # After CTCH intro paragraph
     if "aether-team-founder-ctch" in assets and assets["aether-team-founder-ctch"]:
         pattern = r'Christian Charles-Harris.*?Founder.*?CEO'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-team-founder-ctch"], "Christian Charles-Harris", "Christian Charles-Harris - Founder", "right"))
 
     # After entrepreneurial achievements
     if "BRANDwork-ProjectionMapping-CircuitNeuron" in assets and assets["BRANDwork-ProjectionMapping-CircuitNeuron"]:
         pattern = r'entrepreneurial achievements'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-CircuitNeuron"], "Neural Technology", "Circuit Neuron Mapping", "left"))
 
     # After Sha Xin Wei section
     if "aether-team-cofounder-shaxinwei" in assets and assets["aether-team-cofounder-shaxinwei"]:
         pattern = r'Dr\. Sha Xin Wei.*?Co-Founder'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-team-cofounder-shaxinwei"], "Dr. Sha Xin Wei", "Dr. Sha Xin Wei - Co-Founder & CTO", "right"))
 
     # After Vangelis section
     if "aether-team-cofounder-vangelis" in assets and assets["aether-team-cofounder-vangelis"]:
         pattern = r'Dr\. Vangelis Lympouridis.*?Innovative'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-team-cofounder-vangelis"], "Dr. Vangelis Lympouridis", "Dr. Vangelis Lympouridis - Co-Founder & CSO", "right"))
 
     # Add projection mapping tech image
     if "BRANDwork-ProjectionMapping-CosmicEye" in assets and assets["BRANDwork-ProjectionMapping-CosmicEye"]:
         pattern = r'RelieVRx Breakthrough'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-CosmicEye"], "Cosmic Eye", "Cosmic Eye Projection Technology", "left"))
 
     # Strategic advisors section
     if "BRANDwork-ProjectionMapping-GridMatrix" in assets and assets["BRANDwork-ProjectionMapping-GridMatrix"]:
         pattern = r'Strategic Advisors'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-GridMatrix"], "Grid Matrix", "Grid Matrix Technology", "left"))
 
     # PATHOS TAB insertions
     # After origin story
     if "aether-portfolio-enchant-lights-01" in assets and assets["aether-portfolio-enchant-lights-01"]:
         pattern = r'The Origin Story'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_inline_image(assets["aether-portfolio-enchant-lights-01"], "Enchant Lights", "Enchant Christmas - Immersive Light Experience", "hero"))
 
     # After "My journey begins here"
     if "aether-portfolio-enchant-daytime" in assets and assets["aether-portfolio-enchant-daytime"]:
         pattern = r'My journey begins here'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-portfolio-enchant-daytime"], "Enchant Daytime", "Enchant Daytime Experience", "right"))
 
     # After Memory and Alchemy section
     if "BRANDwork-EnchantSite-Collage2" in assets and assets["BRANDwork-EnchantSite-Collage2"]:
         pattern = r'Memory, Alchemy, and the Cult'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-EnchantSite-Collage2"], "Experience Collage", "Immersive Experience Moments", "left"))
 
     # After theatrical production mention
     if "aether-portfolio-killmove-01" in assets and assets["aether-portfolio-killmove-01"]:
         pattern = r'theatrical enchantment'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-portfolio-killmove-01"], "Kill Move Paradise", "Kill Move Paradise Production", "right"))
 
     # Ghost projection after stage design mention
     if "BRANDwork-StageProduction-GhostProjection" in assets and assets["BRANDwork-StageProduction-GhostProjection"]:
         pattern = r'cirque audacity'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-StageProduction-GhostProjection"], "Ghost Projection", "Ghost Projection Effect", "left"))
 
     # LOGOS TAB insertions
     # After Tales of Lucidia header
     if "aether-ip-tales-of-lucidia" in assets and assets["aether-ip-tales-of-lucidia"]:
         pattern = r'Tales of Lucidia: Transmedia Franchise'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_inline_image(assets["aether-ip-tales-of-lucidia"], "Tales of Lucidia", "Tales of Lucidia - Warrior Princess IP", "hero"))
 
     # After Warrior Princess intro
     if "BRANDAsset-WarriorPrincess-CharacterConcept" in assets and assets["BRANDAsset-WarriorPrincess-CharacterConcept"]:
         pattern = r'Three Warrior Princesses'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDAsset-WarriorPrincess-CharacterConcept"], "Warrior Princess", "Warrior Princess Character Concept", "right"))
 
     # MaryJane Mainframe
     if "aether-ip-maryjane-mainframe" in assets and assets["aether-ip-maryjane-mainframe"]:
         pattern = r'Ozma.*?Strategic Leader'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-ip-maryjane-mainframe"], "MaryJane Mainframe", "MaryJane Mainframe IP", "left"))
 
     # Warrior Princess Render after Alice
     if "BRANDAsset-WarriorPrincess-Render51" in assets and assets["BRANDAsset-WarriorPrincess-Render51"]:
         pattern = r'Alice.*?Tactical Innovator'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDAsset-WarriorPrincess-Render51"], "Warrior Princess", "Warrior Princess 3D Render", "right"))
 
     # Metamorphasis after Polychrome
     if "aether-ip-metamorphasis-apothecary" in assets and assets["aether-ip-metamorphasis-apothecary"]:
         pattern = r'Polychrome.*?Creative Force'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["aether-ip-metamorphasis-apothecary"], "Metamorphasis Apothecary", "Metamorphasis Environment", "left"))
 
     # Emerald crystals after shared mission
     if "BRANDwork-WarriorPrincessOz-EmeraldCrystals" in assets and assets["BRANDwork-WarriorPrincessOz-EmeraldCrystals"]:
         pattern = r'Shared Mission'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_inline_image(assets["BRANDwork-WarriorPrincessOz-EmeraldCrystals"], "Emerald Crystals", "Emerald Crystals Environment", "large"))
 
     # Phygital IP images
     if "BRANDAsset-PhygitalIP-BroussardBayouBBQ" in assets and assets["BRANDAsset-PhygitalIP-BroussardBayouBBQ"]:
         pattern = r'Creator Tools.*?Democratization'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDAsset-PhygitalIP-BroussardBayouBBQ"], "Broussard Bayou", "Broussard Bayou BBQ Brand", "right"))
 
     if "BRANDwork-WarriorPrincessOz-ArenaLayout" in assets and assets["BRANDwork-WarriorPrincessOz-ArenaLayout"]:
         pattern = r'Measurable Impact.*?ROI'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-WarriorPrincessOz-ArenaLayout"], "Arena Layout", "Arena Experience Layout", "left"))
 
     # Additional inline images in key sections
     if "BRANDwork-ProjectionMapping-OceanForge" in assets and assets["BRANDwork-ProjectionMapping-OceanForge"]:
         pattern = r'Phygital Hospitality Revolution'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-OceanForge"], "Ocean Forge", "Ocean Forge Immersive", "left"))
 
     if "BRANDwork-ProjectionMapping-Vintage" in assets and assets["BRANDwork-ProjectionMapping-Vintage"]:
         pattern = r'The Complete Advisory Board'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-Vintage"], "Vintage Aesthetic", "Vintage Aesthetic Projection", "right"))
 
     if "BRANDwork-ProjectionMapping-SciFi" in assets and assets["BRANDwork-ProjectionMapping-SciFi"]:
         pattern = r'Integration of Digital and Physical'
-        html = insert_after_pattern(html, pattern,
+        plan.add_pattern(pattern,
             create_float_image(assets["BRANDwork-ProjectionMapping-SciFi"], "Sci-Fi Environment", "Sci-Fi Environment Design", "right"))
 
+    html = plan.apply(html)
+    for pattern in plan.missing:
+        print(f"Warning: anchor not found: {pattern!r}")
     return html
 
 def main():
-    print("Loading webp assets...")
     assets = get_all_assets()
-    print(f"Loaded {len(assets)} assets")
+    print(f"Indexed {len(assets)} assets")
 
     print(f"Reading {INPUT_FILE}...")
     with open(INPUT_FILE, 'r', encoding='utf-8') as f:
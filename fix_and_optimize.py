@@ -8,10 +8,18 @@ Fix errors and optimize for mobile/desktop:
 5. Add touch device optimizations
 6. Fix window positioning for all screen sizes
 7. Improve performance
+
+The fixes run as handlers on aether.stream events, so the page is
+rewritten in one streaming pass.
 """
 
+import io
+import os
 import re
 
+from aether.css import consolidate
+from aether.stream import is_end_tag, read_chunks, rewrite_file, rewrite_text, tag_name
+
 INPUT_FILE = "aether-internal-protected.html"
 OUTPUT_FILE = "aether-internal-protected.html"
 
@@ -544,8 +552,22 @@ OPTIMIZATION_CSS = '''
         }
 '''
 
-def fix_css_errors(html):
-    """Fix CSS syntax errors"""
+ORPHAN_RE = re.compile(r'[-\w]+\s*:[^{}]*;$')
+
+def drop_orphaned_lines(lines):
+    """Skip CSS properties and closing braces left outside any selector"""
+    depth = 0
+    for line in lines:
+        stripped = line.strip()
+        if depth == 0 and (stripped == '}' or ORPHAN_RE.match(stripped)):
+            # This is orphaned - skip it
+            continue
+        code = re.sub(r'/\*.*?\*/', '', line)
+        depth = max(depth + code.count('{') - code.count('}'), 0)
+        yield line
+
+def fix_css_errors(css):
+    """Fix CSS syntax errors in one stylesheet"""
     # Fix the orphaned CSS code at lines 3146-3149
     # Pattern: closing brace followed by CSS properties outside any selector
     orphaned_pattern = r'(\.column-box p \{[^}]+\})\s*\n\s*(background:[^;]+;\s*box-shadow:[^;]+;\s*\}\s*\})'
@@ -553,104 +575,87 @@ def fix_css_errors(html):
     def fix_orphaned(match):
         return match.group(1) + '\n'
 
-    html = re.sub(orphaned_pattern, fix_orphaned, html, flags=re.DOTALL)
+    css = re.sub(orphaned_pattern, fix_orphaned, css, flags=re.DOTALL)
 
     # Alternative fix if pattern doesn't match - remove orphaned lines directly
-    lines = html.split('\n')
-    fixed_lines = []
-    skip_next = 0
-
-    for i, line in enumerate(lines):
-        if skip_next > 0:
-            skip_next -= 1
-            continue
-
-        stripped = line.strip()
-        # Check for orphaned CSS (properties without selector)
-        if stripped.startswith('background:') and i > 0:
-            prev_stripped = lines[i-1].strip() if i > 0 else ''
-            if prev_stripped == '}' or prev_stripped.endswith('}'):
-                # This is orphaned - skip it
-                continue
-        elif stripped == '}' and i > 0:
-            prev_stripped = lines[i-1].strip() if i > 0 else ''
-            if prev_stripped.startswith('box-shadow:'):
-                continue
-
-        fixed_lines.append(line)
-
-    return '\n'.join(fixed_lines)
-
-def add_optimization_css(html):
-    """Add comprehensive optimization CSS before </style>"""
-    # Find the last </style> before </head>
-    head_end = html.find('</head>')
-    if head_end == -1:
-        return html
-
-    # Find the last </style> before </head>
-    last_style_end = html.rfind('</style>', 0, head_end)
-    if last_style_end == -1:
-        return html
-
-    # Insert optimization CSS before this </style>
-    html = html[:last_style_end] + '\n' + OPTIMIZATION_CSS + '\n    ' + html[last_style_end:]
-
-    return html
-
-def fix_duplicate_media_queries(html):
-    """Remove duplicate media query content"""
-    # This is a simplified approach - consolidate obvious duplicates
-    # The CSS will cascade properly, but this removes exact duplicates
-
-    # Remove duplicate .believe-footer rules
-    html = re.sub(
-        r'(@media \(max-width: 768px\) \{\s*\.believe-footer \{[^}]+\}\s*\.believe-footer img \{[^}]+\}\s*\})\s*(?=\s*</style>)',
-        '',
-        html
-    )
-
-    return html
-
-def add_meta_viewport_fix(html):
+    return ''.join(drop_orphaned_lines(io.StringIO(css)))
+
+def add_optimization_css(events):
+    """Add comprehensive optimization CSS before the last </style> in <head>"""
+    events = iter(events)
+    # Events from a </style> in <head> on, until it is known to be the last
+    held = None
+
+    for kind, text in events:
+        name = tag_name(text) if kind == 'tag' and is_end_tag(text) else None
+        if name == 'head':
+            if held:
+                held[0] = (held[0][0], '\n' + OPTIMIZATION_CSS + '\n    ' + held[0][1])
+                yield from held
+            yield kind, text
+            # Nothing after </head> changes
+            yield from events
+            return
+        if name == 'style':
+            if held:
+                yield from held
+            held = [(kind, text)]
+        elif held is not None:
+            held.append((kind, text))
+        else:
+            yield kind, text
+
+    if held:
+        yield from held
+
+def fix_duplicate_media_queries(css):
+    """Merge duplicate rules and media queries into one block each"""
+    merged = consolidate(css)
+    # Minified CSS would only be spread out
+    return merged if len(merged) < len(css) else None
+
+def add_meta_viewport_fix(tag):
     """Ensure proper viewport meta tag"""
     viewport_pattern = r'<meta name="viewport"[^>]*>'
     optimal_viewport = '<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=5.0, user-scalable=yes">'
 
-    html = re.sub(viewport_pattern, optimal_viewport, html)
-    return html
+    return re.sub(viewport_pattern, optimal_viewport, tag)
 
-def main():
-    print(f"Reading {INPUT_FILE}...")
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        html = f.read()
+def update_version(text):
+    """Update version indicator"""
+    text = text.replace('v6.3 | December 2025 | Protected Edition',
+                        'v6.4 | December 2025 | Optimized Edition')
 
-    original_size = len(html)
+    return text.replace('AETHER PXR v3.1 INTERNAL',
+                        'AETHER PXR v3.2 OPTIMIZED')
 
+def subscribe(rewriter):
+    """Register every fix and optimization with a streaming rewriter"""
     print("Fixing CSS syntax errors...")
-    html = fix_css_errors(html)
-
-    print("Adding comprehensive mobile/desktop optimization CSS...")
-    html = add_optimization_css(html)
+    rewriter.on('style', fix_css_errors)
 
     print("Fixing duplicate media queries...")
-    html = fix_duplicate_media_queries(html)
+    rewriter.on('style', fix_duplicate_media_queries)
+
+    print("Adding comprehensive mobile/desktop optimization CSS...")
+    rewriter.filter(add_optimization_css)
 
     print("Fixing viewport meta tag...")
-    html = add_meta_viewport_fix(html)
+    rewriter.on('tag', add_meta_viewport_fix)
 
-    # Update version indicator
-    html = html.replace('v6.3 | December 2025 | Protected Edition',
-                        'v6.4 | December 2025 | Optimized Edition')
+    rewriter.on('text', update_version)
 
-    html = html.replace('AETHER PXR v3.1 INTERNAL',
-                        'AETHER PXR v3.2 OPTIMIZED')
+def optimize(html):
+    """Run every fix and optimization over a page held in memory"""
+    return rewrite_text(html, subscribe)
+
+def main():
+    original_size = os.path.getsize(INPUT_FILE)
 
-    print(f"Writing {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(html)
+    # The page is streamed through the rewriter, never read whole
+    print(f"Rewriting {INPUT_FILE} -> {OUTPUT_FILE}...")
+    rewrite_file(INPUT_FILE, OUTPUT_FILE, subscribe)
 
-    import os
     new_size = os.path.getsize(OUTPUT_FILE)
 
     print(f"\nOptimization complete!")
@@ -659,7 +664,7 @@ def main():
     print(f"Changes: +{(new_size - original_size) / 1024:.1f} KB (optimization CSS)")
 
     # Count media queries
-    media_count = html.count('@media')
+    media_count = sum(chunk.count('@media') for chunk in read_chunks(OUTPUT_FILE))
     print(f"Media queries: {media_count}")
 
 if __name__ == "__main__":
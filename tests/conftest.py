@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aether import assetcache  # noqa: E402
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory with its own .aether-cache"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(assetcache, '_default', None)
+    return tmp_path
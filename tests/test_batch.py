@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from aether import batch, pipeline
+
+@pipeline.transform("test-crash")
+def crash(doc):
+    """Kills the worker process building the page"""
+    os._exit(1)
+
+def test_dead_worker_is_reported_as_page_failure(workdir, capsys):
+    page = workdir / "page.html"
+    page.write_text("<html><body></body></html>", encoding='utf-8')
+    pages = [{'input': str(page), 'output': str(workdir / "build" / "page.html"),
+              'steps': ["test-crash"], 'options': {}}]
+    with pytest.raises(batch.PageBuildError) as error:
+        batch.build_all(pages, jobs=1, incremental=False)
+    assert error.value.page is pages[0]
+    assert str(error.value).startswith(f"{page}: BrokenProcessPool")
+    assert f"FAILED {page}" in capsys.readouterr().out
@@ -0,0 +1,17 @@
+from conftest import ROOT
+
+import create_v16_optimized
+from aether.assets import AssetRegistry
+
+def test_only_matched_rows_load_assets(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    assets = AssetRegistry()
+    html = create_v16_optimized.process_html("<html><style></style><p>Nothing here</p></html>", assets)
+    assert assets.loaded == 0
+    assert 'content-image' not in html.split('</style>')[1]
+
+    assets = AssetRegistry()
+    html = create_v16_optimized.process_html(
+        "<html><style></style><h2>Chapter 1: Leadership Team</h2></html>", assets)
+    assert assets.loaded == 1
+    assert html.count('data:image/webp;base64,') == 1
@@ -0,0 +1,42 @@
+from aether import critical, css, stream
+
+STYLESHEET = '''
+        body { margin: 0; }
+        .window { display: none; }
+        .note { color: gray; }
+        .start { color: white; }
+        .taskbar { background: black; }
+        .window .start { color: red; }
+        @media print { .taskbar { display: none; } }
+'''
+
+PAGE = f'''<html><head><style>{STYLESHEET}</style></head><body>
+<div class="taskbar"><button class="start">Start</button></div>
+<div class="window" id="window-notes"><p class="note start">Notes</p></div>
+</body></html>'''
+
+def rules(stylesheet):
+    return [(item.conditions, item.selector) for item in css.parse(stylesheet)]
+
+def test_split_keeps_the_cascade():
+    scan = critical.PageScan(stream.tokenize([PAGE]))
+    assert scan.movable and scan.body_end
+    inline, deferred, count = critical.split(''.join(scan.texts), scan.fold)
+
+    # Taskbar rules, globals and rules that hide closed windows block first paint
+    assert rules(inline) == [((), 'body'), ((), '.window'), ((), '.start'), ((), '.taskbar')]
+    assert count == 4
+    # .start also matches <p class="note start"> outside the taskbar: inlined ahead of .note,
+    # it would lose to it, so it is repeated after .note in the deferred sheet. .taskbar
+    # only matches inside the taskbar and is not repeated
+    assert rules(deferred) == [((), '.note'), ((), '.start'), ((), '.window .start'),
+                               (('@media print',), '.taskbar')]
+
+def test_critical_styles_rewrite():
+    scan = critical.PageScan(stream.tokenize([PAGE]))
+    inline, deferred, _ = critical.split(''.join(scan.texts), scan.fold)
+    html = stream.rewrite_text(PAGE, critical.CriticalStyles(scan.run, inline, deferred).subscribe)
+    head, body = html.split('</head>')
+    assert '.note' not in head and '.taskbar' in head
+    assert body.index('<style>') > body.index('window-notes')
+    assert body.rstrip().endswith('</style>\n</body></html>')
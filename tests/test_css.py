@@ -0,0 +1,75 @@
+from aether import css
+
+MEDIA = ('@media (max-width: 600px)',)
+
+def items(stylesheet, stats=None):
+    """(conditions, selector, declarations) of the consolidated stylesheet"""
+    return [(item.conditions, item.selector, [tuple(d) for d in item.declarations])
+            for item in css.parse(css.consolidate(stylesheet, stats))]
+
+def test_same_selector_rules_merge():
+    stats = css.Stats()
+    assert items('.a { color: red; } .b { margin: 0; } .a { padding: 0; }', stats) == [
+        ((), '.b', [('margin', '0', False)]),
+        ((), '.a', [('color', 'red', False), ('padding', '0', False)]),
+    ]
+    assert stats.merged == 1
+
+def test_intervening_conflict_blocks_merge():
+    # .b sets margin and color between the two .a rules: neither .a can move past it
+    assert items('.a { color: red; margin: 0; } .b { color: blue; margin: 1px; } '
+                 '.a { color: green; padding: 0; }') == [
+        ((), '.a', [('margin', '0', False)]),
+        ((), '.b', [('color', 'blue', False), ('margin', '1px', False)]),
+        ((), '.a', [('color', 'green', False), ('padding', '0', False)]),
+    ]
+
+def test_shorthand_conflicts_with_longhand():
+    assert items('.a { margin-top: 0; } .b { margin: 1px; } .a { margin-top: 2px; }') == [
+        ((), '.b', [('margin', '1px', False)]),
+        ((), '.a', [('margin-top', '2px', False)]),
+    ]
+
+def test_important_wins_over_later():
+    assert items('.a { color: red !important; } .a { color: blue; margin: 1px; }') == [
+        ((), '.a', [('color', 'red', True), ('margin', '1px', False)]),
+    ]
+
+def test_media_blocks_and_source_order():
+    stats = css.Stats()
+    result = items('''
+        .a { color: red; }
+        @media (max-width: 600px) { .b { color: blue; } }
+        .b { color: green; }
+        @media (max-width: 600px) { .c { padding: 0; } .b { margin: 0; } .a { color: black; } }
+    ''', stats)
+    # .c and the .b margin move back into the first media block; the .a color cannot
+    # move back past the .b color, which an element with both classes would then get
+    assert result == [
+        ((), '.a', [('color', 'red', False)]),
+        (MEDIA, '.b', [('color', 'blue', False), ('margin', '0', False)]),
+        (MEDIA, '.c', [('padding', '0', False)]),
+        ((), '.b', [('color', 'green', False)]),
+        (MEDIA, '.a', [('color', 'black', False)]),
+    ]
+    assert (stats.media_before, stats.media_after) == (2, 2)
+    assert stats.merged == 1
+
+def test_media_rule_stays_after_conflicting_rule():
+    result = items('''
+        @media (max-width: 600px) { .b { color: blue; } }
+        .a { color: red; }
+        @media (max-width: 600px) { .a { color: black; } }
+    ''')
+    assert result == [
+        (MEDIA, '.b', [('color', 'blue', False)]),
+        ((), '.a', [('color', 'red', False)]),
+        (MEDIA, '.a', [('color', 'black', False)]),
+    ]
+
+def test_disjoint_selectors_do_not_block():
+    # No element is both a <p> and a <div>: the color of div cannot be overridden
+    assert items('p { color: red; } div { color: blue; } p { margin: 0; }') == [
+        ((), 'div', [('color', 'blue', False)]),
+        ((), 'p', [('color', 'red', False), ('margin', '0', False)]),
+    ]
@@ -0,0 +1,22 @@
+from aether import defer, prune, stream
+
+PAGE = '''<html><body>
+<div class="window" id="window-about"><div class="window-header">About</div>
+<div class="window-content"><div class="card">About us</div></div></div>
+<div class="window" id="window-team"><div class="window-header">Team</div>
+<div class="window-content"><p class="bio">Our team</p></div></div>
+<script>document.querySelectorAll('.card').forEach(card => card.addEventListener('click', flip));</script>
+</body></html>'''
+
+def events():
+    return stream.tokenize([PAGE])
+
+def test_class_queried_by_scripts_keeps_panel():
+    panels, body_end = defer.scan(events(), prune.PageNames(events()))
+    assert body_end
+    assert panels == {'window-about': "scripts use .card", 'window-team': None}
+
+    deferrer = defer.Deferrer(panels)
+    html = ''.join(text for _, text in deferrer.rewrite(events()))
+    assert '<template data-deferred="window-team"><p class="bio">' in html
+    assert 'data-deferred="window-about"' not in html
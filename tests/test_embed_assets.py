@@ -0,0 +1,22 @@
+import base64
+import io
+
+from PIL import Image
+
+import embed_assets
+
+def encoded(fmt):
+    out = io.BytesIO()
+    Image.new('RGB', (4, 4), '#808080').save(out, fmt)
+    return base64.b64encode(out.getvalue()).decode('ascii')
+
+def test_data_url_uses_the_real_format(monkeypatch):
+    monkeypatch.setattr(embed_assets, 'ASSETS_DIR', None)
+    assert embed_assets.asset_src('BRANDAsset-MAINLOGO.png', encoded('WEBP')).startswith('data:image/webp;')
+    assert embed_assets.asset_src('BRANDAsset-MAINLOGO', encoded('JPEG')).startswith('data:image/jpeg;')
+
+def test_published_file_gets_the_real_extension(workdir, monkeypatch):
+    monkeypatch.setattr(embed_assets, 'ASSETS_DIR', str(workdir / "assets"))
+    src = embed_assets.asset_src('BRANDAsset-MAINLOGO', encoded('PNG'))
+    assert src.startswith('assets/BRANDAsset-MAINLOGO.') and src.endswith('.png')
+    assert (workdir / src).exists()
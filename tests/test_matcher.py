@@ -0,0 +1,54 @@
+import random
+import re
+
+from aether.insertion import InsertionPlan
+from aether.matcher import AnchorMatcher
+
+def regex_ends(text, anchor):
+    return [m.end() for m in re.finditer(re.escape(anchor), text, re.IGNORECASE)]
+
+def test_nth_occurrence_of_repeated_anchor():
+    text = "Vision <p>vision</p> VISION and vision"
+    found = AnchorMatcher(["vision"]).find(text, {"vision": [2, 4]})
+    assert found == {("vision", 2): 16, ("vision", 4): len(text)}
+
+def test_occurrences_do_not_overlap():
+    text = "aaaaa"
+    found = AnchorMatcher(["aa"]).find(text, {"aa": [1, 2, 3]})
+    # Like re.finditer: "aa" at 0 and 2; no third match
+    assert found == {("aa", 1): 2, ("aa", 2): 4}
+
+def test_overlapping_anchors_are_found_independently():
+    text = "ushers she hers"
+    anchors = ["he", "she", "hers", "his"]
+    wanted = {anchor: [1, 2, 3] for anchor in anchors}
+    found = AnchorMatcher(anchors).find(text, wanted)
+    expected = {(anchor, nth): end for anchor in anchors
+                for nth, end in enumerate(regex_ends(text, anchor), 1) if nth <= 3}
+    assert found == expected
+    assert ("his", 1) not in found
+
+def test_missing_anchor():
+    found = AnchorMatcher(["Topological Media Lab", "media"]).find(
+        "His topological media work", {"Topological Media Lab": [1], "media": [1, 2]})
+    assert found == {("media", 1): 21}
+
+def test_matches_regex_on_random_text():
+    rng = random.Random(5)
+    for _ in range(200):
+        text = ''.join(rng.choice("abAB ") for _ in range(60))
+        anchors = list({''.join(rng.choice("ab") for _ in range(rng.randint(1, 4))) for _ in range(5)})
+        wanted = {anchor: [1, 2, 3, 5, 8] for anchor in anchors}
+        found = AnchorMatcher(anchors).find(text, wanted)
+        expected = {(anchor, nth): end for anchor in anchors
+                    for nth, end in enumerate(regex_ends(text, anchor), 1) if nth in wanted[anchor]}
+        assert found == expected, (text, anchors)
+
+def test_plan_reports_missing_anchors():
+    plan = InsertionPlan()
+    plan.add("Founder", "<img a>")
+    plan.add("founder", "<img b>", nth=2)
+    plan.add("Phygital Hospitality Revolution", "<img c>")
+    html = plan.apply("<p>Founder</p><div>The founder</div>")
+    assert html == "<p>Founder</p>\n<img a>\n<div>The founder</div>\n<img b>\n"
+    assert plan.missing == ["Phygital Hospitality Revolution"]
@@ -0,0 +1,21 @@
+import os
+
+from PIL import Image
+
+from aether.assets import AssetRegistry
+from aether.pictures import PictureBuilder, rewrite_pictures
+
+def asset_tree(root):
+    for directory, filename, width in (("webp", "hero.webp", 1200), ("webp-medium", "hero_800w.webp", 800)):
+        os.makedirs(os.path.join(root, directory))
+        Image.new('RGB', (width, width * 9 // 16), '#336699').save(os.path.join(root, directory, filename))
+
+def test_external_sized_image_becomes_picture(workdir):
+    asset_tree("aether-website-assets")
+    assets = AssetRegistry(publish_dir=str(workdir / "assets"))
+    src = assets.sized_src("hero", 916)
+    assert os.path.basename(src).startswith("hero_916w.")
+
+    html, count = rewrite_pictures(f'<img src="{src}" alt="">', PictureBuilder(assets, config={}))
+    assert count == 1
+    assert html.startswith('<picture><source type="image/webp" srcset="assets/hero_800w.')
@@ -0,0 +1,67 @@
+import os
+
+from aether import pipeline
+
+def test_build_creates_output_directory(workdir):
+    page = workdir / "page.html"
+    page.write_text("<html><head><style>p { color: red; }</style></head><body><p>x</p></body></html>",
+                    encoding='utf-8')
+    output = workdir / "out" / "pages" / "page.html"
+    for incremental in (False, True):
+        pipeline.build(str(page), str(output), steps=["css"], incremental=incremental)
+        assert "color: red" in output.read_text(encoding='utf-8')
+        output.unlink()
+        output.parent.rmdir()
+
+runs = []
+
+def reader(name):
+    def read(doc):
+        runs.append(name)
+        pipeline.registry(doc).bytes(name)
+        doc.html = doc.html.replace('</body>', f'<p>{name}</p></body>')
+    return read
+
+pipeline.transform("test-read-a")(reader("a"))
+pipeline.transform("test-read-b")(reader("b"))
+pipeline.transform("test-read-a-again")(reader("a"))
+
+def write_asset(name, data):
+    path = os.path.join("aether-website-assets", "webp", f"{name}.webp")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_step_depends_only_on_its_own_assets(workdir):
+    write_asset("a", b"a1")
+    write_asset("b", b"b1")
+    page = workdir / "page.html"
+    page.write_text("<html><body></body></html>", encoding='utf-8')
+    steps = ["test-read-a", "test-read-b"]
+
+    pipeline.build(str(page), str(workdir / "out.html"), steps=steps)
+    assert runs == ["a", "b"]
+
+    # a changes but the first step's output does not: the second step is reused
+    runs.clear()
+    write_asset("a", b"a2")
+    pipeline.build(str(page), str(workdir / "out.html"), steps=steps)
+    assert runs == ["a"]
+
+    runs.clear()
+    write_asset("b", b"b2")
+    pipeline.build(str(page), str(workdir / "out.html"), steps=steps)
+    assert runs == ["b"]
+
+def test_memoized_asset_is_a_dependency_of_every_step_using_it(workdir):
+    write_asset("a", b"a1")
+    page = workdir / "page.html"
+    page.write_text("<html><body></body></html>", encoding='utf-8')
+    # The second step gets a's bytes from the registry's memo
+    steps = ["test-read-a", "test-read-a-again"]
+
+    runs.clear()
+    pipeline.build(str(page), str(workdir / "out.html"), steps=steps)
+    write_asset("a", b"a2")
+    pipeline.build(str(page), str(workdir / "out.html"), steps=steps)
+    assert runs == ["a", "a", "a", "a"]
@@ -0,0 +1,44 @@
+import json
+import os
+
+from aether import pipeline
+
+PAGE = '<html><body><img data-asset="logo" src="logo.webp" alt=""></body></html>'
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def asset_tree(root, color):
+    os.makedirs(os.path.join(root, "webp"))
+    with open(os.path.join(root, "webp", "logo.webp"), 'wb') as f:
+        f.write(b"RIFF....WEBP")
+    write_json(os.path.join(root, "manifest", "image-dimensions.json"),
+               {"logo": {"width": 640, "height": 360}})
+    write_json(os.path.join(root, "manifest", "dominant-colors.json"), {"colors": {"logo": color}})
+
+def build(page, output):
+    pipeline.build(page, output, steps=["placeholders"])
+    with open(output, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def test_manifest_change_invalidates_step(workdir, capsys):
+    asset_tree("aether-website-assets", "#112233")
+    page = workdir / "page.html"
+    page.write_text(PAGE, encoding='utf-8')
+    output = str(workdir / "out.html")
+
+    html = build(str(page), output)
+    assert 'width="640" height="360"' in html
+    assert "#112233" in html
+
+    capsys.readouterr()
+    build(str(page), output)
+    assert "is up to date" in capsys.readouterr().out
+
+    write_json(os.path.join("aether-website-assets", "manifest", "dominant-colors.json"),
+               {"colors": {"logo": "#abcdef"}})
+    html = build(str(page), output)
+    assert "is up to date" not in capsys.readouterr().out
+    assert "#abcdef" in html and "#112233" not in html
@@ -0,0 +1,30 @@
+from aether import sky
+
+STYLE = '''
+        .sky-glass-layer {
+            background: linear-gradient(180deg, #102040 0%, #403020 100%);
+            animation: skyFlow 25s ease infinite;
+        }
+
+        @keyframes skyFlow {
+            0%, 100% { filter: hue-rotate(0deg); }
+            50% { filter: hue-rotate(30deg); }
+        }
+'''
+
+def test_filter_only_animation_is_dropped(workdir):
+    glass = sky.SkyGlass(cache_dir=str(workdir))
+    css = glass.style(STYLE)
+    assert glass.textures == 1 and glass.stopped == 1 and glass.animations == 0
+    assert 'skyFlow-composited' not in css
+    assert 'animation: skyFlow' not in css
+    assert 'will-change: transform' not in css and 'will-change: opacity' not in css
+
+def test_transform_animation_is_composited(workdir):
+    glass = sky.SkyGlass(cache_dir=str(workdir))
+    css = glass.style(STYLE.replace('filter: hue-rotate(30deg);',
+                                    'filter: hue-rotate(30deg); transform: scale(1.1);'))
+    assert glass.animations == 1
+    assert 'animation: skyFlow-composited 25s ease infinite;' in css
+    assert '50% { transform: scale(1.1); }' in css
+    assert 'will-change: transform;' in css
@@ -0,0 +1,56 @@
+import hashlib
+
+import pytest
+
+from aether import stream
+
+PAGE = '''<!DOCTYPE html>
+<html lang="en"><head>
+<!-- a comment with <b>markup</b> and a > inside -->
+<style>
+    .a > .b { content: "</p>"; }
+    /* </styl */
+</style>
+<script>
+    const s = "<div title='x>y'>" + '</scr' + 'ipt>';
+    if (a < b && b > c) { run(); }
+</script>
+</head>
+<body class="main" data-x='a > b' onclick="go('<')">
+1 < 2 and 3 > 2 <br/><img src="data:image/png;base64,AAAA" alt=">"></body></html>
+<SCRIPT type="module">x = 1</SCRIPT >
+'''
+
+def events(chunks):
+    return list(stream.tokenize(chunks))
+
+EXPECTED = events([PAGE])
+
+def test_events_cover_every_kind():
+    assert {kind for kind, _ in EXPECTED} == set(stream.KINDS)
+    assert ('script', '\n    const s = "<div title=\'x>y\'>" + \'</scr\' + \'ipt>\';\n'
+            '    if (a < b && b > c) { run(); }\n') in EXPECTED
+    assert ('tag', '<body class="main" data-x=\'a > b\' onclick="go(\'<\')">') in EXPECTED
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 13, 64, 1000])
+def test_chunk_boundaries_do_not_matter(size):
+    result = events(stream.string_chunks(PAGE, size))
+    assert result == EXPECTED
+    assert ''.join(text for _, text in result) == PAGE
+
+def test_every_split_point():
+    # Two chunks split at each offset: inside tags, comments, <script> and <style>
+    for split in range(1, len(PAGE)):
+        assert events([PAGE[:split], PAGE[split:]]) == EXPECTED, split
+
+def test_write_chunks_roundtrip(tmp_path):
+    for name in ("page.html", "page.html.gz"):
+        path = str(tmp_path / name)
+        sha = stream.write_chunks(stream.string_chunks(PAGE, 7), path)
+        assert sha == hashlib.sha256(PAGE.encode('utf-8')).hexdigest()
+        assert stream.read_text(path) == PAGE
+
+    # The output may replace the file it is read from
+    path = str(tmp_path / "page.html")
+    stream.write_chunks(stream.read_chunks(path, 5), path)
+    assert stream.read_text(path) == PAGE